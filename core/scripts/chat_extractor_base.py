@@ -4,27 +4,70 @@ Base utilities for Chat History Extraction
 """
 import os
 import re
-from datetime import datetime
+import sys
+from datetime import datetime, timezone, timedelta
+from output_path_index import OutputPathIndex, COLD_INDEX_SUFFIX
 
 # Allow override via environment variable (set by skills) or CLI arg (set by run_extraction.py)
 # Falls back to script directory for non-plugin use
 OUTPUT_DIR = os.environ.get('KG_OUTPUT_DIR',
                              os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ""))
 
+# Extraction state (manifests, parse caches) lives in a hidden folder that
+# get_output_path() never descends into
+CACHE_DIRNAME = '.extraction-cache'
+
+def get_cache_dir():
+    """Returns the directory holding extraction manifests for the current OUTPUT_DIR."""
+    return os.path.join(OUTPUT_DIR, CACHE_DIRNAME)
+
+_output_index = None
+
+def get_output_index(persist=False):
+    """
+    Returns the shared filename -> path index for OUTPUT_DIR, building it on
+    first use. With persist=True the index is loaded from (and can be saved to)
+    the extraction cache, re-listing only directories whose mtime changed.
+    """
+    global _output_index
+    if _output_index is None or _output_index.root != OUTPUT_DIR:
+        cache_path = os.path.join(get_cache_dir(), 'output-index.json') if persist else None
+        _output_index = OutputPathIndex(OUTPUT_DIR, cache_path)
+    return _output_index
+
+def save_output_index():
+    """Persists the shared output index if it was opened with persist=True."""
+    if _output_index is not None:
+        _output_index.save()
+
+# "<export>.part-N.md", "<export>.index.json" and "<export>.offsets.jsonl" belong to "<export>.md"
+_COMPANION_NAME = re.compile(r'^(.+?)(?:\.part-\d+)?\.(?:md|index\.json|offsets\.jsonl)$')
+
 def get_output_path(filename):
     """
     Returns the full path for an output file.
     1. Checks if file exists in any subdirectory -> returns that path.
-    2. If new, parses YYYY-MM derived from filename (expected YYYY-MM-DD...) -> returns path in YYYY-MM subfolder.
-    3. Fallback to root if date parsing fails.
+    2. If new and a part file, shard index or offset sidecar of an existing export, returns a path next to that export.
+    3. If new, parses YYYY-MM derived from filename (expected YYYY-MM-DD...) -> returns path in YYYY-MM subfolder.
+    4. Fallback to root if date parsing fails.
+    New paths are registered in the shared output index so later calls find them.
     """
     # 1. Search for existing file anywhere in chat-history
-    for root, dirs, files in os.walk(OUTPUT_DIR):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d != 'scripts']
-        if filename in files:
-            return os.path.join(root, filename)
+    index = get_output_index()
+    existing = index.lookup(filename)
+    if existing:
+        return existing
+
+    # 2. New part files, shard indexes and offset sidecars go next to the day's export
+    # (see export_shards, export_offsets)
+    companion = _COMPANION_NAME.match(filename)
+    export = companion and companion.group(1) + '.md' != filename and index.lookup(companion.group(1) + '.md')
+    path = os.path.join(os.path.dirname(export), filename) if export else _new_output_path(filename)
+    index.add(path)
+    return path
 
-    # 2. Determine target subfolder for new files
+def _new_output_path(filename):
+    # 3. Determine target subfolder for new files
     # Expected filename format: "YYYY-MM-DD-..."
     match = re.match(r"(\d{4})-(\d{2})-\d{2}", filename)
     if match:
@@ -41,9 +84,129 @@ def get_output_path(filename):
         
         return os.path.join(target_dir, filename)
 
-    # 3. Fallback to root
+    # 4. Fallback to root
     return os.path.join(OUTPUT_DIR, filename)
 
+class DateWindow:
+    """
+    The --date/--after/--before selection shared by all extractors.
+    Dates are compared as YYYY-MM-DD strings; --date takes precedence.
+    """
+
+    # Source timestamps and filesystem mtimes can disagree by a timezone
+    # offset or clock skew, so mtime pruning keeps a day of slack
+    MTIME_SLACK_SECONDS = 86400
+
+    def __init__(self, date_filter=None, after_date=None, before_date=None):
+        self.date_filter = date_filter
+        self.after_date = after_date
+        self.before_date = before_date
+
+    def is_open(self):
+        """True if no date constraint is set."""
+        return not (self.date_filter or self.after_date or self.before_date)
+
+    def contains(self, date_str):
+        if self.date_filter:
+            return date_str == self.date_filter
+        if self.after_date and date_str < self.after_date:
+            return False
+        if self.before_date and date_str > self.before_date:
+            return False
+        return True
+
+    def filter(self, dates):
+        """Returns the dates inside the window, preserving order."""
+        return [d for d in dates if self.contains(d)]
+
+    def excludes_mtime(self, mtime):
+        """
+        True if a file last modified at ``mtime`` cannot hold a session starting
+        inside the window (a session starts before its file's last write).
+        """
+        start = self.date_filter or self.after_date
+        if not start:
+            return False
+        try:
+            start_ts = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return False
+        return mtime < start_ts - self.MTIME_SLACK_SECONDS
+
+# Root labels become part of export names, so they are kept filename-safe
+_ROOT_LABEL = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+class SourceRoot:
+    """
+    A home directory whose chat histories are extracted: its
+    ``.claude/projects``, ``.gemini/tmp`` and ``.gemini/antigravity/conversations``.
+
+    The default root is the current user's home and has no label; the
+    extractors' CLAUDE_PROJECTS_DIR, GEMINI_TMP_DIR and GEMINI_CONV_DIR are
+    taken from it, so source paths are built only here. Exports, manifests
+    and message-store rows of a labelled root carry the label
+    (``2026-01-15-claude-alice.md``), so several roots share the per-day
+    folders without writing to each other's files.
+    """
+
+    def __init__(self, home=None, label=None):
+        self.home = os.path.abspath(os.path.expanduser(home or '~'))
+        self.label = label
+        self.claude_projects_dir = os.path.join(self.home, '.claude', 'projects')
+        self.gemini_tmp_dir = os.path.join(self.home, '.gemini', 'tmp')
+        self.gemini_conv_dir = os.path.join(self.home, '.gemini', 'antigravity', 'conversations')
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Parses ``LABEL=PATH`` or ``PATH`` (labelled with the folder name); raises ValueError."""
+        label, sep, path = spec.partition('=')
+        if not sep:
+            path = spec
+            label = os.path.basename(os.path.normpath(os.path.abspath(os.path.expanduser(spec))))
+        if not _ROOT_LABEL.match(label):
+            raise ValueError(f"root label {label!r} must be letters, digits, '.', '_' or '-'")
+        if not os.path.isdir(os.path.expanduser(path)):
+            raise ValueError(f"root {path!r} is not a directory")
+        return cls(path, label)
+
+    def key(self, source):
+        """Names ``source``'s exports, manifest and store rows for this root: 'claude' or 'claude-alice'."""
+        return f"{source}-{self.label}" if self.label else source
+
+    def export_name(self, date_str, source):
+        return f"{date_str}-{self.key(source)}.md"
+
+    def platform(self, source_label):
+        """The platform named in export headers: 'Claude Code' or 'Claude Code [alice]'."""
+        return f"{source_label} [{self.label}]" if self.label else source_label
+
+def map_in_workers(func, items, workers=1):
+    """
+    Yields ``func(item)`` for each item, in input order.
+    Runs serially when workers is 1, otherwise across a process pool
+    (0 means one worker per CPU). Only a small window of items is in flight
+    at a time so results never pile up in memory. ``func`` must be a
+    module-level function.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for item in items:
+            in_flight.append(pool.submit(func, item))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
 def format_timestamp(ts_str):
     """
     Standardize timestamp format to ISO 8601-like or readable string.
@@ -62,35 +225,257 @@ def format_timestamp(ts_str):
         pass
     return str(ts_str)
 
-def write_markdown_header(f, source_label, message_count, date_str=None):
-    """Writes the standard Markdown header for chat exports."""
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+def parse_timestamp(ts_str):
+    """
+    Returns an ISO 8601 timestamp as integer epoch milliseconds (values
+    without an offset are read as UTC), or None if it is missing or invalid.
+    """
+    if not ts_str or not isinstance(ts_str, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MILLISECOND
+
+class Message:
+    """
+    One chat message. ``timestamp`` keeps the source string (message IDs and
+    the message store use it as written); ``ts`` is that timestamp parsed
+    once into epoch milliseconds (0 when missing or invalid), which is what
+    sorting and comparisons use. Roles are interned, so every message of a
+    role shares one string. Slots keep a message several times smaller than
+    the dict it replaces.
+    """
+    __slots__ = ('role', 'timestamp', 'ts', 'content', 'thinking', 'tool_calls', 'uuid')
+
+    def __init__(self, role, timestamp=None, content=None, thinking=None, tool_calls=None, uuid=None, ts=None):
+        self.role = sys.intern(role)
+        self.timestamp = timestamp
+        self.ts = (parse_timestamp(timestamp) or 0) if ts is None else ts
+        self.content = content
+        self.thinking = thinking
+        self.tool_calls = tool_calls
+        self.uuid = uuid
+
+    def __reduce__(self):
+        # Pickled to and from worker processes without reparsing the timestamp
+        return (Message, (self.role, self.timestamp, self.content, self.thinking,
+                          self.tool_calls, self.uuid, self.ts))
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.timestamp!r}, {(self.content or '')[:40]!r})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a message from to_dict() output (or a legacy message dict)."""
+        return cls(data['role'], data.get('timestamp'), data.get('content'), data.get('thinking'),
+                   data.get('tool_calls'), data.get('uuid'), data.get('ts'))
+
+    def to_dict(self):
+        """Returns the fields that are set, for JSON caches and spill files."""
+        return {name: getattr(self, name) for name in self.__slots__
+                if getattr(self, name) is not None}
+
+    @property
+    def display_timestamp(self):
+        """The timestamp as written to exports; same result as format_timestamp(), without reparsing."""
+        t = self.timestamp
+        # Fast path only when seconds are present: '2026-01-15T10:03+02:00' has none
+        if self.ts and len(t) >= 19 and t[10] in 'T ' and t[13] == ':' and t[16] == ':' and t[17:19].isdigit():
+            return f"{t[:10]}T{t[11:19]}"
+        return format_timestamp(t)
+
+def render_markdown_header(source_label, message_count, date_str=None):
+    """Returns the standard Markdown header for chat exports."""
     if not date_str:
         date_str = datetime.now().strftime('%Y-%m-%d')
-        
-    f.write(f"# Complete Chat Session Export\n")
-    f.write(f"## Full Conversation from {source_label}\n\n")
-    f.write(f"**Date:** {date_str}\n")
-    f.write(f"**Platform:** {source_label}\n")
-    f.write(f"**Total Messages:** {message_count}\n")
-    f.write(f"**Export Generated:** {datetime.now().isoformat()}\n\n")
-    f.write("---\n\n")
-    f.write("## Full Conversation Transcript\n\n")
 
-def write_message_block(f, index, role, timestamp, content, thinking=None, tool_calls=None):
-    """Writes a single message block to the markdown file."""
-    f.write(f"### Message {index}: {role.capitalize()}\n\n")
-    f.write(f"**Timestamp:** {timestamp}\n\n")
-    
+    return (f"# Complete Chat Session Export\n"
+            f"## Full Conversation from {source_label}\n\n"
+            f"**Date:** {date_str}\n"
+            f"**Platform:** {source_label}\n"
+            f"**Total Messages:** {message_count}\n"
+            f"**Export Generated:** {datetime.now().isoformat()}\n\n"
+            "---\n\n"
+            "## Full Conversation Transcript\n\n")
+
+def render_message_block(index, role, timestamp, content, thinking=None, tool_calls=None):
+    """Returns a single message block as one string."""
+    parts = [f"### Message {index}: {role.capitalize()}\n\n**Timestamp:** {timestamp}\n\n"]
+
     if thinking:
-        f.write(f"**Thinking Block:**\n\n```\n{thinking}\n```\n\n")
-    
+        parts.append(f"**Thinking Block:**\n\n```\n{thinking}\n```\n\n")
+
     if content:
-        f.write(f"**Content:**\n\n{content}\n\n")
-        
+        parts.append(f"**Content:**\n\n{content}\n\n")
+
     if tool_calls:
-         f.write(f"**Tool Calls:**\n")
-         for tc in tool_calls:
-             f.write(f"- `{tc.get('name', 'unknown')}`: {tc.get('args', '')}\n")
-         f.write("\n")
+        parts.append("**Tool Calls:**\n")
+        for tc in tool_calls:
+            parts.append(f"- `{tc.get('name', 'unknown')}`: {tc.get('args', '')}\n")
+        parts.append("\n")
+
+    parts.append("---\n\n")
+    return ''.join(parts)
+
+def write_markdown_header(f, source_label, message_count, date_str=None):
+    """Writes the standard Markdown header for chat exports."""
+    f.write(render_markdown_header(source_label, message_count, date_str))
+
+def write_message_block(f, index, role, timestamp, content, thinking=None, tool_calls=None):
+    """Writes a single message block to the markdown file (recording its offsets if ``f`` is an OffsetWriter)."""
+    block = render_message_block(index, role, timestamp, content, thinking, tool_calls)
+    if isinstance(f, OffsetWriter):
+        f.write_message(index, role, timestamp, block)
+    else:
+        f.write(block)
+
+def utf8_len(text):
+    """Length of ``text`` in UTF-8 bytes, without encoding it when it is ASCII."""
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+class OffsetWriter:
+    """
+    Wraps a text file being written and counts the UTF-8 bytes written
+    through it. Message blocks written with write_message() are recorded in
+    ``entries`` as (index, role, timestamp, start, length), the rows of the
+    export's offset sidecar (see export_offsets). ``offset`` starts at the
+    size of the file when appending.
+    """
+
+    def __init__(self, f, offset=0):
+        self.f = f
+        self.offset = offset
+        self.entries = []
+
+    def write(self, text):
+        self.f.write(text)
+        self.offset += utf8_len(text)
+
+    def write_message(self, index, role, timestamp, block):
+        """Writes a rendered block and records where it lands; empty blocks are skipped."""
+        if not block:
+            return
+        length = utf8_len(block)
+        self.entries.append((index, role, timestamp, self.offset, length))
+        self.f.write(block)
+        self.offset += length
+
+# Exports are written through buffers this large instead of one syscall per block
+WRITE_BUFFER_SIZE = 1 << 20
+
+def _in_cold_month(path):
+    """
+    True if ``path`` is not a loose file and its month folder has a
+    cold-storage archive; cold_storage is imported only then.
+    """
+    return not os.path.exists(path) and os.path.exists(os.path.dirname(path).rstrip(os.sep) + COLD_INDEX_SUFFIX)
+
+def open_append(path):
+    """
+    Opens an existing export for appending through a large write buffer,
+    restoring it from cold storage first if it was archived.
+    """
+    if _in_cold_month(path):
+        from cold_storage import thaw
+        thaw(path)
+    return open(path, 'a', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+def _rotate_backup(path, backup_path):
+    """
+    Makes ``backup_path`` hold the current contents of ``path``, leaving
+    ``path`` in place until the new content is published: a hard link renamed
+    into place, or a copy where hard links are not supported.
+    """
+    link_path = f"{backup_path}.tmp.{os.getpid()}"
+    try:
+        os.link(path, link_path)
+    except OSError:
+        import shutil
+        shutil.copy2(path, link_path)
+    try:
+        os.replace(link_path, backup_path)
+    except OSError:
+        try:
+            os.remove(link_path)
+        except OSError:
+            pass
+        raise
+
+class AtomicWriter:
+    """
+    Context manager that writes a text file and publishes it atomically.
+
+    Content goes through a large buffer into a hidden temp file next to
+    ``path``, which is renamed over ``path`` when the block exits cleanly, so
+    readers see either the old file or the complete new one. On error the
+    temp file is removed and ``path`` is left as it was. With backup=True an
+    existing file is rotated to ``<path>.backup`` first; ``backup_path`` or
+    ``backup_error`` records the outcome. A file whose archived copy in cold
+    storage has the same content (apart from the generation time) is not
+    written back to its month folder.
+    """
+
+    def __init__(self, path, backup=False):
+        self.path = path
+        self.backup = backup
+        self.backup_path = None
+        self.backup_error = None
+        dirname, name = os.path.split(path)
+        self.tmp_path = os.path.join(dirname, f".{name}.tmp.{os.getpid()}")
+        self._f = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.tmp_path) or '.', exist_ok=True)
+        self._f = open(self.tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+        return self._f
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._f.close()
+            if exc_type is None:
+                self._publish()
+        except BaseException:
+            self._discard()
+            raise
+        if exc_type is not None:
+            self._discard()
+        return False
+
+    def _publish(self):
+        if self._same_as_archived():
+            self._discard()
+            try:
+                os.rmdir(os.path.dirname(self.path))
+            except OSError:
+                pass
+            return
+        if os.path.exists(self.path):
+            # Keep the permissions of the file being replaced
+            os.chmod(self.tmp_path, os.stat(self.path).st_mode & 0o7777)
+            if self.backup:
+                backup_path = self.path + ".backup"
+                try:
+                    _rotate_backup(self.path, backup_path)
+                    self.backup_path = backup_path
+                except OSError as e:
+                    self.backup_error = e
+        os.replace(self.tmp_path, self.path)
+
+    def _same_as_archived(self):
+        if not _in_cold_month(self.path):
+            return False
+        from cold_storage import same_as_archived
+        return same_as_archived(self.path, self.tmp_path, ignore_prefix='**Export Generated:**')
 
-    f.write("---\n\n")
+    def _discard(self):
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,459 @@
+"""
+Compressed cold storage for completed months of chat history.
+
+``compact`` packs the files of a ``YYYY-MM/`` folder into one archive in the
+output directory and removes the folder:
+
+    2026-01.cold.json       index: codec, data file, one entry per file
+    2026-01.cold.1.zst      every file compressed as its own zstd frame
+                            (or gzip member with --codec gzip)
+
+Each index entry holds the member's byte offset and length in the data file,
+its size, mtime, SHA-1 and tail fingerprint, so one day can be read without
+touching the rest of the month. Because members are independent frames,
+``zstd -dc`` / ``gunzip -c`` on the data file still prints every file in
+order. zstd needs the optional ``zstandard`` package; gzip is always
+available.
+
+Archived files keep their path: ``2026-01/2026-01-05-claude.md`` is served
+from the archive until something writes to it. get_output_path(),
+parse_metadata_from_file() and split_claude_md() read archived exports
+through ``export_exists``/``open_export``; appending to one restores it to
+its folder first (``thaw``), and the next ``compact`` of that month packs the
+loose copy again, keeping the replaced version as ``<name>.backup``.
+
+Usage:
+  python3 core/scripts/cold_storage.py compact [--month YYYY-MM ...] [--keep-months 1]
+                                               [--codec zstd|gzip] [--level N] [--dry-run]
+  python3 core/scripts/cold_storage.py thaw --month YYYY-MM
+  python3 core/scripts/cold_storage.py list
+All commands accept --output-dir DIR (default: auto-detect from active KG).
+"""
+import io
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+
+from extraction_manifest import FINGERPRINT_BYTES, file_fingerprint, write_json_atomic
+from output_path_index import COLD_INDEX_SUFFIX as INDEX_SUFFIX
+
+COLD_VERSION = 1
+CODEC_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+DEFAULT_LEVELS = {'zstd': 10, 'gzip': 6}
+_MONTH = re.compile(r'^\d{4}-\d{2}$')
+_CHUNK = 1 << 20
+
+# index path -> (mtime_ns, ColdArchive)
+_archives = {}
+
+_zstd_module = None
+
+
+def _zstandard():
+    """Imports the optional zstandard package on first use; returns None if it is not installed."""
+    global _zstd_module
+    if _zstd_module is None:
+        try:
+            import zstandard
+            _zstd_module = zstandard
+        except ImportError:
+            _zstd_module = False
+    return _zstd_module or None
+
+
+def default_codec():
+    return 'zstd' if _zstandard() is not None else 'gzip'
+
+
+def index_path_for(month_dir):
+    """Returns the archive index that holds the files of ``month_dir``."""
+    return month_dir.rstrip(os.sep) + INDEX_SUFFIX
+
+
+class ColdArchive:
+    """Read access to one month archive through its index."""
+
+    def __init__(self, index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != COLD_VERSION:
+            raise ValueError(f"{index_path}: unsupported cold storage version {data.get('version')}")
+        self.index_path = index_path
+        self.root = os.path.dirname(index_path)
+        self.month = data['month']
+        self.codec = data['codec']
+        self.generation = data.get('generation', 1)
+        self.data_path = os.path.join(self.root, data['data'])
+        self.members = data['members']
+
+    def read_compressed(self, name):
+        entry = self.members[name]
+        with open(self.data_path, 'rb') as f:
+            f.seek(entry['offset'])
+            return f.read(entry['length'])
+
+    def open_binary(self, name):
+        """Returns a binary stream over the decompressed member."""
+        raw = io.BytesIO(self.read_compressed(name))
+        if self.codec == 'gzip':
+            import gzip
+            return gzip.GzipFile(fileobj=raw, mode='rb')
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError(f"{self.data_path} is zstd-compressed; install 'zstandard' to read it")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw))
+
+    def read_bytes(self, name):
+        with self.open_binary(name) as f:
+            return f.read()
+
+    def extract(self, name, dest_path):
+        """Writes the member to ``dest_path`` with its original mtime."""
+        entry = self.members[name]
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.tmp.{os.getpid()}")
+        with self.open_binary(name) as src, open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(src, out, _CHUNK)
+        os.utime(tmp_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        os.replace(tmp_path, dest_path)
+
+
+def load_archive(index_path):
+    """Returns the ColdArchive for ``index_path`` (cached while the index is unchanged), or None."""
+    try:
+        mtime_ns = os.stat(index_path).st_mtime_ns
+    except OSError:
+        _archives.pop(index_path, None)
+        return None
+    cached = _archives.get(index_path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    archive = ColdArchive(index_path)
+    _archives[index_path] = (mtime_ns, archive)
+    return archive
+
+
+def member_paths(index_path):
+    """Yields the loose path of every file held by the archive at ``index_path``."""
+    archive = load_archive(index_path)
+    if archive is None:
+        return
+    month_dir = os.path.join(archive.root, archive.month)
+    for name in archive.members:
+        yield os.path.join(month_dir, name)
+
+
+def cold_member(path):
+    """Returns (archive, entry) if ``path`` is held in cold storage, else None."""
+    archive = load_archive(index_path_for(os.path.dirname(path)))
+    if archive is None:
+        return None
+    entry = archive.members.get(os.path.basename(path))
+    return (archive, entry) if entry else None
+
+
+def export_exists(path):
+    """True if ``path`` exists as a file or in cold storage."""
+    return os.path.exists(path) or cold_member(path) is not None
+
+
+def open_export(path, mode='r'):
+    """Opens ``path`` for reading ('r' or 'rb'), from cold storage if it is not a loose file."""
+    if os.path.exists(path):
+        return open(path, mode, encoding=None if 'b' in mode else 'utf-8')
+    found = cold_member(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    stream = found[0].open_binary(os.path.basename(path))
+    return stream if 'b' in mode else io.TextIOWrapper(stream, encoding='utf-8')
+
+
+class _ColdStat:
+    """The stat fields callers compare, taken from an archive entry."""
+
+    def __init__(self, entry):
+        self.st_size = entry['size']
+        self.st_mtime_ns = entry['mtime_ns']
+
+
+def export_stat(path):
+    """os.stat() of ``path``, or its archived size and mtime; raises FileNotFoundError if neither."""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        found = cold_member(path)
+        if found is None:
+            raise
+        return _ColdStat(found[1])
+
+
+def export_fingerprint(path, offset):
+    """file_fingerprint() for a loose or archived export."""
+    if os.path.exists(path):
+        return file_fingerprint(path, offset)
+    found = cold_member(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    archive, entry = found
+    if offset == entry['size']:
+        return entry['fingerprint']
+    data = archive.read_bytes(os.path.basename(path))[:offset]
+    return hashlib.sha1(data[-FINGERPRINT_BYTES:]).hexdigest()
+
+
+def thaw(path):
+    """Restores an archived ``path`` to its folder before it is modified; returns True if restored."""
+    if os.path.exists(path):
+        return False
+    found = cold_member(path)
+    if found is None:
+        return False
+    found[0].extract(os.path.basename(path), path)
+    return True
+
+
+def same_as_archived(path, new_path, ignore_prefix=None):
+    """
+    True if ``new_path`` has the content archived for ``path`` (which is not
+    a loose file), ignoring lines starting with ``ignore_prefix``.
+    """
+    if os.path.exists(path):
+        return False
+    found = cold_member(path)
+    if found is None or (ignore_prefix is None and os.path.getsize(new_path) != found[1]['size']):
+        return False
+    with found[0].open_binary(os.path.basename(path)) as old, open(new_path, 'rb') as new:
+        if ignore_prefix is None:
+            return old.read() == new.read()
+        skip = ignore_prefix.encode('utf-8')
+        old_lines = (line for line in old if not line.startswith(skip))
+        new_lines = (line for line in new if not line.startswith(skip))
+        sentinel = object()
+        for a, b in zip(old_lines, new_lines):
+            if a != b:
+                return False
+        return next(old_lines, sentinel) is sentinel and next(new_lines, sentinel) is sentinel
+
+
+# ── Compaction ───────────────────────────────────────────────────────────
+
+def _compress_stream(src, out, codec, level):
+    """Compresses ``src`` into ``out`` as one frame; returns (size, sha1, fingerprint)."""
+    digest = hashlib.sha1()
+    size = 0
+    tail = b''
+    if codec == 'gzip':
+        import zlib
+        comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+        write, finish = (lambda b: out.write(comp.compress(b))), (lambda: out.write(comp.flush()))
+        writer = None
+    else:
+        writer = _zstandard().ZstdCompressor(level=level).stream_writer(out, closefd=False)
+        write, finish = writer.write, writer.close
+    while True:
+        chunk = src.read(_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        tail = (tail + chunk)[-FINGERPRINT_BYTES:]
+        write(chunk)
+    finish()
+    return size, digest.hexdigest(), hashlib.sha1(tail).hexdigest()
+
+
+def _loose_files(month_dir):
+    try:
+        names = sorted(os.listdir(month_dir))
+    except OSError:
+        return []
+    return [n for n in names if not n.startswith('.') and os.path.isfile(os.path.join(month_dir, n))]
+
+
+def completed_months(root, keep_months=1, today=None):
+    """Month folders (and archives with loose files) older than the ``keep_months`` newest months."""
+    today = today or datetime.now()
+    y, m = today.year, today.month
+    for _ in range(max(keep_months, 1) - 1):
+        y, m = (y - 1, 12) if m == 1 else (y, m - 1)
+    cutoff = f"{y:04d}-{m:02d}"
+    months = set()
+    for name in os.listdir(root):
+        month = name[:-len(INDEX_SUFFIX)] if name.endswith(INDEX_SUFFIX) else name
+        if _MONTH.match(month) and month < cutoff and (
+                name.endswith(INDEX_SUFFIX) or os.path.isdir(os.path.join(root, name))):
+            months.add(month)
+    return sorted(months)
+
+
+def compact_month(root, month, codec=None, level=None):
+    """
+    Packs ``root/month/`` (plus any existing archive of that month) into a new
+    archive generation, verifies every member, then removes the loose files.
+    Loose files replace archived ones of the same name; a replaced version
+    that differs is kept as ``<name>.backup`` unless the folder has one.
+    Returns a summary dict.
+    """
+    codec = codec or default_codec()
+    if codec == 'zstd' and _zstandard() is None:
+        raise RuntimeError("zstd needs the 'zstandard' package (pip install zstandard), or use --codec gzip")
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    month_dir = os.path.join(root, month)
+    index_path = index_path_for(month_dir)
+    old = load_archive(index_path)
+    loose = _loose_files(month_dir)
+    if not loose:
+        return {'month': month, 'files': len(old.members) if old else 0, 'packed': 0,
+                'bytes_in': 0, 'bytes_out': 0, 'skipped': True}
+
+    generation = (old.generation + 1) if old else 1
+    data_name = f"{month}.cold.{generation}{CODEC_EXTENSIONS[codec]}"
+    data_path = os.path.join(root, data_name)
+    members = {}
+    bytes_in = 0
+
+    def add(name, src, mtime_ns):
+        nonlocal bytes_in
+        offset = out.tell()
+        size, sha1, fingerprint = _compress_stream(src, out, codec, level)
+        members[name] = {'offset': offset, 'length': out.tell() - offset, 'size': size,
+                         'mtime_ns': mtime_ns, 'sha1': sha1, 'fingerprint': fingerprint}
+        bytes_in += size
+
+    # target name -> (source, name): loose files win; a replaced archived
+    # version that differs becomes <name>.backup unless the folder has one
+    plan = {name: ('loose', name) for name in loose}
+    for name, entry in (old.members.items() if old else ()):
+        if name in loose:
+            if _sha1_file(os.path.join(month_dir, name)) != entry['sha1'] and f"{name}.backup" not in loose:
+                plan[f"{name}.backup"] = ('archive', name)
+        else:
+            plan.setdefault(name, ('archive', name))
+
+    try:
+        with open(data_path, 'wb') as out:
+            for target in sorted(plan):
+                source, name = plan[target]
+                if source == 'archive':
+                    with old.open_binary(name) as src:
+                        add(target, src, old.members[name]['mtime_ns'])
+                else:
+                    path = os.path.join(month_dir, name)
+                    with open(path, 'rb') as src:
+                        add(target, src, os.stat(path).st_mtime_ns)
+            out.flush()
+            os.fsync(out.fileno())
+
+        # Verify before anything loose is removed
+        write_json_atomic(index_path + '.verify', {
+            'version': COLD_VERSION, 'month': month, 'codec': codec, 'generation': generation,
+            'data': data_name, 'members': members})
+        check = ColdArchive(index_path + '.verify')
+        for name, entry in members.items():
+            with check.open_binary(name) as f:
+                if _sha1_stream(f) != entry['sha1']:
+                    raise IOError(f"verification failed for {name} in {data_name}")
+        os.replace(index_path + '.verify', index_path)
+    except BaseException:
+        for path in (data_path, index_path + '.verify'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+
+    if old and old.data_path != data_path:
+        os.remove(old.data_path)
+    for name in loose:
+        os.remove(os.path.join(month_dir, name))
+    try:
+        os.rmdir(month_dir)
+    except OSError:
+        pass
+    return {'month': month, 'files': len(members), 'packed': len(loose), 'bytes_in': bytes_in,
+            'bytes_out': os.path.getsize(data_path), 'skipped': False}
+
+
+def thaw_month(root, month):
+    """Restores every archived file of ``month`` that has no loose copy, then removes the archive."""
+    month_dir = os.path.join(root, month)
+    archive = load_archive(index_path_for(month_dir))
+    if archive is None:
+        return 0
+    restored = 0
+    for name in archive.members:
+        path = os.path.join(month_dir, name)
+        if not os.path.exists(path):
+            archive.extract(name, path)
+            restored += 1
+    os.remove(archive.index_path)
+    os.remove(archive.data_path)
+    return restored
+
+
+def _sha1_stream(f):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: f.read(_CHUNK), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sha1_file(path):
+    with open(path, 'rb') as f:
+        return _sha1_stream(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress completed chat-history months into cold storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact = sub.add_parser("compact", help="Pack completed YYYY-MM folders into archives")
+    compact.add_argument("--month", action="append", default=None, help="Month to pack (repeatable; default: every completed month)")
+    compact.add_argument("--keep-months", type=int, default=1, help="Newest months left as folders (default: 1, the current month)")
+    compact.add_argument("--codec", choices=sorted(CODEC_EXTENSIONS), default=None, help="Compression (default: zstd if installed, else gzip)")
+    compact.add_argument("--level", type=int, default=None, help="Compression level (default: zstd 10, gzip 6)")
+    compact.add_argument("--dry-run", action="store_true", help="List the months that would be packed")
+    thaw_cmd = sub.add_parser("thaw", help="Restore an archived month to its folder")
+    thaw_cmd.add_argument("--month", required=True, action="append")
+    sub.add_parser("list", help="Show archived months")
+    for p in (compact, thaw_cmd, sub.choices["list"]):
+        p.add_argument("--output-dir", type=str, default=None, help="Chat history directory (default: auto-detect from active KG)")
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.environ['KG_OUTPUT_DIR'] = args.output_dir
+    from chat_extractor_base import OUTPUT_DIR
+    root = os.path.abspath(OUTPUT_DIR)
+
+    if args.command == "compact":
+        months = args.month or completed_months(root, args.keep_months)
+        for month in months:
+            if args.dry_run:
+                print(f"Would pack {month}")
+                continue
+            s = compact_month(root, month, args.codec, args.level)
+            if s['skipped']:
+                print(f"{month}: nothing to pack")
+            else:
+                ratio = s['bytes_out'] / s['bytes_in'] if s['bytes_in'] else 0
+                print(f"{month}: packed {s['packed']} files ({s['files']} in archive), "
+                      f"{s['bytes_in'] / 1048576:.1f} MB -> {s['bytes_out'] / 1048576:.1f} MB ({ratio:.0%})")
+    elif args.command == "thaw":
+        for month in args.month:
+            print(f"{month}: restored {thaw_month(root, month)} files")
+    else:
+        names = sorted(n for n in os.listdir(root) if n.endswith(INDEX_SUFFIX))
+        if not names:
+            print("No archived months")
+        for name in names:
+            archive = load_archive(os.path.join(root, name))
+            size = sum(e['size'] for e in archive.members.values())
+            print(f"{archive.month}: {len(archive.members)} files, {archive.codec}, "
+                  f"{size / 1048576:.1f} MB -> {os.path.getsize(archive.data_path) / 1048576:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
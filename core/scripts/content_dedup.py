@@ -0,0 +1,106 @@
+"""
+Content-hash deduplication of repeated blocks within a daily export.
+
+Subagent transcripts repeat prompts and answers that are already in the parent
+session, and protobuf decoding can return the same string from several nested
+fields. Repeats are only looked for inside one scope: a parent session and
+its subagent transcripts, where a block counts as a repeat when another file
+of the scope already wrote it, or one .pb conversation. Such a repeat is
+either dropped (``drop``), written as a short reference to the first copy
+(``ref``), or written again (``off``, the default). A dropped repeat takes no
+block number, so the numbering has no gaps and ``Total Messages`` counts the
+blocks actually written.
+"""
+import hashlib
+
+from chat_extractor_base import render_message_block
+from extraction_stats import STATS
+from export_offsets import FRAGMENT_ROLE
+
+DEDUP_MODES = ('drop', 'ref', 'off')
+DEFAULT_DEDUP = 'off'
+
+# Shorter blocks ("yes", "continue") are always written in full
+MIN_DEDUP_CHARS = 80
+
+
+def block_hash(scope, role, content, thinking=None, tool_calls=None):
+    """Returns a short hash of a block's scope, role and text (the timestamp is ignored)."""
+    key = '\x00'.join((scope, role or '', content or '', thinking or '', repr(tool_calls or '')))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class ContentDeduper:
+    """
+    Tracks the blocks written to one export. ``seen`` maps block_hash() to
+    [label of the first copy (e.g. ``Message 3``), file it came from]; pass
+    the mapping saved after an earlier write to keep deduplicating across
+    incremental appends.
+    """
+
+    def __init__(self, mode=DEFAULT_DEDUP, seen=None):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"unknown dedup mode {mode!r} (expected one of {', '.join(DEDUP_MODES)})")
+        self.mode = mode
+        self.seen = dict(seen or {})
+        self.repeats = 0
+
+    def original(self, label, scope, source, role, content, thinking=None, tool_calls=None):
+        """
+        Returns the label of an earlier block of ``scope`` with the same role
+        and text, or None after recording ``label`` as the first copy. A
+        message whose first copy came from its own ``source`` file is not a
+        repeat (a session repeating itself is written in full); a fragment is.
+        """
+        if self.mode == 'off' or len(content or '') + len(thinking or '') < MIN_DEDUP_CHARS:
+            return None
+        key = block_hash(scope, role, content, thinking, tool_calls)
+        first = self.seen.get(key)
+        if first is None:
+            self.seen[key] = [label, source]
+            return None
+        if first[1] == source and role != FRAGMENT_ROLE:
+            return None
+        self.repeats += 1
+        return first[0]
+
+    def count_repeats(self, blocks):
+        """
+        Returns how many of ``blocks`` ((scope, source, role, content,
+        thinking) in write order) are repeats, without rendering them. Used
+        with a fresh deduper to number a day before its header is written.
+        """
+        for block in blocks:
+            self.original(None, *block)
+        return self.repeats
+
+    def render_message(self, index, role, timestamp, content, thinking=None, tool_calls=None,
+                       scope=None, source=None):
+        """
+        Returns message block ``index`` in full, as a reference, or '' when
+        dropped. Messages without a ``scope`` are always written in full.
+        """
+        first = None
+        if scope is not None:
+            first = self.original(f"Message {index}", scope, source, role, content, thinking, tool_calls)
+        if first is None:
+            return render_message_block(index, role, timestamp, content, thinking, tool_calls)
+        if self.mode == 'drop':
+            return ''
+        return (f"### Message {index}: {role.capitalize()}\n\n**Timestamp:** {timestamp}\n\n"
+                f"**Content:**\n\n*(Same content as {first})*\n\n---\n\n")
+
+    def render_fragment(self, index, text, conversation):
+        """Returns fragment ``index`` of the .pb ``conversation`` in full, as a reference, or '' when dropped."""
+        first = self.original(f"Fragment {index}", conversation, conversation, FRAGMENT_ROLE, text)
+        if first is None:
+            return f"### Fragment {index}\n\n{text}\n\n---\n\n"
+        if self.mode == 'drop':
+            return ''
+        return f"### Fragment {index}\n\n*(Same text as {first})*\n\n---\n\n"
+
+
+def count_written(block_count, deduper):
+    """Adds a rendered day's numbered blocks and the repeats found to the run stats."""
+    STATS.count('messages_deduped', deduper.repeats)
+    STATS.count('messages_written', block_count)
@@ -0,0 +1,143 @@
+"""
+Bounded-memory grouping of extracted sessions by day.
+
+Sessions are buffered in memory until the configured limit is reached, then
+each day's buffered sessions are sorted and spilled to a run file on disk.
+Reading a day k-way merges its runs, so peak memory depends on the memory
+limit and the largest single session, not on the total history size.
+"""
+import os
+import json
+import heapq
+import shutil
+import tempfile
+
+from chat_extractor_base import Message
+
+# Default buffer size before sessions are spilled to disk
+DEFAULT_MEMORY_LIMIT_MB = 256
+
+# Rough per-message overhead of a Message beyond its string payloads
+_MESSAGE_OVERHEAD = 200
+
+
+def _estimate_session_size(session):
+    size = _MESSAGE_OVERHEAD
+    for msg in session['messages']:
+        size += _MESSAGE_OVERHEAD
+        if msg.content:
+            size += len(msg.content)
+        if msg.thinking:
+            size += len(msg.thinking)
+    return size
+
+
+class DaySpillStore:
+    """
+    Collects session dicts ({'date', 'ts_str', 'messages', 'count',
+    'source_path'}) and yields them back per day ordered by start time, ties
+    broken by the order they were added (matching a stable in-memory sort).
+    """
+
+    def __init__(self, memory_limit_mb=None, spill_dir=None):
+        limit_mb = memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB
+        self.memory_limit = int(limit_mb * 1024 * 1024)
+        self._spill_parent = spill_dir
+        self._spill_dir = None
+        self._buffer = {}
+        self._buffer_size = 0
+        self._runs = []
+        self._seq = 0
+        # Per-day totals, kept in memory (small: one entry per day)
+        self.session_counts = {}
+        self.message_counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, session, seq=None):
+        """Adds a session; ``seq`` overrides the insertion order used to break ties."""
+        date = session['date']
+        if seq is None:
+            seq = self._seq
+        self._buffer.setdefault(date, []).append((session['ts_str'], seq, session))
+        self._seq += 1
+        self.session_counts[date] = self.session_counts.get(date, 0) + 1
+        self.message_counts[date] = self.message_counts.get(date, 0) + session['count']
+        self._buffer_size += _estimate_session_size(session)
+        if self._buffer_size >= self.memory_limit:
+            self._spill()
+
+    def dates(self):
+        return list(self.session_counts)
+
+    def _spill(self):
+        """Writes the buffer as one sorted run; records per-day byte offsets."""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='kg-spill-', dir=self._spill_parent)
+        run_path = os.path.join(self._spill_dir, f"run-{len(self._runs):05d}.jsonl")
+        index = {}
+        with open(run_path, 'w', encoding='utf-8') as f:
+            for date in sorted(self._buffer):
+                entries = self._buffer[date]
+                entries.sort(key=lambda e: (e[0], e[1]))
+                index[date] = (f.tell(), len(entries))
+                for ts_str, seq, session in entries:
+                    f.write(json.dumps({'ts_str': ts_str, 'seq': seq, 'count': len(session['messages']),
+                                        'source_path': session.get('source_path')}) + "\n")
+                    for msg in session['messages']:
+                        f.write(json.dumps(msg.to_dict()) + "\n")
+        self._runs.append((run_path, index))
+        self._buffer = {}
+        self._buffer_size = 0
+
+    def _iter_run(self, run_path, offset, n_sessions, date):
+        """Yields sessions from one run; messages are read lazily from disk."""
+        with open(run_path, 'r', encoding='utf-8') as f:
+            f.seek(offset)
+            for _ in range(n_sessions):
+                header = json.loads(f.readline())
+                remaining = [header['count']]
+
+                def messages():
+                    while remaining[0]:
+                        remaining[0] -= 1
+                        yield Message.from_dict(json.loads(f.readline()))
+
+                yield (header['ts_str'], header['seq'], {
+                    'date': date,
+                    'ts_str': header['ts_str'],
+                    'messages': messages(),
+                    'count': header['count'],
+                    'source_path': header['source_path'],
+                })
+                # Skip whatever the consumer did not read
+                while remaining[0]:
+                    remaining[0] -= 1
+                    f.readline()
+
+    def iter_sessions(self, date):
+        """
+        Yields the sessions for ``date`` in start-time order. Each session's
+        ``messages`` is an iterable that must be consumed before advancing.
+        """
+        streams = []
+        for run_path, index in self._runs:
+            if date in index:
+                offset, n_sessions = index[date]
+                streams.append(self._iter_run(run_path, offset, n_sessions, date))
+        buffered = sorted(self._buffer.get(date, []), key=lambda e: (e[0], e[1]))
+        streams.append(iter(buffered))
+
+        for _, _, session in heapq.merge(*streams, key=lambda e: (e[0], e[1])):
+            yield session
+
+    def close(self):
+        self._buffer = {}
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._runs = []
@@ -0,0 +1,277 @@
+"""
+Message offset sidecars for chat exports.
+
+Every export (and every part of a sharded day, see export_shards) gets a
+sidecar next to it: ``2026-01-15-claude.md`` ->
+``2026-01-15-claude.offsets.jsonl``. The first line is a header object; each
+further line is one message block in file order:
+
+    [index, role, timestamp, start, length]
+
+``start`` and ``length`` are byte positions in the export, so a reader can
+seek straight to one message, or to the blocks of a time window, without
+parsing the markdown. ``timestamp`` is the one shown in the block. .pb
+fragments are recorded with role "fragment" and no timestamp.
+
+Appends add lines to the sidecar. A sidecar that does not describe its
+export (exports written before sidecars existed, hand edits) is rebuilt by
+scanning the export once.
+
+CLI:
+  python3 export_offsets.py get EXPORT [--message N] [--from TS] [--to TS]
+  python3 export_offsets.py rebuild EXPORT...
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+from chat_extractor_base import AtomicWriter, open_append, parse_timestamp
+from cold_storage import export_exists, export_stat, open_export
+
+OFFSETS_VERSION = 1
+FIELDS = ['index', 'role', 'timestamp', 'start', 'length']
+FRAGMENT_ROLE = 'fragment'
+
+# A block starts with its marker line and a blank line, followed by the timestamp line for
+# messages. Message text can hold the same lines, so a marker also has to carry the number
+# after the previous block's (see _next_marker)
+_MARKER = re.compile(rb'^### (?:Message (\d+): (\w+)\n\n\*\*Timestamp:\*\* ([^\n]*)\n|Fragment (\d+)\n\n)', re.M)
+_BLOCK_END = b"---\n\n"
+_SESSION_SEPARATOR = b"\n---\n\n"
+# The last line of a sidecar is looked for in reads of this size from its end
+_TAIL_CHUNK = 4096
+
+
+def offsets_filename(filename):
+    """``2026-01-15-claude.md`` -> ``2026-01-15-claude.offsets.jsonl``."""
+    return f"{os.path.splitext(filename)[0]}.offsets.jsonl"
+
+
+def offsets_path(export_path):
+    return os.path.join(os.path.dirname(export_path), offsets_filename(os.path.basename(export_path)))
+
+
+def _marker(index, role):
+    if role == FRAGMENT_ROLE:
+        return f"### Fragment {index}\n".encode()
+    return f"### Message {index}: {role.capitalize()}\n".encode('utf-8')
+
+
+def _lines(export_path, entries):
+    yield json.dumps({'version': OFFSETS_VERSION, 'export': os.path.basename(export_path),
+                      'fields': FIELDS}) + "\n"
+    for entry in entries:
+        yield json.dumps(list(entry), ensure_ascii=False, separators=(',', ':')) + "\n"
+
+
+def write_offsets(export_path, entries):
+    """Writes the sidecar of ``export_path`` from scratch."""
+    with AtomicWriter(offsets_path(export_path)) as f:
+        f.writelines(_lines(export_path, entries))
+
+
+def save_offsets(export_path, entries, appended_at=0):
+    """
+    Records the blocks of a write to ``export_path``. ``appended_at`` is the
+    size the export had before an append (0 for a new or rewritten export):
+    the new entries are appended if the sidecar covers those bytes, and the
+    sidecar is rebuilt from the export otherwise.
+    """
+    if not appended_at:
+        write_offsets(export_path, entries)
+    elif _covers(export_path, appended_at):
+        with open_append(offsets_path(export_path)) as f:
+            f.writelines(list(_lines(export_path, entries))[1:])
+    else:
+        write_offsets(export_path, scan_offsets(export_path))
+
+
+def load_offsets(export_path):
+    """Returns the entries of ``export_path``'s sidecar, or None if it is missing or stale."""
+    if not export_exists(export_path):
+        return None
+    return _read_entries(export_path, export_stat(export_path).st_size)
+
+
+def _read_entries(export_path, size):
+    """
+    The sidecar's entries if they describe the first ``size`` bytes of the
+    export (see _ends_at).
+    """
+    path = offsets_path(export_path)
+    if not export_exists(path):
+        return None
+    try:
+        with open_export(path, 'rb') as f:
+            lines = f.read().splitlines()
+        header = json.loads(lines[0])
+        # One parse for all entry lines instead of one per line
+        entries = [tuple(e) for e in json.loads(b'[' + b','.join(l for l in lines[1:] if l) + b']')]
+    except (OSError, ValueError, IndexError):
+        return None
+    if header.get('version') != OFFSETS_VERSION:
+        return None
+    return entries if _ends_at(export_path, entries[-1] if entries else None, size) else None
+
+
+def _covers(export_path, size):
+    """
+    True if the sidecar describes the first ``size`` bytes of the export,
+    judging by its header and last line only: what an append needs before it
+    adds lines, without parsing every entry.
+    """
+    path = offsets_path(export_path)
+    if not export_exists(path):
+        return False
+    try:
+        header, last = _first_and_last_lines(path)
+        header = json.loads(header)
+        last = json.loads(last)
+    except (OSError, ValueError):
+        return False
+    if header.get('version') != OFFSETS_VERSION:
+        return False
+    # A sidecar with no blocks yet ends with its header
+    try:
+        last = None if isinstance(last, dict) else tuple(last)
+        return _ends_at(export_path, last, size)
+    except (ValueError, TypeError):
+        return False
+
+
+def _first_and_last_lines(path):
+    """The first and last non-empty lines of a sidecar; a loose file is read backwards from its end."""
+    if not os.path.exists(path):
+        # Archived in cold storage: members are read whole anyway
+        with open_export(path, 'rb') as f:
+            lines = [l for l in f.read().splitlines() if l]
+        if not lines:
+            raise ValueError(f"{path} is empty")
+        return lines[0], lines[-1]
+    with open(path, 'rb') as f:
+        first = f.readline()
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            step = min(_TAIL_CHUNK, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            stripped = tail.rstrip(b'\n')
+            if b'\n' in stripped:
+                return first, stripped.rsplit(b'\n', 1)[1]
+        return first, tail.rstrip(b'\n')
+
+
+def _ends_at(export_path, last, size):
+    """
+    True if ``last`` (the sidecar's last entry, or None) starts at its marker
+    and ends within ``size``, and no block starts after it.
+    """
+    end = 0
+    with open_export(export_path, 'rb') as f:
+        if last:
+            index, role, _, start, length = last
+            end = start + length
+            marker = _marker(index, role)
+            f.seek(start)
+            if end > size or f.read(len(marker)) != marker:
+                return False
+        f.seek(end)
+        rest = f.read(size - end)
+    return _next_marker(rest, 0, last[0] + 1 if last else None) is None
+
+
+def _next_marker(data, pos, index=None):
+    """
+    The first block marker in ``data`` from ``pos`` numbered ``index`` (any
+    number if None), or None. Blocks are numbered one after another within an
+    export, so a marker quoted in message text rarely carries the next number.
+    """
+    for m in _MARKER.finditer(data, pos):
+        if index is None or int(m.group(1) or m.group(4)) == index:
+            return m
+    return None
+
+
+def scan_offsets(export_path):
+    """Rebuilds the entries of an export from its message and fragment markers."""
+    with open_export(export_path, 'rb') as f:
+        data = f.read()
+    entries = []
+    m = _next_marker(data, 0)
+    while m:
+        index = int(m.group(1) or m.group(4))
+        start = m.start()
+        following = _next_marker(data, m.end(), index + 1)
+        limit = following.start() if following else len(data)
+        # The block ends at the last block end before the next marker; headings, notes
+        # and session separators between the two belong to neither
+        end = data.rfind(_BLOCK_END, start, limit)
+        end = limit if end < 0 else end + len(_BLOCK_END)
+        if data.endswith(_BLOCK_END + _SESSION_SEPARATOR, start, end):
+            end -= len(_SESSION_SEPARATOR)
+        if m.group(4):
+            entries.append((index, FRAGMENT_ROLE, None, start, end - start))
+        else:
+            entries.append((index, m.group(2).decode().lower(), m.group(3).decode('utf-8'),
+                            start, end - start))
+        m = following
+    return entries
+
+
+def read_blocks(export_path, entries):
+    """Yields the text of each entry's block, reading only those bytes."""
+    with open_export(export_path, 'rb') as f:
+        for entry in entries:
+            f.seek(entry[3])
+            yield f.read(entry[4]).decode('utf-8')
+
+
+def select(entries, message=None, start=None, end=None):
+    """Entries for message number ``message`` and/or with timestamps in [start, end] (epoch ms)."""
+    for entry in entries:
+        if message is not None and entry[0] != message:
+            continue
+        if start is not None or end is not None:
+            ts = parse_timestamp(entry[2])
+            if ts is None or (start is not None and ts < start) or (end is not None and ts > end):
+                continue
+        yield entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read chat exports through their message offset sidecars")
+    sub = parser.add_subparsers(dest="command", required=True)
+    get = sub.add_parser("get", help="Print message blocks of an export without parsing it")
+    get.add_argument("export")
+    get.add_argument("--message", type=int, default=None, help="Message number")
+    get.add_argument("--from", dest="start", default=None, help="Earliest timestamp (ISO 8601)")
+    get.add_argument("--to", dest="end", default=None, help="Latest timestamp (ISO 8601)")
+    rebuild = sub.add_parser("rebuild", help="Write sidecars for exports by scanning them")
+    rebuild.add_argument("exports", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        for path in args.exports:
+            entries = scan_offsets(path)
+            write_offsets(path, entries)
+            print(f"{offsets_filename(os.path.basename(path))}: {len(entries)} blocks")
+        return
+
+    entries = load_offsets(args.export)
+    if entries is None:
+        print(f"No current offset sidecar for {args.export}; run 'rebuild' first", file=sys.stderr)
+        sys.exit(1)
+    window = [parse_timestamp(args.start), parse_timestamp(args.end)]
+    for flag, value, parsed in (("--from", args.start, window[0]), ("--to", args.end, window[1])):
+        if value and parsed is None:
+            parser.error(f"{flag}: not an ISO 8601 timestamp: {value}")
+    for block in read_blocks(args.export, select(entries, args.message, *window)):
+        sys.stdout.write(block)
+
+
+if __name__ == "__main__":
+    main()
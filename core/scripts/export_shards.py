@@ -0,0 +1,270 @@
+"""
+Size-bounded part files for heavy days.
+
+With a shard size set (``run_extraction.py --shard-mb``), a day's export
+rolls over into a new part file once the current part reaches that size.
+Rollover happens before a message block, never inside one.
+``2026-01-15-claude.md`` stays the first part and is followed by
+``2026-01-15-claude.part-2.md`` and so on. Message numbers continue
+across parts.
+
+An index next to the parts (``2026-01-15-claude.index.json``) lists, for
+each part, its file, message range and size, and for each session (by
+start time and session file) its message range and the parts it spans. Readers can use it
+to open only the part they need.
+
+Appends always go to the last part. A day that has an index keeps the
+shard size recorded there on runs without one. Each part has its own
+offset sidecar (see export_offsets).
+"""
+import os
+import json
+from contextlib import ExitStack
+
+from chat_extractor_base import get_output_path, AtomicWriter, OffsetWriter, open_append
+from cold_storage import export_exists, export_stat, open_export
+from export_offsets import offsets_path, save_offsets
+
+SHARD_INDEX_VERSION = 1
+
+
+def part_filename(filename, part):
+    """``2026-01-15-claude.md`` -> ``2026-01-15-claude.part-2.md``; part 1 keeps the name."""
+    if part == 1:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.part-{part}{ext}"
+
+
+def index_filename(filename):
+    """``2026-01-15-claude.md`` -> ``2026-01-15-claude.index.json``."""
+    return f"{os.path.splitext(filename)[0]}.index.json"
+
+
+def render_part_header(source_label, date_str, part, first_filename):
+    """Returns the header of a continuation part (part 1 has the standard export header)."""
+    return (f"# Complete Chat Session Export (Part {part})\n"
+            f"## Full Conversation from {source_label}\n\n"
+            f"**Date:** {date_str}\n"
+            f"**Platform:** {source_label}\n"
+            f"**Part:** {part}, continues {first_filename}\n\n"
+            "---\n\n")
+
+
+class DayShards:
+    """
+    The part files and index of one day's export. ``index`` is None for a
+    day that has never been sharded.
+    """
+
+    def __init__(self, filename, shard_bytes=None):
+        self.filename = filename
+        self.shard_bytes = shard_bytes
+        self.index_path = get_output_path(index_filename(filename))
+        self.index = self._load()
+        if self.index and not shard_bytes:
+            self.shard_bytes = self.index.get('shard_bytes')
+
+    def _load(self):
+        if not export_exists(self.index_path):
+            return None
+        try:
+            with open_export(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != SHARD_INDEX_VERSION or not data.get('parts'):
+            return None
+        return data
+
+    @property
+    def part_count(self):
+        return len(self.index['parts']) if self.index else 1
+
+    def current_path(self):
+        """Path of the part appends go to: the export itself unless the day is sharded."""
+        return get_output_path(self.index['parts'][-1]['file'] if self.index else self.filename)
+
+    def save(self, parts, sessions):
+        """Records ``parts`` and ``sessions`` in the index (only written for sharded days)."""
+        if not self.shard_bytes:
+            return
+        self.index = {
+            'version': SHARD_INDEX_VERSION,
+            'export': self.filename,
+            'shard_bytes': self.shard_bytes,
+            'parts': parts,
+            'sessions': sessions,
+        }
+        with AtomicWriter(self.index_path) as f:
+            json.dump(self.index, f, indent=1)
+            f.write("\n")
+
+
+class ShardWriter:
+    """
+    Writes one day's export through its DayShards, rolling over to a new
+    part before a message block once the current part has reached
+    ``shard_bytes``. Used as a context manager.
+
+    By default the day is rewritten: every part is written to a temporary
+    file and all of them are published together when the block exits
+    cleanly. With ``backup`` each replaced part is rotated to ``.backup``,
+    as are parts left over from a longer earlier rendering.
+
+    With ``append=True`` blocks are appended to the last part, which is
+    opened on the first block and gets ``separator`` written first.
+    ``last_index`` is the last message number already in the export.
+
+    The index and the offset sidecar of every part written to are saved only
+    on a clean exit.
+    """
+
+    def __init__(self, shards, source_label, date_str, append=False, backup=False,
+                 separator='', last_index=0):
+        self.shards = shards
+        self.source_label = source_label
+        self.date_str = date_str
+        self.append = append
+        self.backup = backup
+        self.separator = separator
+        self.backup_path = None
+        self.backup_error = None
+        self._stack = ExitStack()
+        self._writers = []
+        # (path, OffsetWriter, size before appending) of each part written to
+        self._outputs = []
+        self._f = None
+        index = shards.index
+        if append and index:
+            self.parts = [dict(p) for p in index['parts']]
+            self.sessions = [dict(s, parts=list(s['parts'])) for s in index['sessions']]
+        elif append:
+            self.parts = [{'file': shards.filename, 'first': 1 if last_index else None,
+                           'last': last_index or None, 'bytes': 0}]
+            self.sessions = []
+        else:
+            self.parts, self.sessions = [], []
+        self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.append:
+            if self._f is not None:
+                self._f.f.close()
+                if exc_type is None:
+                    self.parts[-1]['bytes'] = self._f.offset
+                    self.shards.save(self.parts, self._written_sessions())
+                    self._save_offsets()
+            return False
+        if exc_type is None and self._f is None:
+            self._open_part(1)
+        if self.parts:
+            self.parts[-1]['bytes'] = self._f.offset
+        self._stack.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            first = self._writers[0]
+            self.backup_path, self.backup_error = first.backup_path, first.backup_error
+            for part in range(len(self.parts) + 1, self.shards.part_count + 1):
+                path = get_output_path(part_filename(self.shards.filename, part))
+                self._retire(path)
+                self._retire(offsets_path(path))
+            self.shards.save(self.parts, self._written_sessions())
+            self._save_offsets()
+        return False
+
+    def _save_offsets(self):
+        for path, out, appended_at in self._outputs:
+            save_offsets(path, out.entries, appended_at)
+
+    def _written_sessions(self):
+        return [s for s in self.sessions if s['first'] is not None]
+
+    def _retire(self, path):
+        if os.path.exists(path):
+            os.replace(path, path + ".backup")
+
+    def _open_part(self, part):
+        name = part_filename(self.shards.filename, part)
+        path = get_output_path(name)
+        if self.append:
+            if self._f is not None:
+                self._f.f.close()
+            size = export_stat(path).st_size if export_exists(path) else 0
+            self._f = OffsetWriter(open_append(path), size)
+        else:
+            writer = AtomicWriter(path, backup=self.backup)
+            self._f = OffsetWriter(self._stack.enter_context(writer))
+            self._writers.append(writer)
+        self._outputs.append((path, self._f, self._f.offset))
+        if part > len(self.parts):
+            self.parts.append({'file': name, 'first': None, 'last': None, 'bytes': 0})
+        if part > 1 and self._f.offset == 0:
+            self._f.write(render_part_header(self.source_label, self.date_str, part, self.shards.filename))
+
+    def _roll_if_full(self):
+        """Opens the first or next part as needed before a message block."""
+        if self._f is None:
+            if not self.append:
+                self._open_part(1)
+                return
+            self._open_part(len(self.parts))
+            if not self._full():
+                self._f.write(self.separator)
+                return
+        if self._full():
+            self.parts[-1]['bytes'] = self._f.offset
+            self._open_part(len(self.parts) + 1)
+
+    def _full(self):
+        limit = self.shards.shard_bytes
+        return bool(limit and self.parts[-1]['last'] and self._f.offset >= limit)
+
+    def write(self, text):
+        """Writes text that is not a message block (headers, separators) to the current part."""
+        if self._f is None:
+            self._roll_if_full()
+        self._f.write(text)
+
+    def start_session(self, started, source, heading=''):
+        """
+        Starts the entry of the session that started at ``started`` in file
+        ``source`` (its stem); ``heading`` goes to the part its first message
+        lands in.
+        """
+        self._roll_if_full()
+        self._session = None
+        self._track_session(started, source)
+        if heading:
+            self._f.write(heading)
+
+    def write_message(self, number, role, timestamp, block, started=None, source=None):
+        """Writes message ``number``'s rendered block of a session (empty blocks are skipped)."""
+        if not block:
+            return
+        self._roll_if_full()
+        self._f.write_message(number, role, timestamp, block)
+        part = self.parts[-1]
+        if part['first'] is None:
+            part['first'] = number
+        part['last'] = number
+        session = self._track_session(started, source)
+        if session['first'] is None:
+            session['first'] = number
+        session['last'] = number
+        if part['file'] not in session['parts']:
+            session['parts'].append(part['file'])
+
+    def _track_session(self, started, source):
+        # Sessions can start in the same second, so the file tells them apart
+        key = (started, source)
+        if self._session is None or (self._session['started'], self._session.get('source')) != key:
+            last = self.sessions[-1] if self.sessions else None
+            if self.append and last and (last['started'], last.get('source')) == key:
+                self._session = last
+            else:
+                self._session = {'started': started, 'source': source, 'first': None, 'last': None, 'parts': []}
+                self.sessions.append(self._session)
+        return self._session
@@ -0,0 +1,186 @@
+"""
+Streaming splitter for Claude Markdown exports.
+
+An export is read line by line and cut into message blocks at the
+``### Message N: User|Assistant`` markers. Each block is parsed on its own
+and rendered straight into a spool file for its day; when the input is
+exhausted every day is published as header + spooled body. Peak memory is one
+message block plus the write buffers, independent of the export size. The
+offsets of each day's blocks are spooled alongside and published as its
+offset sidecar (see export_offsets).
+"""
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+
+from chat_extractor_base import (AtomicWriter, render_markdown_header, render_message_block,
+                                 utf8_len)
+from export_offsets import write_offsets
+
+_MARKER = re.compile(r'### Message \d+: (User|Assistant)')
+_TIMESTAMP = re.compile(r'\*\*Timestamp:\*\* ([\d\-T:]+)')
+_CONTENT_START = '**Content:**\n\n'
+_THINKING_START = '**Thinking Block:**\n\n```\n'
+
+# Spool file pairs (blocks, offsets) kept open at once; older ones are closed and reopened on demand
+MAX_OPEN_SPOOLS = 64
+
+
+def iter_message_blocks(f):
+    """
+    Yields (role_label, block_text) for every message marker in the text file
+    ``f``. Text before the first marker (the export header) is skipped. The
+    marker cannot span lines, so splitting each line gives the same blocks as
+    splitting the whole file.
+    """
+    role = None
+    lines = []
+    for line in f:
+        if '### Message ' not in line:
+            if role is not None:
+                lines.append(line)
+            continue
+        parts = _MARKER.split(line)
+        if len(parts) == 1:
+            if role is not None:
+                lines.append(line)
+            continue
+        if role is not None:
+            lines.append(parts[0])
+        for i in range(1, len(parts), 2):
+            if role is not None:
+                yield role, ''.join(lines)
+            role = parts[i]
+            lines = [parts[i + 1]]
+    if role is not None:
+        yield role, ''.join(lines)
+
+
+def _section(block_text, opener, closer, optional_close):
+    """
+    Returns the text between the first ``opener`` and the next ``closer``
+    (or the end of the block if ``optional_close``), or None. Same result as
+    a lazy DOTALL regex, without its per-character lookahead.
+    """
+    start = block_text.find(opener)
+    if start < 0:
+        return None
+    start += len(opener)
+    end = block_text.find(closer, start)
+    if end < 0:
+        if not optional_close:
+            return None
+        end = len(block_text)
+    return block_text[start:end]
+
+
+def parse_message_block(role_label, block_text):
+    """Returns the message dict for one block: date, role, timestamp, content, thinking."""
+    role = 'user' if 'user' in role_label.lower() else 'assistant'
+
+    ts_match = _TIMESTAMP.search(block_text)
+    msg_date = "Unknown"
+    if ts_match:
+        try:
+            dt = datetime.fromisoformat(ts_match.group(1).replace("Z", "+00:00"))
+            msg_date = dt.strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+
+    content = _section(block_text, _CONTENT_START, '\n\n---', optional_close=True)
+    thinking = _section(block_text, _THINKING_START, '\n```', optional_close=False)
+    return {
+        'date': msg_date,
+        'role': role,
+        'content': content.strip() if content else "",
+        'thinking': thinking.strip() if thinking else "",
+        'timestamp': ts_match.group(1) if ts_match else None,
+    }
+
+
+class DaySpoolWriters:
+    """
+    Renders message blocks into one spool file per day, numbering them in
+    arrival order, and publishes each day as a complete export once the
+    message count for its header is known.
+    """
+
+    def __init__(self, spool_dir=None):
+        self._spool_parent = spool_dir
+        self._spool_dir = None
+        self._open = OrderedDict()
+        # Per-day message counts in first-seen order (one entry per day)
+        self.counts = {}
+        # Per-day spooled bytes: where the next block starts, before the header
+        self._sizes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spool_path(self, date):
+        return os.path.join(self._spool_dir, f"{date}.md")
+
+    def _offsets_path(self, date):
+        return os.path.join(self._spool_dir, f"{date}.offsets")
+
+    def _handle(self, date):
+        handles = self._open.get(date)
+        if handles is not None:
+            self._open.move_to_end(date)
+            return handles
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.mkdtemp(prefix='kg-split-', dir=self._spool_parent)
+        if len(self._open) >= MAX_OPEN_SPOOLS:
+            for f in self._open.popitem(last=False)[1]:
+                f.close()
+        handles = (open(self._spool_path(date), 'a', encoding='utf-8'),
+                   open(self._offsets_path(date), 'a', encoding='utf-8'))
+        self._open[date] = handles
+        return handles
+
+    def add(self, msg):
+        """Appends ``msg`` to its day's spool as the next numbered block."""
+        date = msg['date']
+        index = self.counts.get(date, 0) + 1
+        self.counts[date] = index
+        block = render_message_block(index, msg['role'], msg['timestamp'], msg['content'], msg['thinking'])
+        start = self._sizes.get(date, 0)
+        length = utf8_len(block)
+        self._sizes[date] = start + length
+        spool, offsets = self._handle(date)
+        spool.write(block)
+        offsets.write(f"{index} {msg['role']} {msg['timestamp']} {start} {length}\n")
+
+    def publish(self, date, output_path, source_label):
+        """Writes header + spooled blocks for ``date`` atomically to ``output_path``, then its offset sidecar."""
+        for f in self._open.pop(date, ()):
+            f.close()
+        header = render_markdown_header(source_label, self.counts[date], date)
+        with AtomicWriter(output_path) as out:
+            out.write(header)
+            with open(self._spool_path(date), 'r', encoding='utf-8') as spool:
+                shutil.copyfileobj(spool, out)
+        write_offsets(output_path, self._spooled_offsets(date, utf8_len(header)))
+
+    def _spooled_offsets(self, date, shift):
+        with open(self._offsets_path(date), 'r', encoding='utf-8') as f:
+            for line in f:
+                index, role, timestamp, start, length = line.split()
+                yield (int(index), role, None if timestamp == 'None' else timestamp,
+                       int(start) + shift, int(length))
+
+    def close(self):
+        """Closes open spools and removes the spool directory."""
+        for handles in self._open.values():
+            for f in handles:
+                f.close()
+        self._open.clear()
+        if self._spool_dir:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+            self._spool_dir = None
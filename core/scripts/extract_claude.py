@@ -3,43 +3,276 @@ import argparse
 import re
 import json
 import glob
+import time
 from datetime import datetime
+from operator import attrgetter
 from typing import List, Dict, Any, Optional
-import re
-from chat_extractor_base import get_output_path, format_timestamp, write_markdown_header, write_message_block
+from chat_extractor_base import (get_output_path, get_cache_dir, parse_timestamp,
+                                 render_markdown_header, map_in_workers,
+                                 DateWindow, Message, SourceRoot)
+from extraction_manifest import ExtractionManifest
+from day_spill_store import DaySpillStore
+from export_splitter import DaySpoolWriters, iter_message_blocks, parse_message_block
+from export_shards import DayShards, ShardWriter
+from output_sync_index import OutputSyncIndex, message_id
+from content_dedup import ContentDeduper, DEFAULT_DEDUP, count_written
+from jsonl_ingest import loads, map_file, iter_line_spans
+from extraction_stats import STATS
+from cold_storage import export_exists, export_stat, open_export
 
-CLAUDE_PROJECTS_DIR = os.path.expanduser("~/.claude/projects")
+# The default root's projects folder (see SourceRoot)
+CLAUDE_PROJECTS_DIR = SourceRoot().claude_projects_dir
 
 def parse_metadata_from_file(file_path: str) -> tuple[Optional[str], int]:
-    """Parses the existing file to find the last message index and timestamp."""
-    if not os.path.exists(file_path):
+    """
+    Parses the existing file to find the last message index and timestamp.
+    Only used for exports without a matching sync sidecar (see output_sync_index).
+    """
+    if not export_exists(file_path):
         return None, 0
-    
+
     last_ts = None
     last_idx = 0
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # Read last few KB for efficiency
-            f.seek(0, os.SEEK_END)
-            size = f.tell()
-            f.seek(max(0, size - 10240), os.SEEK_SET)
-            tail = f.read()
-            
-            # Find last timestamp
-            ts_matches = re.findall(r'\*\*Timestamp:\*\* ([\d\-T:]+)', tail)
-            if ts_matches:
-                last_ts = ts_matches[-1]
-            
-            # Find last message index
-            idx_matches = re.findall(r'### Message (\d+):', tail)
-            if idx_matches:
-                last_idx = int(idx_matches[-1])
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                # Read last few KB for efficiency
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 10240), os.SEEK_SET)
+                tail = f.read()
+        else:
+            # Archived in cold storage: one day per member, read it whole
+            with open_export(file_path) as f:
+                tail = f.read()[-10240:]
+
+        # Find last timestamp
+        ts_matches = re.findall(r'\*\*Timestamp:\*\* ([\d\-T:]+)', tail)
+        if ts_matches:
+            last_ts = ts_matches[-1]
+
+        # Find last message index
+        idx_matches = re.findall(r'### Message (\d+):', tail)
+        if idx_matches:
+            last_idx = int(idx_matches[-1])
     except Exception as e:
         print(f"Warning: Could not parse metadata from {file_path}: {e}")
     return last_ts, last_idx
 
+# Only records of these types can produce a message. Once a file's session date
+# is known, lines that do not match are skipped without being decoded.
+_MESSAGE_RECORD = re.compile(rb'"type"\s*:\s*"(?:user|assistant)"')
+
+def _capture_session_date(obj, state):
+    """Sets the session date/time in ``state`` from the first record with a timestamp."""
+    if not state.get('date') and obj.get('timestamp'):
+        try:
+            dt = datetime.fromisoformat(obj['timestamp'].replace("Z", "+00:00"))
+            state['date'] = dt.strftime("%Y-%m-%d")
+            state['ts_str'] = dt.strftime("%H%M%S")
+        except: pass
+
+def read_claude_session_date(jsonl_path):
+    """
+    Returns the session date of a JSONL file (the date of its first timestamped
+    record) without parsing any messages, or None if no record has one.
+    """
+    state = {}
+    with map_file(jsonl_path) as buf:
+        for line_start, line_end in iter_line_spans(buf, 0, len(buf)):
+            if buf.find(b'"timestamp"', line_start, line_end) == -1:
+                continue
+            try:
+                obj = loads(buf[line_start:line_end])
+            except ValueError:
+                continue
+            if isinstance(obj, dict):
+                _capture_session_date(obj, state)
+                if state.get('date'):
+                    return state['date']
+    return None
+
+def _parse_claude_lines(buf, start, end, state, fast=True, counts=None):
+    """
+    Parses the JSONL lines in buf[start:end] into message dicts.
+    ``state`` carries the session date/time across calls and is updated in place.
+    Decoded/discarded line totals are added to ``counts`` when given.
+    """
+    messages = []
+    decoded = discarded = 0
+    for line_start, line_end in iter_line_spans(buf, start, end):
+        if fast and state.get('date') and not _MESSAGE_RECORD.search(buf, line_start, line_end):
+            discarded += 1
+            continue
+        try:
+            obj = loads(buf[line_start:line_end], fast)
+        except ValueError:
+            discarded += 1
+            continue
+        decoded += 1
+
+        # Capture timestamp for filename from the first message with one
+        _capture_session_date(obj, state)
+
+        if obj.get('type') == 'user' and 'message' in obj:
+            content_list = obj['message'].get('content', [])
+            text = ''.join(i.get('text', '') for i in content_list if isinstance(i, dict))
+            if text.strip():
+                messages.append(Message('user', obj.get('timestamp'), text, uuid=obj.get('uuid')))
+        elif obj.get('type') == 'assistant' and 'message' in obj:
+            content_list = obj['message'].get('content', [])
+            thinking, text = '', ''
+            for item in content_list:
+                if isinstance(item, dict):
+                    if 'thinking' in item: thinking = item['thinking']
+                    if 'text' in item: text = item['text']
+            if thinking or text:
+                messages.append(Message('assistant', obj.get('timestamp'), text, thinking,
+                                        uuid=obj.get('uuid')))
+    if counts is not None:
+        counts['lines_decoded'] += decoded
+        counts['lines_discarded'] += discarded
+    return messages
+
+def parse_claude_jsonl(jsonl_path, offset=0, state=None, fast=True):
+    """
+    Parses a Claude JSONL file starting at byte ``offset``.
+
+    Only lines terminated by a newline are "committed": their messages, the
+    parser state after them and the end offset can be cached and resumed from.
+    A trailing unterminated line (a record still being written) is parsed into
+    ``pending`` so the current run sees it, but it is re-read next time.
+    ``fast=False`` disables the record prefilter and optional JSON backend.
+
+    Returns a dict with keys: messages, offset, state, pending, pending_state
+    and stats (seconds, bytes_read, lines_decoded, lines_discarded).
+    """
+    start = time.perf_counter()
+    state = dict(state or {})
+    counts = {'lines_decoded': 0, 'lines_discarded': 0}
+    with map_file(jsonl_path) as buf:
+        size = len(buf)
+        cut = buf.rfind(b'\n', offset) + 1 if offset < size else offset
+        cut = max(cut, offset)
+        messages = _parse_claude_lines(buf, offset, cut, state, fast, counts)
+        committed_state = dict(state)
+        pending = _parse_claude_lines(buf, cut, size, state, fast, counts) if cut < size else []
+    counts['bytes_read'] = max(0, size - offset)
+    counts['seconds'] = time.perf_counter() - start
+    return {
+        'messages': messages,
+        'offset': cut,
+        'state': committed_state,
+        'pending': pending,
+        'pending_state': state,
+        'stats': counts,
+    }
+
+def _plan_claude_file(jsonl_path, manifest=None, window=None):
+    """
+    Decides how much of a JSONL file has to be parsed this run.
+    Returns None for empty files and for files whose session date falls
+    outside ``window``; otherwise a plan dict holding the stat result and the
+    resumable manifest entry (or None). Cached messages are only loaded when
+    the file is finished, so planning stays cheap for large histories.
+    """
+    st = os.stat(jsonl_path)
+    # Skip empty files
+    if st.st_size == 0:
+        return None
+
+    # Prune by date before decoding: last-write time first, then the session
+    # date recorded in the manifest or read from the first timestamped record
+    if window and not window.is_open() and window.excludes_mtime(st.st_mtime):
+        return None
+
+    entry = manifest.resume_point(jsonl_path, st) if manifest else None
+    if entry and not manifest.has_messages(jsonl_path):
+        entry = None
+
+    if window and not window.is_open():
+        session_date = entry['state'].get('date') if entry else None
+        if not session_date:
+            session_date = read_claude_session_date(jsonl_path)
+        if not session_date or not window.contains(session_date):
+            return None
+    return {'path': jsonl_path, 'st': st, 'entry': entry}
+
+def _plan_needs_parse(plan):
+    return not (plan['entry'] and plan['entry']['offset'] == plan['st'].st_size)
+
+def _plan_job(plan):
+    entry = plan['entry']
+    return (plan['path'], entry['offset'] if entry else 0, entry['state'] if entry else None)
+
+def _parse_claude_job(job):
+    """Process-pool entry point: parses one planned file, returning errors as values."""
+    try:
+        return parse_claude_jsonl(*job)
+    except Exception as e:
+        return {'error': str(e)}
+
+def _finish_claude_file(plan, parsed=None, manifest=None):
+    """
+    Combines cached and newly parsed messages into a session dict, recording
+    the new parse position in the manifest. Returns None if the file has no
+    dated messages.
+    """
+    jsonl_path, st, entry = plan['path'], plan['st'], plan['entry']
+    with STATS.phase('read'):
+        cached = manifest.load_messages(jsonl_path) if entry else []
+    if cached:
+        cached = [Message.from_dict(m) for m in cached]
+    elif cached is None:
+        # Cache vanished since planning: fall back to a full parse
+        entry, cached, parsed = None, [], parse_claude_jsonl(jsonl_path)
+        STATS.record_parse(parsed['stats'])
+
+    if parsed is None:
+        # Nothing appended since the last run
+        manifest.touch(jsonl_path, st)
+        messages, state = list(cached), entry['state']
+    else:
+        committed = cached + parsed['messages']
+        if manifest:
+            if parsed['messages'] or not entry or parsed['offset'] != entry['offset']:
+                manifest.update(jsonl_path, st, parsed['offset'], parsed['state'],
+                                [m.to_dict() for m in parsed['messages']], cached=len(cached))
+            else:
+                manifest.touch(jsonl_path, st)
+        messages, state = committed + parsed['pending'], parsed['pending_state']
+
+    session_date = state.get('date')
+    if not (messages and session_date):
+        return None
+
+    # Sort messages on their epoch timestamps
+    with STATS.phase('sort'):
+        messages.sort(key=attrgetter('ts'))
+    return {
+        'date': session_date,
+        'ts_str': state.get('ts_str') or "000000",
+        'messages': messages,
+        'count': len(messages),
+        'source_path': jsonl_path,
+    }
+
+def load_claude_session(jsonl_path, manifest=None):
+    """
+    Returns the session dict for one JSONL file, or None if it has no messages.
+    With a manifest, unchanged files are served from the parse cache and
+    growing files are only read from their last committed offset.
+    """
+    plan = _plan_claude_file(jsonl_path, manifest)
+    if plan is None:
+        return None
+    parsed = parse_claude_jsonl(*_plan_job(plan)) if _plan_needs_parse(plan) else None
+    return _finish_claude_file(plan, parsed, manifest)
+
 def extract_claude_sessions(days_back=None, date_filter=None, after_date=None,
-                             before_date=None, project_filter=None, incremental=False):
+                             before_date=None, project_filter=None, incremental=False,
+                             rescan=False, workers=1, memory_limit_mb=None, message_store=None,
+                             dedup=DEFAULT_DEDUP, shard_mb=None, root=None):
     """
     Scans Claude project directories for jsonl files and extracts them.
 
@@ -50,296 +283,407 @@ def extract_claude_sessions(days_back=None, date_filter=None, after_date=None,
         before_date: Extract only sessions on or before this date (YYYY-MM-DD, inclusive)
         project_filter: Filter to sessions from a specific project (path fragment match)
         incremental: Skip extraction if file already exists and is current
+        rescan: Ignore the extraction manifest and re-parse every file (manifest is rebuilt)
+        workers: Number of processes used to parse files (1 = serial, 0 = one per CPU)
+        memory_limit_mb: Buffer size before parsed sessions are spilled to disk
+        message_store: Optional MessageStore; changed sessions are stored and
+            days are rendered from it instead of from an in-run DaySpillStore
+        dedup: How text repeated between a session and its subagent
+            transcripts is written: 'drop', 'ref' (reference to the first
+            copy) or 'off' (see content_dedup)
+        shard_mb: Roll a day's export over into part files at this size
+            (see export_shards); None keeps one file per day
+        root: SourceRoot to read ``.claude/projects`` from (default: the
+            current user's home); a labelled root writes labelled exports
 
     Returns a list of processing results.
     """
-    results = []
+    root = root or SourceRoot()
+    with STATS.phase('discovery'):
+        manifest = ExtractionManifest(get_cache_dir(), root.key('claude'))
+        if rescan:
+            manifest.clear()
+        window = DateWindow(date_filter, after_date, before_date)
+        jsonl_files = _find_claude_files(root, project_filter)
+        seen_paths = set(jsonl_files)
+        if message_store is not None:
+            message_store.prune(root.key('claude'))
+
+    results = _extract_claude_paths(jsonl_files, manifest, window, incremental,
+                                    workers, memory_limit_mb, message_store, render_missing=True,
+                                    dedup=dedup, shard_mb=shard_mb, root=root)
+    manifest.prune(seen_paths)
+    manifest.save()
+    return results
+
+def _find_claude_files(root, project_filter=None):
+    """Returns every session file (subagents included) of the projects under ``root``."""
     # Find all project directories
-    project_dirs = glob.glob(os.path.join(CLAUDE_PROJECTS_DIR, "*"))
+    project_dirs = glob.glob(os.path.join(root.claude_projects_dir, "*"))
 
     # Filter project directories by path fragment if --project provided
     if project_filter:
         project_dirs = [d for d in project_dirs
                         if project_filter.lower() in os.path.basename(d).lower()]
-    
-    # Collect all sessions first
-    all_sessions = []
-    
+
+    # Find jsonl files in each project recursively (including subagents)
+    jsonl_files = []
     for project_dir in project_dirs:
-        # Find jsonl files in each project recursively (including subagents)
-        jsonl_files = glob.glob(os.path.join(project_dir, "**", "*.jsonl"), recursive=True)
-        
+        jsonl_files.extend(os.path.abspath(p) for p in
+                           glob.glob(os.path.join(project_dir, "**", "*.jsonl"), recursive=True))
+    return jsonl_files
+
+def has_pending_files(root=None, project_filter=None, rescan=False):
+    """
+    Returns True if a session file under ``root`` is new or changed since the
+    manifest was saved (always with ``rescan``). A stat pass, no parsing:
+    run_plan uses it to leave the worker pool out when there is nothing to do.
+    """
+    if rescan:
+        return True
+    root = root or SourceRoot()
+    manifest = ExtractionManifest(get_cache_dir(), root.key('claude'))
+    for jsonl_path in _find_claude_files(root, project_filter):
+        entry = manifest.entries.get(jsonl_path)
+        try:
+            st = os.stat(jsonl_path)
+        except OSError:
+            continue
+        if entry is None or (entry['size'], entry['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+            return True
+    return False
+
+def extract_claude_files(jsonl_files, manifest=None, message_store=None, dedup=DEFAULT_DEDUP,
+                         shard_mb=None, root=None):
+    """
+    Extracts only ``jsonl_files`` (e.g. files reported changed by a watcher)
+    of ``root`` (default: the current user's home). Each file is read from its
+    last committed manifest offset, or from the start if it was rotated or
+    rewritten; exports receive only the messages their sync sidecar has not
+    seen. Pass a long-lived ``manifest`` to avoid reloading it for every batch.
+    """
+    root = root or SourceRoot()
+    if manifest is None:
+        manifest = ExtractionManifest(get_cache_dir(), root.key('claude'))
+    jsonl_files = [os.path.abspath(p) for p in jsonl_files if os.path.exists(p)]
+    results = _extract_claude_paths(jsonl_files, manifest, DateWindow(), message_store=message_store,
+                                    dedup=dedup, shard_mb=shard_mb, root=root)
+    manifest.save()
+    return results
+
+def _claude_project(jsonl_path, projects_dir):
+    """Returns the project folder name (e.g. ``-Users-me-repo``) a session file belongs to."""
+    return os.path.relpath(jsonl_path, projects_dir).split(os.sep)[0]
+
+def _session_scope(jsonl_path):
+    """
+    Returns the dedup scope of a session file: the parent session's path
+    without extension, shared by ``<session>.jsonl`` and the transcripts in
+    ``<session>/subagents/``.
+    """
+    folder = os.path.dirname(jsonl_path)
+    if os.path.basename(folder) == 'subagents':
+        return os.path.dirname(folder)
+    return os.path.splitext(jsonl_path)[0]
+
+def _session_stem(session):
+    """The session's file name without extension, which tells day-shard index entries apart."""
+    return os.path.splitext(os.path.basename(session['source_path']))[0]
+
+def _extract_claude_paths(jsonl_files, manifest, window, incremental=False,
+                          workers=1, memory_limit_mb=None, message_store=None,
+                          render_missing=False, dedup=DEFAULT_DEDUP, shard_mb=None, root=None):
+    """
+    Plans, parses and groups ``jsonl_files``, then writes the affected days:
+    those a new or grown file contributes to. With ``render_missing``, days
+    whose export is missing are written too.
+    """
+    root = root or SourceRoot()
+    source = root.key('claude')
+    results = []
+    STATS.count('files_scanned', len(jsonl_files))
+
+    # Plan every file first so only new bytes are handed to the parser
+    plans = []
+    with STATS.phase('filter'):
         for jsonl_path in jsonl_files:
-            # Skip empty files
-            if os.path.getsize(jsonl_path) == 0:
-                continue
-                
-            messages = []
-            session_date = None
-            session_ts_str = None
-            
             try:
-                with open(jsonl_path, 'r') as f:
-                    for line in f:
-                        try:
-                            obj = json.loads(line)
-                            
-                            # Capture timestamp for filename from the first message with one
-                            if not session_date and obj.get('timestamp'):
-                                try:
-                                    dt = datetime.fromisoformat(obj['timestamp'].replace("Z", "+00:00"))
-                                    session_date = dt.strftime("%Y-%m-%d")
-                                    session_ts_str = dt.strftime("%H%M%S")
-                                except: pass
-
-                            if obj.get('type') == 'user' and 'message' in obj:
-                                content_list = obj['message'].get('content', [])
-                                text = ''.join(i.get('text', '') for i in content_list if isinstance(i, dict))
-                                if text.strip():
-                                    messages.append({
-                                        'role': 'user', 
-                                        'content': text, 
-                                        'timestamp': obj.get('timestamp')
-                                    })
-                            elif obj.get('type') == 'assistant' and 'message' in obj:
-                                content_list = obj['message'].get('content', [])
-                                thinking, text = '', ''
-                                for item in content_list:
-                                    if isinstance(item, dict):
-                                        if 'thinking' in item: thinking = item['thinking']
-                                        if 'text' in item: text = item['text']
-                                if thinking or text:
-                                    messages.append({
-                                        'role': 'assistant', 
-                                        'thinking': thinking, 
-                                        'content': text, 
-                                        'timestamp': obj.get('timestamp')
-                                    })
-                        except json.JSONDecodeError: continue
+                plan = _plan_claude_file(jsonl_path, manifest, window)
             except Exception as e:
                 print(f"Error reading {jsonl_path}: {e}")
                 continue
+            if plan:
+                plans.append(plan)
+            else:
+                STATS.count('files_skipped')
 
-            if messages and session_date:
-                # Sort messages
-                messages.sort(key=lambda x: x.get('timestamp', ''))
-                all_sessions.append({
-                    'date': session_date,
-                    'ts_str': session_ts_str or "000000",
-                    'messages': messages,
-                    'count': len(messages)
-                })
-
-    # Group by date
-    from collections import defaultdict
-    sessions_by_date = defaultdict(list)
-    for session in all_sessions:
-        sessions_by_date[session['date']].append(session)
+    # Parse (optionally across a process pool); results keep file order
+    jobs = (_plan_job(plan) for plan in plans if _plan_needs_parse(plan))
+    parsed_results = map_in_workers(_parse_claude_job, jobs, workers)
+
+    # Group by date, spilling to disk once the memory limit is reached. With a
+    # message store, sessions go there instead and only their days are tracked
+    stored_days = {}
+    # Unchanged files per day, loaded from the parse cache only if the day is rendered
+    cached_days = {}
+    with DaySpillStore(memory_limit_mb) as store:
+        for seq, plan in enumerate(plans):
+            parsed = next(parsed_results) if _plan_needs_parse(plan) else None
+            if parsed is not None and 'error' in parsed:
+                print(f"Error reading {plan['path']}: {parsed['error']}")
+                continue
+            if parsed is None:
+                STATS.count('files_cached')
+            else:
+                STATS.record_parse(parsed['stats'])
+            if (message_store is not None and parsed is None
+                    and message_store.source_unchanged(plan['path'], plan['st'])):
+                # Already stored: the day is all that is needed to render it
+                manifest.touch(plan['path'], plan['st'])
+                stored_days.setdefault(plan['entry']['state'].get('date'))
+                continue
+            if message_store is None and parsed is None:
+                manifest.touch(plan['path'], plan['st'])
+                date = plan['entry']['state'].get('date')
+                if date:
+                    cached_days.setdefault(date, []).append((seq, plan))
+                continue
+            try:
+                session = _finish_claude_file(plan, parsed, manifest)
+            except Exception as e:
+                print(f"Error reading {plan['path']}: {e}")
+                continue
+            if session:
+                with STATS.phase('group'):
+                    if message_store is None:
+                        store.add(session, seq)
+                    else:
+                        message_store.add_session(source, plan['path'], session,
+                                                  _claude_project(plan['path'], root.claude_projects_dir))
+                        stored_days.setdefault(session['date'])
+            if message_store is not None:
+                message_store.mark_source(plan['path'], plan['st'])
+
+        # A day is rendered if a file on it grew or (with render_missing) its
+        # export is gone; only then are its unchanged files' messages decoded
+        for date, cached in cached_days.items():
+            if date not in store.session_counts and not (
+                    render_missing and not export_exists(get_output_path(root.export_name(date, 'claude')))):
+                continue
+            for seq, plan in cached:
+                try:
+                    session = _finish_claude_file(plan, None, manifest)
+                except Exception as e:
+                    print(f"Error reading {plan['path']}: {e}")
+                    continue
+                if session:
+                    with STATS.phase('group'):
+                        store.add(session, seq)
+
+        with STATS.phase('render'):
+            if message_store is not None:
+                message_store.commit()
+                if render_missing:
+                    for date in message_store.days(source):
+                        if date not in stored_days and not export_exists(get_output_path(root.export_name(date, 'claude'))):
+                            stored_days[date] = None
+                store = message_store.day_view(source, [d for d in stored_days if d])
+            shard_bytes = int(shard_mb * 1024 * 1024) if shard_mb else None
+            results.extend(_write_claude_days(store, window, incremental, dedup, shard_bytes, root))
+
+    return results
+
+def _write_claude_days(store, window, incremental=False, dedup=DEFAULT_DEDUP, shard_bytes=None,
+                       root=None):
+    """
+    Writes one markdown file per day held in ``store`` (or its part files, see
+    export_shards), named for ``root``; returns result lines.
+    """
+    root = root or SourceRoot()
+    platform = root.platform("Claude Code")
+    results = []
 
     # Apply date filtering
-    if date_filter:
-        sessions_by_date = {k: v for k, v in sessions_by_date.items() if k == date_filter}
-    else:
-        if after_date:
-            sessions_by_date = {k: v for k, v in sessions_by_date.items() if k >= after_date}
-        if before_date:
-            sessions_by_date = {k: v for k, v in sessions_by_date.items() if k <= before_date}
+    dates = window.filter(store.dates())
 
     # Apply incremental mode (skip if file exists and has recent content)
     if incremental:
-        filtered_dates = {}
-        for date, sessions in sessions_by_date.items():
-            filename = f"{date}-claude.md"
+        filtered_dates = []
+        for date in dates:
+            filename = root.export_name(date, 'claude')
             output_path = get_output_path(filename)
             if not os.path.exists(output_path):
-                filtered_dates[date] = sessions
+                filtered_dates.append(date)
             else:
                 # Check if file is recent (modified in last hour)
                 file_time = os.path.getmtime(output_path)
                 age_seconds = datetime.now().timestamp() - file_time
                 if age_seconds > 3600:  # Older than 1 hour
-                    filtered_dates[date] = sessions
+                    filtered_dates.append(date)
                 else:
                     results.append(f"Skipped {filename} (already current, modified {int(age_seconds/60)} min ago)")
-        sessions_by_date = filtered_dates
+        dates = filtered_dates
 
     # Write files
-    for date, sessions in sessions_by_date.items():
-        # Sort sessions by timestamp within the day
-        sessions.sort(key=lambda x: x['ts_str'])
-        
-        filename = f"{date}-claude.md"
-        output_path = get_output_path(filename)
+    for date in dates:
+        # Sessions are streamed in timestamp order within the day
+        sessions = store.iter_sessions(date)
+        session_count = store.session_counts[date]
         
-        last_ts, last_idx = parse_metadata_from_file(output_path)
+        filename = root.export_name(date, 'claude')
+        # Appends go to the day's last part; the sidecar describes that file
+        shards = DayShards(filename, shard_bytes)
+        output_path = shards.current_path()
+
+        sync = OutputSyncIndex(get_cache_dir(), filename)
+        synced = sync.matches(output_path)
+        if synced:
+            # Sidecar describes the file as it is: append exactly the unseen IDs
+            last_ts, last_idx = sync.last_timestamp, sync.last_index
+        else:
+            last_ts, last_idx = parse_metadata_from_file(output_path)
         
-        if last_ts:
-            # Filter for truly new messages
-            filtered_sessions = []
+        if synced or last_ts:
+            if not synced:
+                # The sidecar describes another file: rebuild it from this run
+                sync.reset()
+            # Append only truly new messages, deduplicated against what the file holds
+            deduper = ContentDeduper(dedup, sync.blocks if synced else None)
+            # Written before the first new block when it continues the current part
+            separator = f"\n\n---\n## [Incremental Update: {datetime.now().strftime('%H:%M:%S')}]\n\n"
+            writer = ShardWriter(shards, platform, date, append=True,
+                                 separator=separator, last_index=last_idx)
             new_msg_count = 0
-            for session in sessions:
-                new_msgs = [m for m in session['messages'] if m.get('timestamp') and m['timestamp'] > last_ts]
-                if new_msgs:
-                    filtered_sessions.append({
-                        **session,
-                        'messages': new_msgs,
-                        'count': len(new_msgs)
-                    })
-                    new_msg_count += len(new_msgs)
-            
-            if filtered_sessions:
-                with open(output_path, 'a', encoding='utf-8') as f:
-                    # Write a separator if it's new activity on the same day
-                    f.write(f"\n\n---\n## [Incremental Update: {datetime.now().strftime('%H:%M:%S')}]\n\n")
-                    
-                    global_msg_index = last_idx + 1
-                    for session in filtered_sessions:
-                        for msg in session['messages']:
-                            write_message_block(
-                                f, global_msg_index, msg['role'], 
-                                format_timestamp(msg['timestamp']), 
-                                msg.get('content'), 
-                                msg.get('thinking')
-                            )
-                            global_msg_index += 1
-                results.append(f"Appended {new_msg_count} new messages to {filename}")
+            found_new = False
+            global_msg_index = last_idx + 1
+            latest_ts = last_ts
+            # Exports record timestamps to the second, so compare at that precision
+            last_second = (parse_timestamp(last_ts) or 0) // 1000
+            latest_epoch = parse_timestamp(latest_ts) or 0
+            with writer:
+                for session in sessions:
+                    scope = _session_scope(session['source_path'])
+                    for msg in session['messages']:
+                        msg_id = message_id(msg)
+                        if synced:
+                            is_new = msg_id not in sync.ids
+                        else:
+                            is_new = msg.ts // 1000 > last_second
+                        sync.add(msg_id)
+                        if not is_new:
+                            continue
+                        found_new = True
+                        if msg.ts > latest_epoch:
+                            latest_ts, latest_epoch = msg.timestamp, msg.ts
+                        timestamp = msg.display_timestamp
+                        block = deduper.render_message(
+                            global_msg_index, msg.role, timestamp,
+                            msg.content, msg.thinking,
+                            scope=scope, source=session['source_path']
+                        )
+                        if not block:
+                            continue
+                        writer.write_message(global_msg_index, msg.role, timestamp,
+                                             block, session['ts_str'], _session_stem(session))
+                        global_msg_index += 1
+                        new_msg_count += 1
+            if found_new or not synced:
+                sync.blocks = deduper.seen
+                sync.record(shards.current_path(), global_msg_index - 1, latest_ts)
+            count_written(new_msg_count, deduper)
+
+            if new_msg_count:
+                part_note = f" (part {shards.part_count})" if shards.part_count > 1 else ""
+                results.append(f"Appended {new_msg_count} new messages to {filename}{part_note}")
             else:
                 results.append(f"No new activity for {filename} (last sync: {last_ts})")
         else:
             # File exists but metadata parsing failed, or file is new
-            file_exists = os.path.exists(output_path)
-            file_has_content = file_exists and os.path.getsize(output_path) > 0
+            first_path = get_output_path(filename)
+            file_exists = export_exists(first_path)
+            file_has_content = file_exists and export_stat(first_path).st_size > 0
 
-            # Create backup if we're about to overwrite existing content
-            if file_has_content:
-                backup_path = output_path + ".backup"
-                try:
-                    import shutil
-                    shutil.copy2(output_path, backup_path)
-                    backup_msg = f" (backup saved to {os.path.basename(backup_path)})"
-                except Exception as e:
-                    backup_msg = f" (backup failed: {e})"
-            else:
-                backup_msg = ""
+            # Existing content is rotated to .backup when the new file is published
+            writer = ShardWriter(shards, platform, date, backup=file_has_content)
 
-            total_messages = sum(s['count'] for s in sessions)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                write_markdown_header(f, "Claude Code", total_messages, date)
+            total_messages = store.message_counts[date]
+            if dedup == 'drop':
+                # Dropped repeats take no number, so the header counts them out first
+                total_messages -= ContentDeduper(dedup).count_repeats(
+                    (_session_scope(s['source_path']), s['source_path'], msg.role, msg.content, msg.thinking)
+                    for s in store.iter_sessions(date) for msg in s['messages'])
+            sync.reset()
+            deduper = ContentDeduper(dedup)
+            with writer:
+                writer.write(render_markdown_header(platform, total_messages, date))
 
                 global_msg_index = 1
+                latest_ts, latest_epoch = None, 0
                 for session_index, session in enumerate(sessions, 1):
-                    if len(sessions) > 1:
-                        f.write(f"## Session {session_index} (Started: {session['ts_str']})\n\n")
+                    heading = ""
+                    if session_count > 1:
+                        heading = f"## Session {session_index} (Started: {session['ts_str']})\n\n"
+                    writer.start_session(session['ts_str'], _session_stem(session), heading)
 
+                    scope = _session_scope(session['source_path'])
                     for msg in session['messages']:
-                        write_message_block(
-                            f, global_msg_index, msg['role'],
-                            format_timestamp(msg['timestamp']),
-                            msg.get('content'),
-                            msg.get('thinking')
+                        sync.add(message_id(msg))
+                        if msg.ts > latest_epoch:
+                            latest_ts, latest_epoch = msg.timestamp, msg.ts
+                        timestamp = msg.display_timestamp
+                        block = deduper.render_message(
+                            global_msg_index, msg.role, timestamp,
+                            msg.content, msg.thinking,
+                            scope=scope, source=session['source_path']
                         )
+                        if not block:
+                            continue
+                        writer.write_message(global_msg_index, msg.role, timestamp, block,
+                                             session['ts_str'], _session_stem(session))
                         global_msg_index += 1
 
-                    if session_index < len(sessions):
-                        f.write("\n---\n\n")
+                    if session_index < session_count:
+                        writer.write("\n---\n\n")
+            sync.blocks = deduper.seen
+            sync.record(shards.current_path(), global_msg_index - 1, latest_ts)
+            count_written(global_msg_index - 1, deduper)
 
             # Accurate output message
+            part_note = f" in {shards.part_count} parts" if shards.part_count > 1 else ""
             if file_has_content:
-                results.append(f"Overwrote {filename} with {total_messages} messages{backup_msg}")
+                if writer.backup_error is None:
+                    backup_msg = f" (backup saved to {os.path.basename(writer.backup_path)})"
+                else:
+                    backup_msg = f" (backup failed: {writer.backup_error})"
+                results.append(f"Overwrote {filename} with {total_messages} messages{part_note}{backup_msg}")
             else:
-                results.append(f"Created {filename} with {total_messages} messages")
+                results.append(f"Created {filename} with {total_messages} messages{part_note}")
 
     return results
 
 def split_claude_md(md_path):
     """
     Parses an existing Claude Markdown export and splits it into daily files.
+
+    The export is streamed line by line and each message is rendered into a
+    per-day spool as soon as it is parsed, so memory use does not grow with
+    the size of the export.
     """
-    if not os.path.exists(md_path):
+    if not export_exists(md_path):
         return [f"Error: File {md_path} not found."]
 
-    all_sessions = []
-    current_messages = []
-    current_date = None
-    current_ts = None
-    
-    with open(md_path, 'r') as f:
-        content = f.read()
-    
-    # Split by message markers
-    # Matches: ### Message N: User\n\n**Timestamp:** 2026-01-22T19:20:35
-    msg_blocks = re.split(r'### Message \d+: (User|Assistant)', content)
-    
-    # The split leaves the role in the list, so we reconstruct
-    # msg_blocks[0] is the header
-    # msg_blocks[1] is role, msg_blocks[2] is content, etc.
-    
-    for i in range(1, len(msg_blocks), 2):
-        role_label = msg_blocks[i].lower()
-        role = 'user' if 'user' in role_label else 'assistant'
-        block_text = msg_blocks[i+1]
-        
-        # Extract timestamp
-        ts_match = re.search(r'\*\*Timestamp:\*\* ([\d\-T:]+)', block_text)
-        if ts_match:
-            ts_val = ts_match.group(1)
-            try:
-                dt = datetime.fromisoformat(ts_val.replace("Z", "+00:00"))
-                msg_date = dt.strftime("%Y-%m-%d")
-                msg_ts = dt.strftime("%H%M%S")
-            except:
-                msg_date, msg_ts = "Unknown", "000000"
-        else:
-            msg_date, msg_ts = "Unknown", "000000"
-            
-        # Extract content
-        # Content is after **Content:** or just the rest of the block
-        content_match = re.search(r'\*\*Content:\*\*\n\n(.*?)(?=\n\n---|\Z)', block_text, re.DOTALL)
-        msg_content = content_match.group(1).strip() if content_match else ""
-        
-        # Extract thinking if present
-        thinking_match = re.search(r'\*\*Thinking Block:\*\*\n\n```\n(.*?)\n```', block_text, re.DOTALL)
-        msg_thinking = thinking_match.group(1).strip() if thinking_match else ""
-
-        # Group by session (rough heuristic: a session is a sequence of messages close in time)
-        # Actually, the user asked to "break it into separate days".
-        # We can just collect all messages and use our existing sessions_by_date logic.
-        all_sessions.append({
-            'date': msg_date,
-            'ts_str': msg_ts,
-            'role': role,
-            'content': msg_content,
-            'thinking': msg_thinking,
-            'timestamp': ts_val if ts_match else None
-        })
-
-    # Regroup into the format extract_claude_sessions expects
-    from collections import defaultdict
-    sessions_by_date = defaultdict(list)
-    
-    # For Markdown splitting, we treat one continuous day as one session for simplicity, 
-    # or we can try to find session gaps. Let's just group by date.
-    daily_messages = defaultdict(list)
-    for msg in all_sessions:
-        daily_messages[msg['date']].append(msg)
-    
     results = []
-    for date, messages in daily_messages.items():
-        if date == "Unknown": continue
-        
-        filename = f"{date}-claude.md"
-        output_path = get_output_path(filename)
-        
-        with open(output_path, 'w') as f:
-            write_markdown_header(f, "Claude Code (Reprocessed)", len(messages), date)
-            for i, msg in enumerate(messages, 1):
-                write_message_block(
-                    f, i, msg['role'], 
-                    msg['timestamp'], 
-                    msg['content'], 
-                    msg['thinking']
-                )
-        results.append(f"Split {len(messages)} messages into {filename}")
+    with open_export(md_path) as f, DaySpoolWriters() as writers:
+        for role_label, block_text in iter_message_blocks(f):
+            msg = parse_message_block(role_label, block_text)
+            if msg['date'] != "Unknown":
+                writers.add(msg)
+
+        for date, count in writers.counts.items():
+            filename = f"{date}-claude.md"
+            writers.publish(date, get_output_path(filename), "Claude Code (Reprocessed)")
+            STATS.count('messages_written', count)
+            results.append(f"Split {count} messages into {filename}")
         
     return results
 
@@ -6,89 +6,167 @@ import os
 import json
 import glob
 import re
+import time
 from datetime import datetime
-try:
-    import blackboxprotobuf
-    HAS_BBP = True
-except ImportError:
-    HAS_BBP = False
-    print("Warning: blackboxprotobuf not found. Protobuf extraction will be limited.")
 
 # Common English words to filter out binary noise
 COMMON_WORDS = {' the ', ' you ', ' and ', ' that ', ' have ', ' for ', ' not ', ' with ', ' this ', ' from '}
 
-from chat_extractor_base import get_output_path, format_timestamp, write_markdown_header, write_message_block
+from chat_extractor_base import (get_output_path, get_cache_dir,
+                                 write_markdown_header, render_message_block, DateWindow,
+                                 AtomicWriter, OffsetWriter, Message, SourceRoot)
+from gemini_pb_decoder import TypedefCache, extract_pb_text
+from raw_text_scanner import scan_text_segments
+from extraction_stats import STATS
+from content_dedup import ContentDeduper, DEFAULT_DEDUP, count_written
+from cold_storage import export_exists
+from export_offsets import FRAGMENT_ROLE, save_offsets
 
-GEMINI_TMP_DIR = os.path.expanduser("~/.gemini/tmp")
-GEMINI_CONV_DIR = os.path.expanduser("~/.gemini/antigravity/conversations")
+# Session files open with their metadata, so startTime is found in the first block
+_START_TIME = re.compile(rb'"startTime"\s*:\s*"([^"]+)"')
+SESSION_HEAD_BYTES = 4096
 
-def extract_gemini_json_sessions(limit=None):
-    """Returns a list of recent sessions from JSON files."""
+# The default root's Gemini folders (see SourceRoot)
+GEMINI_TMP_DIR = SourceRoot().gemini_tmp_dir
+GEMINI_CONV_DIR = SourceRoot().gemini_conv_dir
+
+_bbp = None
+
+def _blackboxprotobuf():
+    """
+    Imports blackboxprotobuf the first time a .pb file is decoded and returns
+    it, or None (with a one-time warning) when it is not installed.
+    """
+    global _bbp
+    if _bbp is None:
+        try:
+            import blackboxprotobuf
+            _bbp = blackboxprotobuf
+        except ImportError:
+            _bbp = False
+            print("Warning: blackboxprotobuf not found. Protobuf extraction will be limited.")
+    return _bbp or None
+
+def _json_session_start(data, json_path):
+    """Returns (YYYY-MM-DD, HHMMSS) for a JSON session, from startTime or the filename."""
+    session_start = data.get('startTime')
+    if session_start:
+        dt = datetime.fromisoformat(session_start.replace("Z", "+00:00"))
+        return dt.strftime("%Y-%m-%d"), dt.strftime("%H%M%S")
+    # Fallback
+    match = re.search(r"session-(\d{4}-\d{2}-\d{2})", os.path.basename(json_path))
+    return (match.group(1) if match else "Unknown-Date"), "000000"
+
+def read_gemini_session_date(json_path):
+    """
+    Returns the date of a JSON session file (as _json_session_start() would)
+    from the start of the file without decoding it, or None if it cannot be
+    told without a full decode.
+    """
+    with open(json_path, 'rb') as f:
+        head = f.read(SESSION_HEAD_BYTES)
+    match = _START_TIME.search(head)
+    try:
+        if match:
+            return _json_session_start({'startTime': match.group(1).decode('ascii')}, json_path)[0]
+    except ValueError:
+        return None
+    # A file read to the end without startTime is dated by its filename
+    return _json_session_start({}, json_path)[0] if len(head) < SESSION_HEAD_BYTES else None
+
+def gemini_session_date(path):
+    """Returns the day export a Gemini session file (.json or .pb) belongs to."""
+    if path.endswith('.pb'):
+        # Conversations are dated by file mtime
+        return datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+    with open(path, 'r') as f:
+        return _json_session_start(json.load(f), path)[0]
+
+def extract_gemini_json_sessions(limit=None, window=None, message_store=None, tmp_dir=GEMINI_TMP_DIR):
+    """
+    Returns a list of recent sessions from JSON files under ``tmp_dir``.
+    With a DateWindow, files last modified before the window, or whose
+    startTime falls outside it, are not decoded.
+    With a MessageStore, files stored since their last change are skipped.
+    """
     all_json_sessions = []
     # Recursively find session-*.json files
-    json_files = glob.glob(os.path.join(GEMINI_TMP_DIR, "**", "session-*.json"), recursive=True)
+    with STATS.phase('discovery'):
+        json_files = glob.glob(os.path.join(tmp_dir, "**", "session-*.json"), recursive=True)
     if limit:
         json_files = json_files[:limit]
+    STATS.count('files_scanned', len(json_files))
     
     for json_path in json_files:
         try:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
+            with STATS.phase('filter'):
+                skip = window and window.excludes_mtime(os.path.getmtime(json_path))
+                if window and not skip and not window.is_open():
+                    session_date = read_gemini_session_date(json_path)
+                    skip = session_date is not None and not window.contains(session_date)
+            if skip:
+                STATS.count('files_skipped')
+                continue
+            if message_store is not None:
+                st = os.stat(json_path)
+                if message_store.source_unchanged(json_path, st):
+                    STATS.count('files_cached')
+                    continue
+            with STATS.phase('read'):
+                with open(json_path, 'r') as f:
+                    text = f.read()
+            STATS.count('bytes_read', len(text))
+            STATS.count('files_parsed')
+            decode_start = time.perf_counter()
+            data = json.loads(text)
                 
             messages = []
-            session_start = data.get('startTime')
-            if session_start:
-                 dt = datetime.fromisoformat(session_start.replace("Z", "+00:00"))
-                 session_date = dt.strftime("%Y-%m-%d")
-                 session_ts = dt.strftime("%H%M%S")
-            else:
-                 # Fallback
-                 match = re.search(r"session-(\d{4}-\d{2}-\d{2})", os.path.basename(json_path))
-                 session_date = match.group(1) if match else "Unknown-Date"
-                 session_ts = "000000"
+            session_date, session_ts = _json_session_start(data, json_path)
 
             for msg in data.get('messages', []):
                 msg_type = msg.get('type')
                 if msg_type == 'user':
-                    messages.append({
-                        'role': 'user', 
-                        'content': msg.get('content', ''), 
-                        'timestamp': msg.get('timestamp')
-                    })
+                    messages.append(Message('user', msg.get('timestamp'), msg.get('content', '')))
                 elif msg_type == 'gemini':
                     thinking = '\n'.join([t.get('description', '') for t in msg.get('thoughts', [])])
                     text = msg.get('content', '')
                     tool_calls = msg.get('toolCalls', [])
                     
-                    messages.append({
-                        'role': 'assistant', 
-                        'thinking': thinking, 
-                        'content': text, 
-                        'tool_calls': tool_calls,
-                        'timestamp': msg.get('timestamp')
-                    })
+                    messages.append(Message('assistant', msg.get('timestamp'), text, thinking, tool_calls))
 
+            STATS.add_time('decode', time.perf_counter() - decode_start)
             if messages:
                 all_json_sessions.append({
                     'date': session_date,
                     'ts': session_ts,
                     'messages': messages,
                     'count': len(messages),
-                    'method': 'Gemini (JSON)'
+                    'method': 'Gemini (JSON)',
+                    'source_path': json_path,
+                    'project': os.path.basename(os.path.dirname(os.path.dirname(json_path))),
                 })
+            if message_store is not None:
+                message_store.mark_source(json_path, st)
 
         except Exception as e:
             print(f"Error processing JSON {json_path}: {e}")
             
     return all_json_sessions
 
-def extract_gemini_pb_sessions(limit=None):
-    """Returns a list of archived sessions from Protobuf files using blackboxprotobuf or fallback."""
+def extract_gemini_pb_sessions(limit=None, window=None, message_store=None, conv_dir=GEMINI_CONV_DIR):
+    """
+    Returns a list of archived sessions from Protobuf files under ``conv_dir``
+    using blackboxprotobuf or fallback. Sessions are dated by file mtime, so
+    files outside ``window`` are skipped before decoding.
+    """
     all_pb_sessions = []
-    pb_files = glob.glob(os.path.join(GEMINI_CONV_DIR, "*.pb"))
+    with STATS.phase('discovery'):
+        pb_files = glob.glob(os.path.join(conv_dir, "*.pb"))
     if limit:
         pb_files = pb_files[:limit]
-    print(f"DEBUG: Found {len(pb_files)} PB files in {GEMINI_CONV_DIR}")
+    STATS.count('files_scanned', len(pb_files))
+    print(f"DEBUG: Found {len(pb_files)} PB files in {conv_dir}")
+    typedef_cache = TypedefCache(os.path.join(get_cache_dir(), 'gemini-pb-typedef.json'))
     
     for pb_path in pb_files:
         try:
@@ -97,40 +175,28 @@ def extract_gemini_pb_sessions(limit=None):
             dt_mtime = datetime.fromtimestamp(mtime)
             file_date = dt_mtime.strftime("%Y-%m-%d")
             file_ts_str = dt_mtime.strftime("%H%M%S")
+            if window and not window.contains(file_date):
+                STATS.count('files_skipped')
+                continue
+            if message_store is not None:
+                st = os.stat(pb_path)
+                if message_store.source_unchanged(pb_path, st):
+                    STATS.count('files_cached')
+                    continue
+            STATS.count('files_parsed')
             
             # Try to decode with blackboxprotobuf first
             try:
-                if HAS_BBP:
-                    with open(pb_path, 'rb') as f:
-                        data = f.read()
-                    
-                    # Decode without schema
-                    message, typedef = blackboxprotobuf.decode_message(data)
+                bbp = _blackboxprotobuf()
+                if bbp is not None:
+                    with STATS.phase('read'):
+                        with open(pb_path, 'rb') as f:
+                            data = f.read()
+                    STATS.count('bytes_read', len(data))
                     
-                    # Heuristic extraction from the structural decode
-                    def find_content_strings(obj):
-                        found_text = []
-                        if isinstance(obj, dict):
-                            for k, v in obj.items():
-                                found_text.extend(find_content_strings(v))
-                        elif isinstance(obj, list):
-                            for item in obj:
-                                found_text.extend(find_content_strings(item))
-                        elif isinstance(obj, (str, bytes)):
-                            if isinstance(obj, bytes):
-                                try:
-                                    # Use 's' as internal var
-                                    val = obj.decode('utf-8')
-                                    # Stricter filter for decoded bytes
-                                    if len(val) > 20 and ' ' in val: 
-                                        found_text.append(val)
-                                except: pass
-                            elif isinstance(obj, str):
-                                if len(obj) > 20 and ' ' in obj:
-                                    found_text.append(obj)
-                        return found_text
-
-                    decoded_segments = find_content_strings(message)
+                    # Extract text fields guided by the learned typedef
+                    with STATS.phase('decode'):
+                        decoded_segments = extract_pb_text(bbp, data, typedef_cache)
                     if decoded_segments:
                         # Success with BBP
                         all_pb_sessions.append({
@@ -138,8 +204,11 @@ def extract_gemini_pb_sessions(limit=None):
                             'ts': file_ts_str,
                             'segments': decoded_segments,
                             'count': len(decoded_segments),
-                            'method': 'Gemini (Protobuf Decode)'
+                            'method': 'Gemini (Protobuf Decode)',
+                            'source_path': pb_path,
                         })
+                        if message_store is not None:
+                            message_store.mark_source(pb_path, st)
                         continue # Skip fallback
             except Exception as e_bbp:
                 print(f"DEBUG: BBP failed for {pb_path}: {e_bbp}")
@@ -147,20 +216,10 @@ def extract_gemini_pb_sessions(limit=None):
             # Fallback path (if BBP failed or not installed)
             clean_strings = []
             try:
-                with open(pb_path, 'rb') as f:
-                    raw_data = f.read()
-                
-                text_content = raw_data.decode('utf-8', errors='ignore')
-                potential_strings = re.findall(r'[\x20-\x7E\n]{30,}', text_content)
-                
-                for s in potential_strings:
-                    s_clean = s.strip()
-                    if ' ' in s_clean:
-                        lower_s = s_clean.lower()
-                        # Count how many distinct common words are present
-                        common_count = sum(1 for word in COMMON_WORDS if word in lower_s)
-                        if common_count >= 3:
-                            clean_strings.append(s_clean)
+                # Streaming scan for printable runs with enough common words
+                with STATS.phase('decode'):
+                    clean_strings = scan_text_segments(pb_path, COMMON_WORDS)
+                STATS.count('bytes_read', os.path.getsize(pb_path))
             except: pass
 
             if clean_strings:
@@ -169,47 +228,84 @@ def extract_gemini_pb_sessions(limit=None):
                     'ts': file_ts_str,
                     'segments': clean_strings,
                     'count': len(clean_strings),
-                    'method': 'Gemini (Raw Heuristic Fallback)'
+                    'method': 'Gemini (Raw Heuristic Fallback)',
+                    'source_path': pb_path,
                 })
+            if message_store is not None:
+                message_store.mark_source(pb_path, st)
 
         except Exception as e:
             print(f"Error processing PB {pb_path}: {e}")
 
+    typedef_cache.save()
     return all_pb_sessions
 
-def extract_all_gemini(limit=None, date_filter=None, after_date=None, before_date=None):
-    """Main controller to aggregate all Gemini sessions and write merged daily files."""
+def extract_all_gemini(limit=None, date_filter=None, after_date=None, before_date=None,
+                       message_store=None, dedup=DEFAULT_DEDUP, root=None):
+    """
+    Main controller to aggregate all Gemini sessions and write merged daily files.
+    With a MessageStore, only changed sessions are decoded and stored, and the
+    days they belong to are rendered from every session stored for that day.
+    Fragments a .pb conversation repeats are handled per ``dedup`` ('drop',
+    'ref' or 'off'; see content_dedup). ``root`` is the SourceRoot
+    read (default: the current user's home); a labelled root writes labelled
+    exports.
+    """
+    root = root or SourceRoot()
+    source = root.key('gemini')
     results = []
 
-    json_sessions = extract_gemini_json_sessions(limit=limit)
-    pb_sessions = extract_gemini_pb_sessions(limit=limit)
+    window = DateWindow(date_filter, after_date, before_date)
+    if message_store is not None:
+        message_store.prune(source)
+    json_sessions = extract_gemini_json_sessions(limit=limit, window=window, message_store=message_store,
+                                                 tmp_dir=root.gemini_tmp_dir)
+    pb_sessions = extract_gemini_pb_sessions(limit=limit, window=window, message_store=message_store,
+                                             conv_dir=root.gemini_conv_dir)
 
     from collections import defaultdict
     sessions_by_date = defaultdict(list)
 
-    for s in json_sessions + pb_sessions:
-        sessions_by_date[s['date']].append(s)
+    with STATS.phase('group'):
+        if message_store is None:
+            for s in json_sessions + pb_sessions:
+                sessions_by_date[s['date']].append(s)
+        else:
+            for s in json_sessions + pb_sessions:
+                message_store.add_session(source, s['source_path'], s, s.get('project'))
+                sessions_by_date[s['date']] = None
+            message_store.commit()
+            # Stored days whose export is missing are re-rendered without re-decoding
+            for date in message_store.days(source):
+                if date not in sessions_by_date and not export_exists(get_output_path(root.export_name(date, 'gemini'))):
+                    sessions_by_date[date] = None
+            for date in sessions_by_date:
+                sessions_by_date[date] = list(message_store.sessions(source, date))
 
     # Apply date filtering (mirrors Claude extraction logic)
-    if date_filter:
-        sessions_by_date = {k: v for k, v in sessions_by_date.items() if k == date_filter}
-    else:
-        if after_date:
-            sessions_by_date = {k: v for k, v in sessions_by_date.items() if k >= after_date}
-        if before_date:
-            sessions_by_date = {k: v for k, v in sessions_by_date.items() if k <= before_date}
+    with STATS.phase('filter'):
+        sessions_by_date = {k: sessions_by_date[k] for k in window.filter(sessions_by_date)}
 
     for date, sessions in sessions_by_date.items():
         # Sort sessions by timestamp within the day
-        sessions.sort(key=lambda x: x['ts'])
+        with STATS.phase('sort'):
+            sessions.sort(key=lambda x: x['ts'])
+        render_start = time.perf_counter()
         
-        filename = f"{date}-gemini.md"
+        filename = root.export_name(date, 'gemini')
         output_path = get_output_path(filename)
         
         total_items = sum(s['count'] for s in sessions)
+        if dedup == 'drop':
+            # Dropped fragments take no number, so the header counts them out first
+            total_items -= ContentDeduper(dedup).count_repeats(
+                (s['source_path'], s['source_path'], FRAGMENT_ROLE, text)
+                for s in sessions for text in s.get('segments', ()))
+        deduper = ContentDeduper(dedup)
         
-        with open(output_path, 'w') as f:
-            write_markdown_header(f, "Gemini (Aggregated)", total_items, date)
+        with AtomicWriter(output_path) as out:
+            f = OffsetWriter(out)
+            write_markdown_header(f, root.platform("Gemini (Aggregated)"), total_items, date)
             
             global_item_index = 1
             for session_index, s in enumerate(sessions, 1):
@@ -220,13 +316,11 @@ def extract_all_gemini(limit=None, date_filter=None, after_date=None, before_dat
                 if 'messages' in s:
                     # JSON messages
                     for msg in s['messages']:
-                        write_message_block(
-                            f, global_item_index, msg['role'], 
-                            format_timestamp(msg['timestamp']), 
-                            msg.get('content'), 
-                            msg.get('thinking'),
-                            msg.get('tool_calls')
-                        )
+                        timestamp = msg.display_timestamp
+                        f.write_message(global_item_index, msg.role, timestamp, render_message_block(
+                            global_item_index, msg.role, timestamp,
+                            msg.content, msg.thinking, msg.tool_calls
+                        ))
                         global_item_index += 1
                 else:
                     # PB segments
@@ -236,14 +330,18 @@ def extract_all_gemini(limit=None, date_filter=None, after_date=None, before_dat
                         f.write("> **Note:** Extracted from binary Protobuf. Structure is flattened.\n\n")
                         
                     for text in s['segments']:
-                        f.write(f"### Fragment {global_item_index}\n\n")
-                        f.write(f"{text}\n\n")
-                        f.write("---\n\n")
+                        block = deduper.render_fragment(global_item_index, text, s['source_path'])
+                        if not block:
+                            continue
+                        f.write_message(global_item_index, FRAGMENT_ROLE, None, block)
                         global_item_index += 1
                 
                 if session_index < len(sessions):
                     f.write("\n---\n\n")
             
             results.append(f"Merged {len(sessions)} sessions ({total_items} items) into {filename}")
+        save_offsets(output_path, f.entries)
+        count_written(global_item_index - 1, deduper)
+        STATS.add_time('render', time.perf_counter() - render_start)
             
     return results
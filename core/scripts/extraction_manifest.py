@@ -0,0 +1,233 @@
+"""
+Persistent per-file manifest for incremental chat history extraction.
+
+Each source file is tracked by size, mtime, inode and the byte offset of the
+last complete line that was parsed. Messages already parsed from a file are
+cached next to the manifest so unchanged files are never re-read and growing
+files are only read from their last offset.
+
+Saving costs what changed, not the size of the history: changed entries are
+appended to a log next to the manifest snapshot (folded back into the
+snapshot once the log outgrows it), and messages parsed from a growing file
+are appended to its cache file as one more line.
+"""
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 2
+
+# Bytes preceding the stored offset that are hashed to detect rewritten files
+FINGERPRINT_BYTES = 64
+
+# Log lines always allowed before the snapshot is rewritten (else one per entry)
+MIN_LOG_LINES = 256
+
+
+def file_fingerprint(path, offset):
+    """Returns a short hash of the bytes just before ``offset`` in ``path``."""
+    start = max(0, offset - FINGERPRINT_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(offset - start)
+    return hashlib.sha1(chunk).hexdigest()
+
+
+def json_line(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def read_json_lines(path):
+    """
+    Returns (values, complete): the JSON value of each line of ``path`` up to
+    the first torn one (a write cut short), and whether every line was read.
+    """
+    values = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                values.append(json.loads(line))
+            except ValueError:
+                return values, False
+    return values, True
+
+
+def write_json_atomic(path, data):
+    """Writes JSON (one line) to a temp file and renames it over ``path``."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json_line(data))
+    os.replace(tmp_path, path)
+
+
+class ExtractionManifest:
+    """
+    Tracks source files between extraction runs.
+
+    Entries are keyed by absolute source path and hold:
+        size, mtime_ns, inode: stat identity at the time of the last parse
+        offset: byte position just past the last complete line parsed
+        fingerprint: hash of the bytes preceding ``offset``
+        state: per-file parser state (e.g. session date) after ``offset``
+    The snapshot is ``<name>-manifest.json``; entries changed since it was
+    written are ``[path, entry]`` lines (entry null when dropped) in
+    ``<name>-manifest.log``. Parsed messages live in one cache file per
+    source under ``<name>/``: a line with the messages parsed from the start
+    of the file, then a line per append.
+    """
+
+    def __init__(self, cache_dir, name):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"{name}-manifest.json")
+        self.log_path = os.path.join(cache_dir, f"{name}-manifest.log")
+        self.messages_dir = os.path.join(cache_dir, name)
+        self.entries = {}
+        self._changed = set()
+        self._log_lines = 0
+        self._rewrite = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            # No snapshot: a leftover log has nothing to apply to
+            self._rewrite = os.path.exists(self.log_path)
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_VERSION:
+                self._rewrite = True
+                return
+            self.entries = data.get('files', {})
+            if os.path.exists(self.log_path):
+                changes, complete = read_json_lines(self.log_path)
+                for source_path, entry in changes:
+                    if entry is None:
+                        self.entries.pop(source_path, None)
+                    else:
+                        self.entries[source_path] = entry
+                self._log_lines = len(changes)
+                # Appending after a torn line would lose what follows it
+                self._rewrite = not complete
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+            self.entries = {}
+            self._rewrite = True
+
+    def clear(self):
+        """Forgets every entry (``--rescan``); the next save rewrites the snapshot."""
+        self.entries = {}
+        self._changed.clear()
+        self._rewrite = True
+
+    def _messages_path(self, source_path):
+        digest = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.messages_dir, f"{digest}.json")
+
+    def resume_point(self, source_path, st):
+        """
+        Returns the manifest entry if ``source_path`` can be resumed from its
+        stored offset, or None if it must be parsed from the beginning.
+        """
+        entry = self.entries.get(source_path)
+        if not entry or entry['inode'] != st.st_ino or st.st_size < entry['offset']:
+            return None
+        if entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry
+        # File changed: only trust the stored prefix if it was not rewritten
+        try:
+            if file_fingerprint(source_path, entry['offset']) != entry['fingerprint']:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def has_messages(self, source_path):
+        """Returns True if a message cache exists for ``source_path``."""
+        return os.path.exists(self._messages_path(source_path))
+
+    def load_messages(self, source_path):
+        """
+        Returns the cached messages parsed so far from ``source_path``, or None
+        if the cache is missing or was written for a different offset than the
+        manifest entry (e.g. a run crashed before saving the manifest).
+        """
+        entry = self.entries.get(source_path)
+        if entry is None:
+            return None
+        messages, offset = [], None
+        try:
+            # A torn append leaves the offset behind the entry's: parse again
+            for data in read_json_lines(self._messages_path(source_path))[0]:
+                base = data.get('base', 0)
+                if base > len(messages):
+                    return None
+                messages[base:] = data['messages']
+                offset = data['offset']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return messages if offset == entry['offset'] else None
+
+    def update(self, source_path, st, offset, state, messages, cached=0):
+        """
+        Records the parse position of a file and its newly committed messages.
+        ``cached`` is how many of the file's messages are already in its cache
+        (a resumed file); ``messages`` follow them. With cached=0 the cache is
+        rewritten, otherwise ``messages`` are appended to it.
+        """
+        os.makedirs(self.messages_dir, exist_ok=True)
+        messages_path = self._messages_path(source_path)
+        if cached:
+            with open(messages_path, 'a', encoding='utf-8') as f:
+                f.write(json_line({'offset': offset, 'base': cached, 'messages': messages}))
+        else:
+            write_json_atomic(messages_path, {'path': source_path, 'offset': offset, 'messages': messages})
+        self.entries[source_path] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'inode': st.st_ino,
+            'offset': offset,
+            'fingerprint': file_fingerprint(source_path, offset),
+            'state': state,
+        }
+        self._changed.add(source_path)
+
+    def touch(self, source_path, st):
+        """Refreshes stat identity for a file whose committed content is unchanged."""
+        entry = self.entries[source_path]
+        if (entry['size'], entry['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+            entry['size'] = st.st_size
+            entry['mtime_ns'] = st.st_mtime_ns
+            self._changed.add(source_path)
+
+    def prune(self, seen_paths):
+        """Drops entries (and cached messages) for sources that no longer exist."""
+        for source_path in list(self.entries):
+            if source_path in seen_paths or os.path.exists(source_path):
+                continue
+            del self.entries[source_path]
+            try:
+                os.remove(self._messages_path(source_path))
+            except OSError:
+                pass
+            self._changed.add(source_path)
+
+    def save(self):
+        """
+        Persists the entries changed since the last save: appended to the log,
+        or a new snapshot (and an empty log) once the log would outgrow it.
+        """
+        if not (self._changed or self._rewrite):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        log_lines = self._log_lines + len(self._changed)
+        if self._rewrite or not os.path.exists(self.path) or log_lines > max(MIN_LOG_LINES, len(self.entries)):
+            write_json_atomic(self.path, {'version': MANIFEST_VERSION, 'files': self.entries})
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self._log_lines, self._rewrite = 0, False
+        else:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.writelines(json_line([p, self.entries.get(p)]) for p in sorted(self._changed))
+            self._log_lines = log_lines
+        self._changed.clear()
@@ -0,0 +1,218 @@
+"""
+Concurrent extraction plan for run_extraction.py.
+
+Every source reads its own directory tree and writes its own ``*-<source>.md``
+exports and cache files, so the sources of one run are extracted at the same
+time: an asyncio loop hands each source to its own worker process and
+collects the results. A source's progress output is captured in its worker
+and printed as one block, in plan order, as soon as that source and every
+source before it have finished; results are merged in the same order.
+Counters and phase timings from the workers are merged into ``STATS`` (phases
+are summed across sources, so they can exceed the run's wall time).
+
+With several source roots (``run_extraction.py --root``), the plan has one
+unit per root instead: each worker extracts every selected source of its
+root, one after the other. Roots write labelled exports (see SourceRoot),
+so their workers never share an output file. Output blocks and results
+follow the order of the roots, which run_extraction.py sorts by label.
+
+New sources are added with ``register_source``; they join the plan for
+``--source all`` automatically. The registry is lazy: an extractor module
+(and its optional dependencies) is imported only when its source runs.
+asyncio and the process pool are only used when there is real work for
+them: several roots, ``--workers`` other than 1, or more than one source
+with work to do. A source may register a cheap ``pending`` check for this
+(Claude compares its session files with the manifest); one without a check
+counts as having work. A run from a hook with nothing new therefore stays in
+one process.
+"""
+import io
+import os
+import contextlib
+
+from extraction_stats import STATS
+
+# name -> ExtractionSource, in plan order
+SOURCES = {}
+
+
+class ExtractionSource:
+    """
+    One entry of the plan: ``run(options, message_store)`` returns a list of
+    result lines; ``pending(options)``, if given, returns False when the run
+    would find nothing new.
+    """
+
+    def __init__(self, name, banner, run, pending=None):
+        self.name = name
+        self.banner = banner
+        self.run = run
+        self.pending = pending
+
+    def has_work(self, options):
+        return self.pending is None or self.pending(options)
+
+
+def register_source(name, banner, pending=None):
+    """Decorator adding a module-level ``run(options, message_store)`` function to the plan."""
+    def decorator(run):
+        SOURCES[name] = ExtractionSource(name, banner, run, pending)
+        return run
+    return decorator
+
+
+def _claude_pending(options):
+    from extract_claude import has_pending_files
+    return has_pending_files(options.get('root'), options['project'], options['rescan'])
+
+
+@register_source('claude', "Processing Claude projects...", pending=_claude_pending)
+def _run_claude(options, message_store):
+    from extract_claude import extract_claude_sessions
+    return extract_claude_sessions(
+        date_filter=options['date'],
+        after_date=options['after'],
+        before_date=options['before'],
+        project_filter=options['project'],
+        incremental=options['incremental'],
+        rescan=options['rescan'],
+        workers=options['workers'],
+        memory_limit_mb=options['memory_limit'],
+        message_store=message_store,
+        dedup=options['dedup'],
+        shard_mb=options['shard_mb'],
+        root=options.get('root')
+    )
+
+
+@register_source('gemini', "Processing Gemini sessions (JSON & Protobuf)...")
+def _run_gemini(options, message_store):
+    from extract_gemini import extract_all_gemini
+    return extract_all_gemini(
+        limit=options['limit'],
+        date_filter=options['date'],
+        after_date=options['after'],
+        before_date=options['before'],
+        message_store=message_store,
+        dedup=options['dedup'],
+        root=options.get('root')
+    )
+
+
+def run_source(name, options, capture=False):
+    """
+    Extracts one source with its own message store connection. With
+    capture=True (in a worker) output and stats are returned instead of
+    printed and recorded: (results, output, stats dict).
+    """
+    from chat_extractor_base import get_cache_dir
+    from message_store import open_store
+
+    source = SOURCES[name]
+    if not capture:
+        print(source.banner)
+        store = open_store(get_cache_dir(), create=options['store'], rescan=options['rescan'])
+        try:
+            return source.run(options, store)
+        finally:
+            if store is not None:
+                store.close()
+
+    STATS.reset()
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        print(source.banner)
+        store = open_store(get_cache_dir(), create=options['store'], rescan=options['rescan'])
+        try:
+            results = source.run(options, store)
+        finally:
+            if store is not None:
+                store.close()
+    return results, buffer.getvalue(), STATS.as_dict()
+
+
+def run_root(names, options, capture=False):
+    """
+    Extracts the sources ``names`` from ``options['root']`` one after the
+    other (the plan unit of a multi-root run). Returns what run_source()
+    does, for all of them together.
+    """
+    root = options['root']
+    heading = f"[{root.label}] {root.home}"
+    if not capture:
+        print(heading)
+        return [line for name in names for line in run_source(name, options)]
+
+    results, output, stats = [], [heading + "\n"], []
+    for name in names:
+        source_results, source_output, source_stats = run_source(name, options, capture=True)
+        results.extend(source_results)
+        output.append(source_output)
+        stats.append(source_stats)
+    STATS.reset()
+    for data in stats:
+        STATS.merge(data)
+    return results, ''.join(output), STATS.as_dict()
+
+
+async def _run_concurrently(calls, max_workers):
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [loop.run_in_executor(pool, func, *args, True) for func, args in calls]
+        # Print each source's block once it and every earlier source are done
+        done = {}
+        next_index = 0
+        try:
+            for finished in asyncio.as_completed([_indexed(i, f) for i, f in enumerate(futures)]):
+                index, outcome = await finished
+                done[index] = outcome
+                while next_index in done:
+                    results, output, stats = done[next_index]
+                    print(output, end='', flush=True)
+                    STATS.merge(stats)
+                    next_index += 1
+        finally:
+            # A failed source: still show what the others printed
+            for index in range(next_index, len(calls)):
+                if index in done:
+                    print(done[index][1], end='', flush=True)
+    return [done[i][0] for i in range(len(calls))]
+
+
+async def _indexed(index, future):
+    return index, await future
+
+
+def run_plan(names, options, concurrent=True, roots=None):
+    """
+    Extracts the sources ``names`` and returns their results merged in plan
+    order. ``options`` holds the run_extraction.py arguments the sources
+    use. With ``roots`` (SourceRoots), each root is a plan unit and runs in
+    its own worker, up to one per CPU. Sources run in one worker each only
+    when more than one has work to do or ``options['workers']`` is not 1.
+    A single unit or worker, or concurrent=False, runs in this process.
+    """
+    if roots:
+        calls = [(run_root, (names, dict(options, root=root))) for root in roots]
+        max_workers = min(len(calls), os.cpu_count() or 1)
+    else:
+        calls = [(run_source, (name, options)) for name in names]
+        max_workers = len(calls)
+        if max_workers > 1 and concurrent and options['workers'] == 1:
+            # A worker process costs a start-up and fresh imports: only worth it with real work
+            concurrent = sum(1 for name in names if SOURCES[name].has_work(options)) > 1
+    if max_workers <= 1 or not concurrent:
+        results = []
+        for func, args in calls:
+            results.extend(func(*args))
+        return results
+
+    import asyncio
+    per_unit = asyncio.run(_run_concurrently(calls, max_workers))
+    # Workers added files this process's output-path index has not seen
+    from chat_extractor_base import get_output_index
+    get_output_index().refresh()
+    return [line for results in per_unit for line in results]
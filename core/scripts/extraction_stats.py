@@ -0,0 +1,93 @@
+"""
+Per-phase timings and counters for an extraction run.
+
+Extractors record into the shared ``STATS`` object; run_extraction.py prints
+it with --stats. Timings are wall-clock seconds per phase; parse work done in
+worker processes is timed there and merged back, so with --workers the
+decode phase is summed across workers and can exceed the run's wall time.
+Sources extracted concurrently are merged the same way.
+"""
+import time
+import json
+from contextlib import contextmanager
+
+PHASES = ('discovery', 'read', 'decode', 'filter', 'group', 'sort', 'render', 'index')
+
+COUNTERS = (
+    'files_scanned',     # source files found
+    'files_skipped',     # empty or outside the date window
+    'files_cached',      # served from the extraction manifest without parsing
+    'files_parsed',      # handed to a parser (fully or from a stored offset)
+    'bytes_read',        # source bytes read by parsers
+    'lines_decoded',     # JSONL records decoded
+    'lines_discarded',   # JSONL lines rejected by the prefilter or invalid
+    'messages_written',  # message/fragment blocks written to exports
+    'messages_deduped',  # repeated blocks dropped or written as references
+)
+
+
+class ExtractionStats:
+    """Accumulates phase timings and counters; cheap enough to stay always on."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the ``with`` block to phase ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.phases[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record_parse(self, parse_stats):
+        """Merges the ``stats`` dict returned by a parser (possibly from a worker)."""
+        self.counters['files_parsed'] += 1
+        for name in ('bytes_read', 'lines_decoded', 'lines_discarded'):
+            self.counters[name] += parse_stats.get(name, 0)
+        self.phases['decode'] += parse_stats.get('seconds', 0.0)
+
+    def merge(self, data):
+        """Adds the phases and counters of an as_dict() taken in another process."""
+        for name, seconds in data['phases'].items():
+            self.phases[name] += seconds
+        for name, value in data['counters'].items():
+            self.counters[name] += value
+
+    def as_dict(self):
+        return {
+            'total_seconds': round(time.perf_counter() - self._started, 4),
+            'phases': {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def format_table(self):
+        data = self.as_dict()
+        total = data['total_seconds'] or 1e-9
+        lines = [f"{'phase':<12} {'seconds':>9} {'share':>7}"]
+        for name, seconds in data['phases'].items():
+            lines.append(f"{name:<12} {seconds:>9.4f} {seconds / total:>6.1%}")
+        lines.append(f"{'total':<12} {data['total_seconds']:>9.4f}")
+        lines.append("")
+        lines.append(f"{'counter':<18} {'value':>12}")
+        for name, value in data['counters'].items():
+            lines.append(f"{name:<18} {value:>12,}")
+        return "\n".join(lines)
+
+    def format_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+
+STATS = ExtractionStats()
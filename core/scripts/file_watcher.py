@@ -0,0 +1,228 @@
+"""
+Change notification for chat history directories.
+
+On Linux the watcher uses inotify (through ctypes, no extra packages): it
+blocks in select() until the kernel reports a change, so an idle watcher uses
+no CPU. Elsewhere, or if inotify is unavailable (e.g. the watch limit is
+exhausted), it falls back to polling file stats every ``poll_interval``
+seconds. Both report the paths of created, modified or moved-in files whose
+names end in one of ``suffixes``; directories created later (new projects,
+subagent folders) are picked up automatically.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+               | IN_DELETE_SELF | IN_MOVE_SELF)
+# Watched on the nearest existing ancestor of a root that does not exist yet
+_ANCESTOR_MASK = IN_CREATE | IN_MOVED_TO
+
+_EVENT = struct.Struct('iIII')
+
+# Events arriving within this window after the first one are reported together
+DEFAULT_SETTLE = 0.1
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def _matching_files(root, suffixes):
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(suffixes):
+                yield os.path.join(dirpath, name)
+
+
+def _existing_ancestor(path):
+    parent = os.path.dirname(path)
+    while not os.path.isdir(parent) and parent != os.path.dirname(parent):
+        parent = os.path.dirname(parent)
+    return parent
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over ``roots``; raises OSError if inotify is unavailable."""
+
+    def __init__(self, roots, suffixes, settle=DEFAULT_SETTLE):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "libc has no inotify support")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.suffixes = tuple(suffixes)
+        self.settle = settle
+        self._paths = {}        # wd -> watched directory
+        self._ancestors = {}    # wd -> directory watched while a root is missing
+        self._pending = []      # roots that do not exist yet
+        for root in self.roots:
+            self._watch_root(root)
+
+    def _add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise OSError(err, f"inotify_add_watch({path}): {os.strerror(err)}")
+        return wd
+
+    def _add_tree(self, top):
+        """Watches ``top`` and its subdirectories; returns the matching files already there."""
+        found = []
+        for dirpath, _dirnames, filenames in os.walk(top):
+            wd = self._add_watch(dirpath, _WATCH_MASK)
+            if wd is not None:
+                self._paths[wd] = dirpath
+            found.extend(os.path.join(dirpath, n) for n in filenames if n.endswith(self.suffixes))
+        return found
+
+    def _watch_root(self, root):
+        """Watches ``root``, or its nearest existing ancestor until it is created."""
+        while True:
+            if os.path.isdir(root):
+                if root in self._pending:
+                    self._pending.remove(root)
+                return self._add_tree(root)
+            parent = _existing_ancestor(root)
+            if parent not in self._ancestors.values():
+                wd = self._add_watch(parent, _ANCESTOR_MASK)
+                if wd is not None:
+                    self._ancestors[wd] = parent
+            # Directories created before the watch was in place emit no event
+            if _existing_ancestor(root) == parent and not os.path.isdir(root):
+                if root not in self._pending:
+                    self._pending.append(root)
+                return []
+
+    def _retry_pending(self):
+        found = []
+        for root in list(self._pending):
+            found.extend(self._watch_root(root))
+        return found
+
+    def _drain(self, changed):
+        """Reads queued events into ``changed``; returns False on queue overflow."""
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return not overflow
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0')
+                pos += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if wd in self._ancestors:
+                    if mask & IN_ISDIR:
+                        changed.update(self._retry_pending())
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                directory = self._paths.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files may land in a new directory before it is watched
+                        changed.update(self._add_tree(path))
+                elif path.endswith(self.suffixes) and not mask & IN_MOVED_FROM:
+                    changed.add(path)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until files change or ``timeout`` seconds pass. Returns the set
+        of changed paths, or None if events were lost and every file under the
+        roots should be treated as changed.
+        """
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return changed
+        complete = self._drain(changed)
+        # Let a burst of writes settle so it is processed as one batch
+        while select.select([self._fd], [], [], self.settle)[0]:
+            complete = self._drain(changed) and complete
+        return changed if complete else None
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Stat-based fallback: rescans ``roots`` every ``poll_interval`` seconds."""
+
+    def __init__(self, roots, suffixes, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.suffixes = tuple(suffixes)
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for root in self.roots:
+            for path in _matching_files(root, self.suffixes):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Polls until files change or ``timeout`` seconds pass; returns the changed paths."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.poll_interval
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+            snapshot = self._scan()
+            changed = {path for path, ident in snapshot.items() if self._snapshot.get(path) != ident}
+            self._snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots, suffixes, poll_interval=DEFAULT_POLL_INTERVAL, polling=False):
+    """Returns an InotifyWatcher, or a PollingWatcher if requested or inotify is unavailable."""
+    if not polling:
+        try:
+            return InotifyWatcher(roots, suffixes)
+        except OSError as e:
+            print(f"Note: inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollingWatcher(roots, suffixes, poll_interval)
@@ -0,0 +1,224 @@
+"""
+Schema-aware text extraction from Gemini conversation .pb files.
+
+blackboxprotobuf has to guess the type of every length-delimited field when it
+decodes without a schema, and it deep-copies the typedef for every nested
+message it decodes. The typedef it infers from one conversation is cached (in
+memory and on disk) and used to scan later files directly at the wire-format
+level: only message and text fields are visited, nothing else is decoded.
+Files with fields the typedef does not cover fall back to blackboxprotobuf,
+and the typedef it returns replaces the cached one.
+"""
+import os
+import json
+
+TYPEDEF_VERSION = 1
+
+# Caps for the text walkers: decoded trees deeper or larger than this are
+# truncated instead of exhausting the stack or memory
+MAX_WALK_DEPTH = 200
+MAX_WALK_SEGMENTS = 100000
+
+# Minimum length for a decoded field to count as conversation text
+MIN_TEXT_LENGTH = 21
+
+# Wire type expected for each blackboxprotobuf scalar type
+_WIRE_TYPES = {
+    'uint': 0, 'int': 0, 'sint': 0,
+    'fixed64': 1, 'sfixed64': 1, 'double': 1,
+    'fixed32': 5, 'sfixed32': 5, 'float': 5,
+}
+
+
+class SchemaMismatch(Exception):
+    """The cached typedef cannot describe this file; use blackboxprotobuf instead."""
+
+
+class TypedefCache:
+    """Holds the learned conversation typedef, optionally persisted as JSON."""
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.typedef = None
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == TYPEDEF_VERSION:
+                    self.typedef = data.get('typedef')
+            except (OSError, ValueError):
+                self.typedef = None
+
+    def learn(self, typedef):
+        if typedef and typedef != self.typedef:
+            self.typedef = typedef
+            self._dirty = True
+
+    def save(self):
+        if not (self.cache_path and self._dirty):
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TYPEDEF_VERSION, 'typedef': self.typedef}, f)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+
+def _is_text(value):
+    """Text rule shared by both walkers: > 20 characters and contains a space."""
+    return len(value) >= MIN_TEXT_LENGTH and ' ' in value
+
+
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _scan_fields(buf, start, end, typedef):
+    """
+    Splits one message into (field_type, value) items grouped the way
+    blackboxprotobuf groups them: fields in order of first appearance, repeats
+    of a field kept together. Message items carry (typedef, start, end);
+    text items carry the raw bytes.
+    """
+    grouped = {}
+    pos = start
+    while pos < end:
+        tag, pos = _read_varint(buf, pos)
+        field_number, wire_type = str(tag >> 3), tag & 0x7
+        field_typedef = typedef.get(field_number)
+        if field_typedef is None or 'alt_typedefs' in field_typedef:
+            raise SchemaMismatch(f"field {field_number} not covered by typedef")
+        field_type = field_typedef.get('type')
+
+        if wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            item_end = pos + length
+            if item_end > end:
+                raise SchemaMismatch("truncated length-delimited field")
+            if field_type == 'message':
+                item = ('message', (field_typedef.get('message_typedef') or {}, pos, item_end))
+            elif field_type in ('bytes', 'str'):
+                item = (field_type, buf[pos:item_end])
+            elif field_type and field_type.startswith('packed_'):
+                item = None
+            else:
+                raise SchemaMismatch(f"field {field_number} is not length-delimited")
+            pos = item_end
+        elif _WIRE_TYPES.get(field_type) == wire_type:
+            if wire_type == 0:
+                _, pos = _read_varint(buf, pos)
+            else:
+                pos += 8 if wire_type == 1 else 4
+            item = None
+        else:
+            raise SchemaMismatch(f"unexpected wire type {wire_type} for field {field_number}")
+
+        items = grouped.setdefault(field_number, [])
+        if item is not None:
+            items.append(item)
+    if pos != end:
+        raise SchemaMismatch("message overruns its length")
+    return [item for items in grouped.values() for item in items]
+
+
+def iter_pb_text(data, typedef, max_depth=MAX_WALK_DEPTH, max_segments=MAX_WALK_SEGMENTS):
+    """
+    Yields text fields of a serialized conversation using a learned typedef,
+    in the same order as walking blackboxprotobuf's decoded output.
+    Raises SchemaMismatch as soon as the data leaves what the typedef covers.
+    """
+    found = 0
+    try:
+        stack = [iter(_scan_fields(data, 0, len(data), typedef))]
+        while stack:
+            for field_type, value in stack[-1]:
+                if field_type == 'message':
+                    if len(stack) <= max_depth:
+                        stack.append(iter(_scan_fields(data, value[1], value[2], value[0])))
+                        break
+                    continue
+                if field_type == 'str':
+                    value = value.decode('utf-8')
+                elif len(value) < MIN_TEXT_LENGTH or b' ' not in value:
+                    continue
+                else:
+                    try:
+                        value = value.decode('utf-8')
+                    except UnicodeDecodeError:
+                        continue
+                if _is_text(value):
+                    yield value
+                    found += 1
+                    if found >= max_segments:
+                        return
+            else:
+                stack.pop()
+    except (IndexError, UnicodeDecodeError) as e:
+        raise SchemaMismatch(str(e))
+
+
+def iter_text_fields(obj, max_depth=MAX_WALK_DEPTH, max_segments=MAX_WALK_SEGMENTS):
+    """
+    Yields text-like strings from a decoded message, depth first in field order.
+    Bytes are kept if they decode as UTF-8. Iterative, so deeply nested
+    messages cannot hit the recursion limit.
+    """
+    found = 0
+    stack = [iter((obj,))]
+    while stack:
+        for node in stack[-1]:
+            if isinstance(node, dict):
+                if len(stack) <= max_depth:
+                    stack.append(iter(node.values()))
+                    break
+            elif isinstance(node, list):
+                if len(stack) <= max_depth:
+                    stack.append(iter(node))
+                    break
+            elif isinstance(node, (str, bytes)):
+                if isinstance(node, bytes):
+                    if len(node) < MIN_TEXT_LENGTH or b' ' not in node:
+                        continue
+                    try:
+                        node = node.decode('utf-8')
+                    except UnicodeDecodeError:
+                        continue
+                if _is_text(node):
+                    yield node
+                    found += 1
+                    if found >= max_segments:
+                        return
+        else:
+            stack.pop()
+
+
+def extract_pb_text(bbp, data, cache):
+    """
+    Returns the text segments of one conversation.
+    Uses the cached typedef with the wire-level scanner when it covers the
+    file; otherwise decodes with the blackboxprotobuf module ``bbp`` (seeded
+    with the cached typedef) and caches the typedef it infers.
+    """
+    if cache.typedef:
+        try:
+            return list(iter_pb_text(data, cache.typedef))
+        except SchemaMismatch:
+            pass
+        try:
+            message, typedef = bbp.decode_message(data, cache.typedef)
+            cache.learn(typedef)
+            return list(iter_text_fields(message))
+        except Exception:
+            pass
+    message, typedef = bbp.decode_message(data)
+    cache.learn(typedef)
+    return list(iter_text_fields(message))
@@ -0,0 +1,436 @@
+"""
+BM25 search over extracted chat history and MEMORY-archive.md entries.
+
+Every ``### Message N`` / ``### Fragment N`` block of the daily exports and
+every ``### Title`` entry of the memory archives is one document. Documents
+go into an inverted index (term -> postings with term frequency and document
+length) kept in SQLite at ``<output>/.extraction-cache/search.db``, so a
+query reads only the postings of its own terms and ranks them with BM25.
+
+The index is updated incrementally: a file that only grew is parsed from its
+last indexed block, and a rewritten file is diffed block by block (by message
+number and content hash), so regenerated exports cost a parse, not a reindex.
+Once the index exists, run_extraction.py refreshes it after every run and
+every --watch batch.
+
+Usage:
+  python3 core/scripts/history_search.py "query" [--limit 10] [--kind chat|archive]
+                                          [--archive PATH ...] [--output-dir DIR] [--json]
+  python3 core/scripts/history_search.py --update-only
+"""
+import os
+import re
+import sys
+import json
+import glob
+import math
+import time
+import heapq
+import sqlite3
+import hashlib
+import argparse
+from collections import Counter
+
+from cold_storage import INDEX_SUFFIX, export_exists, export_fingerprint, export_stat, member_paths, open_export
+
+INDEX_VERSION = 1
+INDEX_FILENAME = 'search.db'
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Archive titles count this many times towards term frequency
+TITLE_WEIGHT = 2
+
+PREVIEW_CHARS = 160
+
+_TOKEN = re.compile(r"[a-z0-9_]{2,}")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do for from has have i if in into is it its me my no not
+of on or our so that the their then there these they this to was we were what when which
+will with you your
+""".split())
+
+_CHAT_HEADING = re.compile(rb'^### (?:Message (\d+): (\w+)|Fragment (\d+))')
+_ARCHIVE_HEADING = re.compile(rb'^### (.+)')
+# Export scaffolding that would otherwise be indexed in every block
+_CHAT_SKIP = (b'**Timestamp:**', b'**Content:**', b'**Thinking Block:**', b'**Tool Calls:**',
+              b'```', b'---', b'## Session ', b'## [Incremental Update', b'> **Note:**')
+_EXPORT_NAME = re.compile(r'^\d{4}-\d{2}-\d{2}-.+\.md$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    number INTEGER NOT NULL,
+    label TEXT,
+    line INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    preview TEXT,
+    terms TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_by_file ON docs (file_id, offset);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    doc_length INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text):
+    """Lower-cased word tokens of ``text`` without stopwords."""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def default_archives():
+    """MEMORY-archive.md files of every Claude project memory folder."""
+    return sorted(glob.glob(os.path.expanduser("~/.claude/projects/*/memory/MEMORY-archive.md")))
+
+
+def _document(number, label, line, offset, body_lines, title=None):
+    text = b''.join(body_lines).decode('utf-8', errors='replace')
+    tokens = tokenize(text)
+    if title:
+        tokens = tokenize(title) * TITLE_WEIGHT + tokens
+    # Whitespace-insensitive, so separators appended after a block do not change it
+    normalized = ' '.join(text.split())
+    preview = title or normalized[:PREVIEW_CHARS]
+    digest = hashlib.sha1(f"{label}\x00{title or ''}\x00{normalized}".encode('utf-8')).hexdigest()
+    return {'number': number, 'label': label, 'line': line, 'offset': offset,
+            'tokens': tokens, 'hash': digest, 'preview': preview}
+
+
+def iter_chat_blocks(f, offset=0, line=1):
+    """
+    Yields one document per message/fragment block of an export opened in
+    binary mode, starting at byte ``offset`` (which is on line ``line``).
+    """
+    f.seek(offset)
+    current = None
+    for raw in f:
+        m = _CHAT_HEADING.match(raw)
+        if m:
+            if current:
+                yield _document(*current)
+            number = int(m.group(1) or m.group(3))
+            label = m.group(2).decode() if m.group(1) else 'Fragment'
+            current = (number, label, line, offset, [])
+        elif current and not raw.startswith(_CHAT_SKIP):
+            current[4].append(raw)
+        offset += len(raw)
+        line += 1
+    if current:
+        yield _document(*current)
+
+
+def iter_archive_entries(f):
+    """Yields one document per ``### Title`` entry; entries are numbered 1, 2, ... in file order."""
+    current = None
+    number = 0
+    offset, line = 0, 1
+    for raw in f:
+        m = _ARCHIVE_HEADING.match(raw)
+        if m or raw.startswith(b'## ') or raw.startswith(b'# '):
+            if current:
+                yield _document(*current)
+                current = None
+        if m:
+            number += 1
+            title = m.group(1).decode('utf-8', errors='replace').strip()
+            current = (number, 'Entry', line, offset, [], title)
+        elif current:
+            current[4].append(raw)
+        offset += len(raw)
+        line += 1
+    if current:
+        yield _document(*current)
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking, persisted in SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.conn.executescript(_SCHEMA)
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if meta.get('version', str(INDEX_VERSION)) != str(INDEX_VERSION):
+            raise ValueError(f"{path} has index version {meta['version']}, expected {INDEX_VERSION}")
+        self.total_docs = int(meta.get('total_docs', 0))
+        self.total_length = int(meta.get('total_length', 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # ── Updating ─────────────────────────────────────────────────────────
+
+    def _insert_doc(self, file_id, doc, postings):
+        """Adds the document row and appends its postings rows to ``postings``."""
+        length = len(doc['tokens'])
+        tf = Counter(doc['tokens'])
+        # The distinct terms are kept so the postings can be deleted by primary key
+        cur = self.conn.execute(
+            "INSERT INTO docs (file_id, number, label, line, offset, length, hash, preview, terms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (file_id, doc['number'], doc['label'], doc['line'], doc['offset'], length,
+             doc['hash'], doc['preview'], ' '.join(tf)))
+        doc_id = cur.lastrowid
+        postings.extend((term, doc_id, n, length) for term, n in tf.items())
+        self.total_docs += 1
+        self.total_length += length
+
+    def _delete_docs(self, doc_ids):
+        for doc_id in doc_ids:
+            length, terms = self.conn.execute(
+                "SELECT length, terms FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            self.conn.executemany("DELETE FROM postings WHERE term = ? AND doc_id = ?",
+                                  [(term, doc_id) for term in terms.split()])
+            self.conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+            self.total_docs -= 1
+            self.total_length -= length
+
+    def _sync_file(self, path, kind, st):
+        """Brings the documents of one file up to date; returns (added, removed)."""
+        row = self.conn.execute(
+            "SELECT id, size, mtime_ns, fingerprint FROM files WHERE path = ?", (path,)).fetchone()
+        if row and (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+            return 0, 0
+
+        start_offset, start_line = 0, 1
+        if row is None:
+            file_id = self.conn.execute(
+                "INSERT INTO files (path, kind, size, mtime_ns) VALUES (?, ?, 0, 0)", (path, kind)).lastrowid
+        else:
+            file_id = row[0]
+            if kind == 'chat' and st.st_size > row[1] and row[3] and \
+                    export_fingerprint(path, row[1]) == row[3]:
+                # Appended to: re-read from the start of the last indexed block
+                tail = self.conn.execute(
+                    "SELECT offset, line FROM docs WHERE file_id = ? ORDER BY offset DESC LIMIT 1",
+                    (file_id,)).fetchone()
+                if tail:
+                    start_offset, start_line = tail
+
+        old = {}
+        for doc_id, number, digest, offset in self.conn.execute(
+                "SELECT id, number, hash, offset FROM docs WHERE file_id = ? AND offset >= ?",
+                (file_id, start_offset)):
+            old.setdefault((number, digest), []).append(doc_id)
+
+        added = 0
+        postings = []
+        with open_export(path, 'rb') as f:
+            docs = iter_chat_blocks(f, start_offset, start_line) if kind == 'chat' else iter_archive_entries(f)
+            for doc in docs:
+                same = old.get((doc['number'], doc['hash']))
+                if same:
+                    # Unchanged block, possibly moved: keep its postings
+                    self.conn.execute("UPDATE docs SET line = ?, offset = ? WHERE id = ?",
+                                      (doc['line'], doc['offset'], same.pop()))
+                    continue
+                self._insert_doc(file_id, doc, postings)
+                added += 1
+        # Inserting in key order keeps the postings B-tree writes local
+        postings.sort()
+        self.conn.executemany("INSERT INTO postings (term, doc_id, tf, doc_length) VALUES (?, ?, ?, ?)", postings)
+        stale = [doc_id for ids in old.values() for doc_id in ids]
+        self._delete_docs(stale)
+        self.conn.execute(
+            "UPDATE files SET size = ?, mtime_ns = ?, fingerprint = ? WHERE id = ?",
+            (st.st_size, st.st_mtime_ns, export_fingerprint(path, st.st_size), file_id))
+        return added, len(stale)
+
+    def update(self, chat_dir=None, archives=()):
+        """
+        Indexes new and changed exports under ``chat_dir`` and the given
+        archive files. Exports the walk no longer finds, loose or in cold
+        storage, and deleted archive files are dropped with their documents.
+        Returns a dict with files_changed, docs_added, docs_removed and seconds.
+        """
+        start = time.perf_counter()
+        sources = []
+        if chat_dir and os.path.isdir(chat_dir):
+            for dirpath, dirnames, filenames in os.walk(chat_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                sources.extend((os.path.join(dirpath, n), 'chat') for n in filenames if _EXPORT_NAME.match(n))
+                for n in filenames:
+                    if n.endswith(INDEX_SUFFIX):
+                        sources.extend((p, 'chat') for p in member_paths(os.path.join(dirpath, n))
+                                       if _EXPORT_NAME.match(os.path.basename(p)) and not os.path.exists(p))
+        sources.extend((os.path.abspath(p), 'archive') for p in archives if os.path.isfile(p))
+
+        changed = added = removed = 0
+        seen = set()
+        for path, kind in sources:
+            try:
+                st = export_stat(path)
+                seen.add(path)
+                a, r = self._sync_file(path, kind, st)
+            except FileNotFoundError:
+                # Deleted since the walk: dropped below with the other stale files
+                seen.discard(path)
+                continue
+            except OSError as e:
+                print(f"Warning: Could not index {path}: {e}")
+                continue
+            if a or r:
+                changed += 1
+                added += a
+                removed += r
+
+        for file_id, path, kind in self.conn.execute("SELECT id, path, kind FROM files").fetchall():
+            if path in seen:
+                continue
+            # Chat exports are stale once the walk misses them; files outside
+            # this update (an archive left out of ``archives``) only once deleted
+            if (kind == 'chat' and chat_dir) or not export_exists(path):
+                doc_ids = [r[0] for r in self.conn.execute("SELECT id FROM docs WHERE file_id = ?", (file_id,))]
+                self._delete_docs(doc_ids)
+                self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                changed += 1
+                removed += len(doc_ids)
+
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('version', str(INDEX_VERSION)),
+            ('total_docs', str(self.total_docs)),
+            ('total_length', str(self.total_length)),
+        ])
+        self.conn.commit()
+        return {'files_changed': changed, 'docs_added': added, 'docs_removed': removed,
+                'seconds': round(time.perf_counter() - start, 4)}
+
+    # ── Querying ─────────────────────────────────────────────────────────
+
+    def search(self, query, limit=10, kind=None):
+        """
+        Returns up to ``limit`` hits ranked by BM25, each a dict with path,
+        kind, number (message or entry number), label, line, score, preview.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.total_docs:
+            return []
+        avg_length = self.total_length / self.total_docs
+        scores = {}
+        for term in terms:
+            postings = self.conn.execute(
+                "SELECT doc_id, tf, doc_length FROM postings WHERE term = ?", (term,)).fetchall()
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (self.total_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf, length in postings:
+                norm = K1 * (1 - B + B * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        if kind:
+            # Archive entries are few, so filter by their ids either way
+            archive_ids = {r[0] for r in self.conn.execute(
+                "SELECT d.id FROM docs d JOIN files f ON f.id = d.file_id WHERE f.kind = 'archive'")}
+            keep = kind == 'archive'
+            scores = {doc_id: score for doc_id, score in scores.items() if (doc_id in archive_ids) == keep}
+
+        hits = []
+        for doc_id, score in heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1]):
+            row = self.conn.execute(
+                "SELECT f.path, f.kind, d.number, d.label, d.line, d.preview FROM docs d "
+                "JOIN files f ON f.id = d.file_id WHERE d.id = ?", (doc_id,)).fetchone()
+            hits.append(dict(zip(('path', 'kind', 'number', 'label', 'line', 'preview'), row),
+                             score=round(score, 4)))
+        return hits
+
+
+def index_path(cache_dir):
+    return os.path.join(cache_dir, INDEX_FILENAME)
+
+
+def update_index_if_present(cache_dir, chat_dir, archives=None, create=False):
+    """
+    Refreshes the search index after extraction if one has been built (or
+    builds it with create=True). Returns the update summary, or None when
+    there is no index.
+    """
+    path = index_path(cache_dir)
+    if not create and not os.path.exists(path):
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    with SearchIndex(path) as index:
+        return index.update(chat_dir, default_archives() if archives is None else archives)
+
+
+def format_hit(hit, chat_dir):
+    where = os.path.relpath(hit['path'], chat_dir) if hit['kind'] == 'chat' else hit['path']
+    ref = f"message {hit['number']}" if hit['kind'] == 'chat' else f"entry {hit['number']}"
+    return f"{hit['score']:>7.2f}  {where}  {ref} ({hit['label']}, line {hit['line']})  {hit['preview']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 search over chat history and MEMORY-archive.md")
+    parser.add_argument("query", nargs="?", help="Search terms")
+    parser.add_argument("--limit", type=int, default=10, help="Maximum hits (default: 10)")
+    parser.add_argument("--kind", choices=['chat', 'archive'], default=None, help="Only chat messages or archive entries")
+    parser.add_argument("--archive", action="append", default=None, metavar="PATH",
+                        help="MEMORY-archive.md to index (repeatable; default: every ~/.claude/projects/*/memory/MEMORY-archive.md)")
+    parser.add_argument("--output-dir", type=str, default=None, help="Chat history directory (default: auto-detect from active KG)")
+    parser.add_argument("--no-update", action="store_true", help="Query the index as it is, without indexing changed files first")
+    parser.add_argument("--update-only", action="store_true", help="Update the index and exit")
+    parser.add_argument("--json", action="store_true", help="Print hits as JSON")
+    args = parser.parse_args()
+    if not args.query and not args.update_only:
+        parser.error("a query is required unless --update-only is given")
+
+    if args.output_dir:
+        os.environ['KG_OUTPUT_DIR'] = args.output_dir
+    from chat_extractor_base import OUTPUT_DIR, get_cache_dir
+
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    with SearchIndex(index_path(get_cache_dir())) as index:
+        if not args.no_update:
+            summary = index.update(OUTPUT_DIR, default_archives() if args.archive is None else args.archive)
+            if args.update_only or summary['files_changed']:
+                print(f"Indexed {summary['files_changed']} changed files "
+                      f"(+{summary['docs_added']}/-{summary['docs_removed']} blocks) in {summary['seconds']}s",
+                      file=sys.stderr)
+        if args.update_only:
+            return
+        start = time.perf_counter()
+        hits = index.search(args.query, args.limit, args.kind)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps({'query': args.query, 'milliseconds': round(elapsed_ms, 2), 'hits': hits}, indent=2))
+        return
+    if not hits:
+        print(f"No matches found for: {args.query}", file=sys.stderr)
+        sys.exit(1)
+    for hit in hits:
+        print(format_hit(hit, OUTPUT_DIR))
+    print(f"{len(hits)} hits in {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Fast JSONL ingest helpers for chat history extraction.
+
+Files are mapped with mmap and split into line spans without copying, so a
+byte-level prefilter can reject records before they are decoded. Decoding
+uses orjson or msgspec when installed and falls back to the standard library.
+"""
+import json
+import mmap
+from contextlib import contextmanager
+
+# Optional fast JSON backends (not required; stdlib json is always available)
+try:
+    import orjson
+    _fast_loads = orjson.loads
+    _FAST_ERRORS = (orjson.JSONDecodeError,)
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    try:
+        import msgspec
+        _fast_loads = msgspec.json.Decoder().decode
+        _FAST_ERRORS = (msgspec.DecodeError,)
+        JSON_BACKEND = 'msgspec'
+    except ImportError:
+        _fast_loads = None
+        _FAST_ERRORS = ()
+        JSON_BACKEND = 'json'
+
+
+def loads(data, fast=True):
+    """
+    Decodes one JSON document from bytes.
+    The fast backend is tried first; anything it rejects (NaN, huge integers,
+    lone surrogates...) is retried with the stdlib decoder so results match
+    json.loads exactly. Raises ValueError on invalid JSON.
+    """
+    if fast and _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except _FAST_ERRORS:
+            pass
+    return json.loads(data)
+
+
+@contextmanager
+def map_file(path):
+    """Yields a read-only mmap of ``path`` (or empty bytes for an empty file)."""
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+def iter_line_spans(buf, start, end):
+    """Yields (line_start, line_end) spans for lines in buf[start:end], newline excluded."""
+    pos = start
+    while pos < end:
+        nl = buf.find(b'\n', pos, end)
+        if nl == -1:
+            yield pos, end
+            return
+        yield pos, nl
+        pos = nl + 1
@@ -0,0 +1,351 @@
+"""
+Optional SQLite store holding every extracted message.
+
+One row per message (source, project, session, role, timestamp, content,
+thinking, tool calls, content hash), grouped under one row per session file.
+Extractors add only the sessions whose source file changed since it was last
+stored, and daily exports are rendered by querying a day's sessions back, so
+re-rendering does not re-read the source logs. Sessions whose source file was
+deleted are dropped at the start of the next run. When the SQLite build has FTS5,
+message text is indexed for full-text search.
+
+The store lives at ``<output>/.extraction-cache/messages.db``. It is created
+by ``run_extraction.py --store`` and used by every later run once it exists.
+
+Usage:
+  python3 core/scripts/message_store.py search "query" [--source claude] [--limit 20]
+  python3 core/scripts/message_store.py stats
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+STORE_VERSION = 1
+STORE_FILENAME = 'messages.db'
+
+# Sources extracted concurrently each hold a connection; a writer waits this
+# long for another source's transaction to commit instead of failing
+BUSY_TIMEOUT_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    session_key TEXT NOT NULL,
+    project TEXT,
+    day TEXT NOT NULL,
+    ts_str TEXT NOT NULL,
+    method TEXT,
+    UNIQUE (source, session_key)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_day ON sessions (source, day, ts_str, id);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    pos INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    timestamp TEXT,
+    content TEXT,
+    thinking TEXT,
+    tool_calls TEXT,
+    uuid TEXT,
+    content_hash TEXT NOT NULL,
+    UNIQUE (session_id, pos)
+);
+CREATE INDEX IF NOT EXISTS messages_by_hash ON messages (content_hash);
+"""
+
+# External-content FTS5 table kept in sync with ``messages`` by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, thinking, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, thinking) VALUES (new.id, new.content, new.thinking);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, thinking)
+    VALUES ('delete', old.id, old.content, old.thinking);
+END;
+"""
+
+# Role used for Gemini .pb text fragments, which have no speaker
+FRAGMENT_ROLE = 'fragment'
+
+
+def content_hash(role, content, thinking=None):
+    """Returns a SHA-1 of a message's role and text, used to spot repeated messages."""
+    key = '\x00'.join((role or '', content or '', thinking or ''))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def store_path(cache_dir):
+    return os.path.join(cache_dir, STORE_FILENAME)
+
+
+def open_store(cache_dir, create=False, rescan=False):
+    """
+    Returns the MessageStore in ``cache_dir`` if it exists (or ``create`` is
+    set), otherwise None. ``rescan`` makes every source count as changed.
+    """
+    path = store_path(cache_dir)
+    if not create and not os.path.exists(path):
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    return MessageStore(path, rescan=rescan)
+
+
+def _message_rows(session_id, messages, start):
+    for pos, msg in enumerate(messages[start:], start):
+        tool_calls = msg.tool_calls
+        yield (session_id, pos, msg.role, msg.timestamp, msg.content, msg.thinking,
+               json.dumps(tool_calls) if tool_calls else None, msg.uuid,
+               content_hash(msg.role, msg.content, msg.thinking))
+
+
+class MessageStore:
+    """
+    SQLite-backed message store. Writes made by add_session() and
+    mark_source() are committed by commit() (or on leaving a ``with`` block).
+    """
+
+    def __init__(self, path, rescan=False):
+        self.path = path
+        self.rescan = rescan
+        # Imported here so a run without a store never loads sqlite3
+        import sqlite3
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.has_fts = True
+        try:
+            self.conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: the store still works, search falls back to LIKE
+            self.has_fts = False
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (str(STORE_VERSION),))
+        elif row[0] != str(STORE_VERSION):
+            raise ValueError(f"{path} has store version {row[0]}, expected {STORE_VERSION}")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # ── Filling ──────────────────────────────────────────────────────────
+
+    def source_unchanged(self, path, st):
+        """True if ``path`` was stored at its current size and mtime."""
+        if self.rescan:
+            return False
+        row = self.conn.execute("SELECT size, mtime_ns FROM sources WHERE path = ?", (path,)).fetchone()
+        return row is not None and row == (st.st_size, st.st_mtime_ns)
+
+    def mark_source(self, path, st):
+        """Records that ``path`` has been stored as of ``st``."""
+        self.conn.execute(
+            "INSERT INTO sources (path, size, mtime_ns) VALUES (?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns",
+            (path, st.st_size, st.st_mtime_ns))
+
+    def prune(self, source):
+        """
+        Drops the sessions of ``source`` (with their messages) and the source
+        rows whose file no longer exists, as ExtractionManifest.prune does
+        for cached messages. Returns the number of sessions dropped.
+        """
+        gone = [(session_id, key) for session_id, key in self.conn.execute(
+            "SELECT id, session_key FROM sessions WHERE source = ?", (source,)) if not os.path.exists(key)]
+        self.conn.executemany("DELETE FROM messages WHERE session_id = ?", ((i,) for i, _ in gone))
+        self.conn.executemany("DELETE FROM sessions WHERE id = ?", ((i,) for i, _ in gone))
+        # Files stored without a dated session have a source row only
+        orphans = [path for (path,) in self.conn.execute(
+            "SELECT path FROM sources WHERE path NOT IN (SELECT session_key FROM sessions)")
+            if not os.path.exists(path)]
+        self.conn.executemany("DELETE FROM sources WHERE path = ?",
+                              ((path,) for path in [key for _, key in gone] + orphans))
+        self.conn.commit()
+        return len(gone)
+
+    def add_session(self, source, session_key, session, project=None):
+        """
+        Stores ``session`` (an extractor session dict) under (source,
+        session_key), replacing what was stored for it before. A session that
+        only grew keeps its rows and gets the new messages appended.
+        """
+        ts_str = session.get('ts_str') or session.get('ts') or "000000"
+        self.conn.execute(
+            "INSERT INTO sessions (source, session_key, project, day, ts_str, method) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (source, session_key) DO UPDATE SET project = excluded.project, "
+            "day = excluded.day, ts_str = excluded.ts_str, method = excluded.method",
+            (source, session_key, project, session['date'], ts_str, session.get('method')))
+        session_id = self.conn.execute(
+            "SELECT id FROM sessions WHERE source = ? AND session_key = ?", (source, session_key)).fetchone()[0]
+
+        # Imported here: chat_extractor_base reads KG_OUTPUT_DIR on import (see main)
+        from chat_extractor_base import Message
+        if 'segments' in session:
+            messages = [Message(FRAGMENT_ROLE, content=text) for text in session['segments']]
+        else:
+            messages = list(session['messages'])
+
+        # Keep the stored prefix when it is unchanged (the file was only appended to)
+        stored = self.conn.execute(
+            "SELECT content_hash, uuid FROM messages WHERE session_id = ? ORDER BY pos", (session_id,)).fetchall()
+        start = len(stored)
+        if start > len(messages) or any(
+                (content_hash(m.role, m.content, m.thinking), m.uuid) != tuple(row)
+                for m, row in zip(messages, stored)):
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            start = 0
+        self.conn.executemany(
+            "INSERT INTO messages (session_id, pos, role, timestamp, content, thinking, tool_calls, uuid, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", _message_rows(session_id, messages, start))
+        return session_id
+
+    # ── Reading ──────────────────────────────────────────────────────────
+
+    def days(self, source):
+        return [r[0] for r in self.conn.execute(
+            "SELECT DISTINCT day FROM sessions WHERE source = ? ORDER BY day", (source,))]
+
+    def _iter_messages(self, session_id):
+        from chat_extractor_base import Message
+        cur = self.conn.execute(
+            "SELECT role, timestamp, content, thinking, tool_calls, uuid FROM messages "
+            "WHERE session_id = ? ORDER BY pos", (session_id,))
+        for role, timestamp, content, thinking, tool_calls, uuid in cur:
+            yield Message(role, timestamp, content, thinking,
+                          json.loads(tool_calls) if tool_calls else None, uuid)
+
+    def sessions(self, source, day):
+        """
+        Yields the stored sessions of ``source`` for ``day`` in start-time
+        order as extractor session dicts. Message lists are read lazily and
+        must be consumed before advancing. Sessions made of .pb fragments
+        come back with ``segments`` instead of ``messages``.
+        """
+        rows = self.conn.execute(
+            "SELECT s.id, s.session_key, s.ts_str, s.method, COUNT(m.id), MIN(m.role = ?) FROM sessions s "
+            "JOIN messages m ON m.session_id = s.id WHERE s.source = ? AND s.day = ? "
+            "GROUP BY s.id ORDER BY s.ts_str, s.id", (FRAGMENT_ROLE, source, day)).fetchall()
+        for session_id, session_key, ts_str, method, count, all_fragments in rows:
+            session = {'date': day, 'ts_str': ts_str, 'ts': ts_str, 'count': count, 'method': method,
+                       'source_path': session_key}
+            if all_fragments:
+                session['segments'] = [m.content for m in self._iter_messages(session_id)]
+            else:
+                session['messages'] = self._iter_messages(session_id)
+            yield session
+
+    def day_view(self, source, dates):
+        """Returns a DaySpillStore-compatible view of ``dates`` for the export writers."""
+        return StoreDayView(self, source, dates)
+
+    def search(self, query, source=None, limit=20):
+        """
+        Returns up to ``limit`` matching messages, best first, as dicts with
+        source, day, session, project, role, timestamp and a text snippet.
+        """
+        where, params = "", []
+        if source:
+            where, params = " AND s.source = ?", [source]
+        if self.has_fts:
+            sql = ("SELECT s.source, s.day, s.session_key, s.project, m.role, m.timestamp, "
+                   "snippet(messages_fts, -1, '[', ']', ' … ', 12) FROM messages_fts "
+                   "JOIN messages m ON m.id = messages_fts.rowid JOIN sessions s ON s.id = m.session_id "
+                   f"WHERE messages_fts MATCH ?{where} ORDER BY bm25(messages_fts) LIMIT ?")
+        else:
+            sql = ("SELECT s.source, s.day, s.session_key, s.project, m.role, m.timestamp, "
+                   "substr(m.content, 1, 160) FROM messages m JOIN sessions s ON s.id = m.session_id "
+                   f"WHERE (m.content LIKE '%' || ? || '%' OR m.thinking LIKE '%' || ? || '%'){where} "
+                   "ORDER BY m.timestamp DESC LIMIT ?")
+            params = [query] + params
+        keys = ('source', 'day', 'session', 'project', 'role', 'timestamp', 'snippet')
+        return [dict(zip(keys, row)) for row in self.conn.execute(sql, [query] + params + [limit])]
+
+    def counts(self):
+        """Returns row counts per table, for the stats command."""
+        return {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('sources', 'sessions', 'messages')}
+
+
+class StoreDayView:
+    """
+    Exposes stored days through the interface _write_claude_days() reads
+    from a DaySpillStore: dates(), session_counts, message_counts and
+    iter_sessions(date).
+    """
+
+    def __init__(self, store, source, dates):
+        self.store = store
+        self.source = source
+        self.session_counts = {}
+        self.message_counts = {}
+        for date in dates:
+            n_sessions, n_messages = store.conn.execute(
+                "SELECT COUNT(DISTINCT s.id), COUNT(m.id) FROM sessions s "
+                "JOIN messages m ON m.session_id = s.id WHERE s.source = ? AND s.day = ?",
+                (source, date)).fetchone()
+            if n_sessions:
+                self.session_counts[date] = n_sessions
+                self.message_counts[date] = n_messages
+
+    def dates(self):
+        return list(self.session_counts)
+
+    def iter_sessions(self, date):
+        return self.store.sessions(self.source, date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the extracted message store")
+    parser.add_argument("command", choices=['search', 'stats'])
+    parser.add_argument("query", nargs="?", help="FTS5 query for search (e.g. 'mcp AND config')")
+    parser.add_argument("--source", choices=['claude', 'gemini'], default=None)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--output-dir", type=str, default=None, help="Chat history directory holding the store")
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.environ['KG_OUTPUT_DIR'] = args.output_dir
+    from chat_extractor_base import get_cache_dir
+
+    store = open_store(get_cache_dir())
+    if store is None:
+        sys.exit(f"No message store in {get_cache_dir()} (create one with run_extraction.py --store)")
+    with store:
+        if args.command == 'stats':
+            for table, count in store.counts().items():
+                print(f"{table:<10} {count:>10,}")
+            print(f"fts5       {'yes' if store.has_fts else 'no'}")
+            return
+        if not args.query:
+            parser.error("search needs a query")
+        for hit in store.search(args.query, args.source, args.limit):
+            print(f"{hit['day']}-{hit['source']}.md  {hit['role']:<9} {hit['timestamp'] or '':<25} {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Filename -> path index over the chat-history output directory.
+
+Replaces a full os.walk per get_output_path() call with a listing that is
+built once per run and updated as new files are registered. The index can be
+persisted; on load only directories whose mtime changed are re-listed.
+"""
+import os
+import json
+import time
+
+INDEX_VERSION = 1
+
+# Index file of a month packed by cold_storage; that module (and its codecs)
+# is imported only when the output directory holds one
+COLD_INDEX_SUFFIX = '.cold.json'
+
+# Directories modified this recently may still change within the same mtime
+# tick, so they are always re-listed on the next load
+_RACY_SECONDS = 2
+
+
+def _is_skipped_dir(name):
+    return name.startswith('.') or name == 'scripts'
+
+
+class OutputPathIndex:
+    """
+    Keeps, per directory under ``root``, its mtime and the files and
+    (non-hidden) subdirectories it contains. Lookups return the first match in
+    top-down walk order, mirroring the previous os.walk search.
+    """
+
+    def __init__(self, root, cache_path=None):
+        self.root = root
+        self.cache_path = cache_path
+        self.dirs = {}
+        self._by_name = None
+        if cache_path:
+            self._load()
+        self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == INDEX_VERSION and data.get('root') == self.root:
+            self.dirs = data.get('dirs', {})
+
+    def _scan_dir(self, dirpath):
+        """Lists one directory and recursively scans subdirectories not yet known."""
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            self.dirs.pop(dirpath, None)
+            return
+        files, subdirs = [], []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if not _is_skipped_dir(entry.name):
+                        subdirs.append(entry.path)
+                else:
+                    files.append(entry.name)
+            except OSError:
+                continue
+        if time.time() - mtime_ns / 1e9 < _RACY_SECONDS:
+            mtime_ns = -1
+        self.dirs[dirpath] = {'mtime_ns': mtime_ns, 'files': files, 'subdirs': subdirs}
+        for sub in subdirs:
+            if sub not in self.dirs:
+                self._scan_dir(sub)
+
+    def refresh(self):
+        """Re-lists directories that changed (or vanished) since they were scanned."""
+        if self.root not in self.dirs:
+            self._scan_dir(self.root)
+        for dirpath in list(self.dirs):
+            info = self.dirs.get(dirpath)
+            if info is None:
+                continue
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                self.dirs.pop(dirpath, None)
+                continue
+            if mtime_ns != info['mtime_ns']:
+                self._scan_dir(dirpath)
+        # Drop directories no longer reachable from the root
+        reachable = set()
+        stack = [self.root]
+        while stack:
+            dirpath = stack.pop()
+            if dirpath in reachable or dirpath not in self.dirs:
+                continue
+            reachable.add(dirpath)
+            stack.extend(self.dirs[dirpath]['subdirs'])
+        for dirpath in set(self.dirs) - reachable:
+            del self.dirs[dirpath]
+        self._by_name = None
+
+    def _name_map(self):
+        if self._by_name is None:
+            by_name = {}
+            stack = [self.root]
+            while stack:
+                dirpath = stack.pop()
+                info = self.dirs.get(dirpath)
+                if info is None:
+                    continue
+                for name in info['files']:
+                    by_name.setdefault(name, os.path.join(dirpath, name))
+                    if name.endswith(COLD_INDEX_SUFFIX):
+                        # Files packed into a cold-storage archive keep their path
+                        from cold_storage import member_paths
+                        for path in member_paths(os.path.join(dirpath, name)):
+                            by_name.setdefault(os.path.basename(path), path)
+                stack.extend(reversed(info['subdirs']))
+            self._by_name = by_name
+        return self._by_name
+
+    def lookup(self, filename):
+        """Returns the known path for ``filename`` or None."""
+        return self._name_map().get(filename)
+
+    def add(self, path):
+        """Registers a file that is about to be created so later lookups find it."""
+        self._name_map().setdefault(os.path.basename(path), path)
+
+    def save(self):
+        """Persists the index after picking up this run's directory changes."""
+        if not self.cache_path:
+            return
+        self.refresh()
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'root': self.root, 'dirs': self.dirs}, f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,165 @@
+"""
+Sidecar sync index for incremental appends to daily markdown exports.
+
+Each export gets a small JSON file in the extraction cache recording what was
+written to it: the last message number, the file size after the last write
+(plus a hash of its final bytes) and a short hash of every message ID already
+in the file. While the export still ends where the sidecar says, a later run
+appends exactly the messages whose IDs are missing, without reading the
+markdown back. Exports without a matching sidecar (older runs, manual edits)
+fall back to parsing the tail of the file.
+
+Like the extraction manifest, an append costs what it adds: the new state,
+IDs and dedup blocks go to a log next to the sidecar, which is rewritten with
+the full ID set only when the export is rewritten or the log outgrows it.
+"""
+import os
+import json
+import hashlib
+from itertools import islice
+
+from extraction_manifest import json_line, read_json_lines, write_json_atomic
+from cold_storage import export_stat, export_fingerprint
+
+SYNC_VERSION = 1
+
+# Sidecars live in this subfolder of the extraction cache, one per export
+SYNC_DIRNAME = 'sync'
+
+# Log lines always allowed before the sidecar is rewritten (else until the log
+# is larger than the sidecar)
+MIN_LOG_LINES = 64
+
+# Sync state replaced by each record() (IDs and blocks accumulate)
+_STATE_KEYS = ('last_index', 'last_timestamp', 'offset', 'fingerprint')
+
+
+def message_id(msg):
+    """
+    Returns a short hash identifying ``msg``: its JSONL ``uuid`` when present,
+    otherwise its role, timestamp and content.
+    """
+    key = msg.uuid or '\x00'.join(
+        str(value or '') for value in (msg.role, msg.timestamp, msg.content))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class OutputSyncIndex:
+    """
+    Sync state of one export file.
+
+        last_index: number of the last ``### Message N`` block written
+        last_timestamp: latest message timestamp written
+        ids: message_id() of every message in the file (add with add(), clear with reset())
+        blocks: block_hash() -> [label of the first copy, its source file], for deduplication
+        offset, fingerprint: file size and tail hash after the last write
+
+    The sidecar is ``sync/<filename>.json``; each later record() appends a
+    line to ``sync/<filename>.log`` with the new state and only the IDs and
+    blocks added since the previous one.
+    """
+
+    def __init__(self, cache_dir, filename):
+        self.path = os.path.join(cache_dir, SYNC_DIRNAME, f"{filename}.json")
+        self.log_path = os.path.join(cache_dir, SYNC_DIRNAME, f"{filename}.log")
+        self.last_index = 0
+        self.last_timestamp = None
+        self.ids = set()
+        self.blocks = {}
+        self.offset = None
+        self.fingerprint = None
+        self._new_ids = []
+        self._saved_blocks = 0
+        self._log_lines = 0
+        self._log_bytes = 0
+        self._rewrite = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # No sidecar: a leftover log has nothing to apply to
+            self._rewrite = True
+            return
+        if data.get('version') != SYNC_VERSION:
+            self._rewrite = True
+            return
+        self._apply(data)
+        self.ids = set(data.get('ids', []))
+        self.blocks = data.get('blocks', {})
+        try:
+            changes, complete = read_json_lines(self.log_path)
+        except OSError:
+            changes, complete = [], True
+        for change in changes:
+            self._apply(change)
+            self.ids.update(change['ids'])
+            self.blocks.update(change['blocks'])
+        self._log_lines = len(changes)
+        self._log_bytes = os.path.getsize(self.log_path) if changes else 0
+        self._saved_blocks = len(self.blocks)
+        # Appending after a torn line would lose what follows it
+        self._rewrite = not complete
+
+    def _apply(self, data):
+        for key in _STATE_KEYS:
+            setattr(self, key, data.get(key, 0 if key == 'last_index' else None))
+
+    def add(self, msg_id):
+        """Records that the message with ``msg_id`` is in the export."""
+        if msg_id not in self.ids:
+            self.ids.add(msg_id)
+            self._new_ids.append(msg_id)
+
+    def reset(self):
+        """Forgets every ID before the export is rewritten; the next record() rewrites the sidecar."""
+        self.ids = set()
+        self._new_ids = []
+        self._rewrite = True
+
+    def matches(self, output_path):
+        """Returns True if ``output_path`` is unchanged since this sidecar was recorded."""
+        if self.offset is None:
+            return False
+        try:
+            if export_stat(output_path).st_size != self.offset:
+                return False
+            return export_fingerprint(output_path, self.offset) == self.fingerprint
+        except OSError:
+            return False
+
+    def record(self, output_path, last_index, last_timestamp):
+        """
+        Stores the state after a write to ``output_path`` (``ids`` and
+        ``blocks`` updated by the caller): a log line with what was added, or
+        a rewritten sidecar once the log grows larger than it.
+        """
+        self.last_index = last_index
+        self.last_timestamp = last_timestamp
+        self.offset = export_stat(output_path).st_size
+        self.fingerprint = export_fingerprint(output_path, self.offset)
+        state = {key: getattr(self, key) for key in _STATE_KEYS}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            outgrown = (self._log_lines >= MIN_LOG_LINES
+                        and self._log_bytes > os.path.getsize(self.path))
+        except OSError:
+            outgrown = True
+        if self._rewrite or outgrown:
+            # Drop the log first, so it is never replayed over a newer sidecar
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            write_json_atomic(self.path, dict(state, version=SYNC_VERSION, ids=sorted(self.ids),
+                                              blocks=self.blocks))
+            self._log_lines, self._log_bytes, self._rewrite = 0, 0, False
+        else:
+            new_blocks = dict(islice(self.blocks.items(), self._saved_blocks, None))
+            line = json_line(dict(state, ids=self._new_ids, blocks=new_blocks))
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._log_lines += 1
+            self._log_bytes += len(line.encode('utf-8'))
+        self._new_ids = []
+        self._saved_blocks = len(self.blocks)
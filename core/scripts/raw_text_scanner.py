@@ -0,0 +1,90 @@
+"""
+Streaming printable-text scanner for the Gemini .pb raw-heuristic fallback.
+
+The fallback used to read the whole file, decode it with errors='ignore' and
+run one regex over the result, holding the file, its decoded copy and every
+candidate string in memory at once. Here the file is read and decoded in
+fixed-size windows with an incremental UTF-8 decoder (which also handles
+multi-byte sequences split across windows). A printable run touching the end
+of a window is carried into the next one, so the output is identical to the
+whole-file scan while memory stays bounded by the window size and the
+longest run.
+"""
+import re
+import codecs
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Same thresholds as the previous whole-file heuristic
+MIN_RUN_LENGTH = 30
+MIN_COMMON_WORDS = 3
+
+_RUN = re.compile(r'[\x20-\x7E\n]{%d,}' % MIN_RUN_LENGTH)
+_PRINTABLE = frozenset('\n' + ''.join(map(chr, range(0x20, 0x7F))))
+
+
+def iter_printable_runs(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields, one list per window, the strings
+    re.findall(r'[\\x20-\\x7E\\n]{30,}', ...) finds in
+    the decoded (errors='ignore') contents of binary file ``f``, reading
+    ``chunk_size`` bytes at a time.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    carry = ''
+    final = False
+    while not final:
+        data = f.read(chunk_size)
+        final = not data
+        text = carry + decoder.decode(data, final)
+        runs = _RUN.findall(text)
+        carry = ''
+        if not final:
+            if runs and text.endswith(runs[-1]):
+                # Runs are maximal, so this one reaches the end of the
+                # window and may continue in the next
+                carry = runs.pop()
+            else:
+                # A tail shorter than MIN_RUN_LENGTH does not match on its
+                # own but may grow into a run in the next window
+                cut = len(text)
+                floor = max(0, cut - MIN_RUN_LENGTH + 1)
+                while cut > floor and text[cut - 1] in _PRINTABLE:
+                    cut -= 1
+                carry = text[cut:]
+        if runs:
+            yield runs
+
+
+def _common_word_pattern(common_words):
+    words = sorted({w.strip() for w in common_words})
+    # The lookahead lets adjacent words share a space, like ' the ' in s does
+    return re.compile(r' (%s)(?= )' % '|'.join(map(re.escape, words)), re.IGNORECASE | re.ASCII)
+
+
+def count_common_words(text, pattern, limit=MIN_COMMON_WORDS):
+    """Counts distinct common words in ``text`` case-insensitively, stopping at ``limit``."""
+    seen = set()
+    for m in pattern.finditer(text):
+        seen.add(m.group(1).lower())
+        if len(seen) >= limit:
+            break
+    return len(seen)
+
+
+def scan_text_segments(path, common_words, min_common=MIN_COMMON_WORDS,
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Returns the stripped printable runs of ``path`` that contain at least
+    ``min_common`` distinct words from ``common_words`` (space-delimited,
+    e.g. ' the ').
+    """
+    pattern = _common_word_pattern(common_words)
+    segments = []
+    with open(path, 'rb') as f:
+        for runs in iter_printable_runs(f, chunk_size):
+            for run in runs:
+                s_clean = run.strip()
+                if ' ' in s_clean and count_common_words(s_clean, pattern, min_common) >= min_common:
+                    segments.append(s_clean)
+    return segments
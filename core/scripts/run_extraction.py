@@ -5,14 +5,29 @@ Usage: python3 core/scripts/run_extraction.py [options]
 """
 import sys
 import os
+import signal
 import argparse
 from datetime import datetime
 
+# history_search.INDEX_FILENAME, checked before that module (and sqlite3) is imported
+SEARCH_INDEX_FILENAME = 'search.db'
+
+def update_search_index(cache_dir, chat_dir, create=False):
+    """
+    Refreshes the search index if one has been built (or builds it with
+    create=True). Returns the update summary, or None when there is no index.
+    """
+    if not create and not os.path.exists(os.path.join(cache_dir, SEARCH_INDEX_FILENAME)):
+        return None
+    from history_search import update_index_if_present
+    return update_index_if_present(cache_dir, chat_dir, create=create)
+
 def main():
     parser = argparse.ArgumentParser(description="Extract Chat History from Local Sources")
     parser.add_argument("--source", choices=['all', 'claude', 'gemini'], default='all', help="Source to extract from")
     parser.add_argument("--limit", type=int, default=None, help="Limit number of samples for testing")
     parser.add_argument("--output-dir", type=str, default=None, help="Override output directory (default: auto-detect from active KG)")
+    parser.add_argument("--root", action="append", default=None, metavar="[LABEL=]PATH", help="Extract the histories under this home directory (.claude/, .gemini/) instead of ~, into exports labelled LABEL (default: the folder name). Repeatable; roots are extracted in parallel, one worker each")
 
     # Date filtering options
     parser.add_argument("--date", type=str, default=None, help="Extract only sessions from specific date (YYYY-MM-DD)")
@@ -21,9 +36,27 @@ def main():
     parser.add_argument("--before", type=str, default=None, help="Extract only sessions on or before this date (YYYY-MM-DD)")
     parser.add_argument("--project", type=str, default=None, help="Filter to sessions from a specific project (path fragment match against ~/.claude/projects/<name>/)")
     parser.add_argument("--incremental", action="store_true", help="Only extract new sessions (skip if file already exists and is current)")
+    parser.add_argument("--rescan", action="store_true", help="Ignore the extraction manifest and re-parse every source file")
+    parser.add_argument("--workers", type=int, default=1, help="Parse source files across N processes (default: 1, 0 = one per CPU)")
+    parser.add_argument("--memory-limit", type=float, default=None, help="MB of parsed sessions to buffer before spilling to disk (default: 256)")
+    parser.add_argument("--stats", nargs="?", const="table", choices=['table', 'json'], default=None, help="Print per-phase timings and counters after the run (default format: table)")
+    parser.add_argument("--shard-mb", type=float, default=None, help="Roll a day's Claude export over into numbered part files at this size, with a per-day index (default: one file per day)")
+    parser.add_argument("--dedup", choices=['drop', 'ref', 'off'], default='off', help="Text a subagent transcript repeats from its session, or a .pb conversation from itself: drop it, write a reference to the first copy, or keep it (default: off)")
+    parser.add_argument("--store", action="store_true", help="Create the SQLite message store (.extraction-cache/messages.db); once it exists every run fills it and renders exports from it")
+    parser.add_argument("--search-index", action="store_true", help="Build the BM25 search index (.extraction-cache/search.db) for history_search.py; once it exists every run updates it")
+    parser.add_argument("--watch", action="store_true", help="Keep running and append new messages as sessions are written (Ctrl+C to stop)")
+    parser.add_argument("--poll", action="store_true", help="With --watch, poll file stats instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls when polling (default: 1.0)")
+    parser.add_argument("--sequential", action="store_true", help="With --source all, extract one source after the other instead of concurrently")
+    parser.add_argument("--profile", type=str, default=None, metavar="FILE", help="Write a cProfile dump of the extraction to FILE (inspect with python3 -m pstats FILE)")
 
     args = parser.parse_args()
 
+    if args.watch and (args.today or args.date or args.after or args.before or args.incremental or args.limit):
+        parser.error("--watch cannot be combined with date filters, --incremental or --limit")
+    if args.watch and args.root:
+        parser.error("--watch follows the current user's home and cannot be combined with --root")
+
     # Handle --today convenience flag
     if args.today:
         args.date = datetime.now().strftime("%Y-%m-%d")
@@ -39,14 +72,39 @@ def main():
         sys.path.append(current_dir)
 
     # Import AFTER setting environment variable
-    from extract_claude import extract_claude_sessions
-    from extract_gemini import extract_all_gemini
-    from chat_extractor_base import get_output_path
+    from chat_extractor_base import (OUTPUT_DIR, get_output_path, get_output_index, save_output_index,
+                                     get_cache_dir, SourceRoot)
+    from extraction_stats import STATS
+    from extraction_plan import SOURCES, run_plan
+
+    roots = []
+    for spec in args.root or []:
+        try:
+            roots.append(SourceRoot.from_spec(spec))
+        except ValueError as e:
+            parser.error(f"--root {spec}: {e}")
+    labels = [root.label for root in roots]
+    if len(set(labels)) < len(labels):
+        parser.error("--root labels must be unique (use LABEL=PATH)")
+    # Fixed merge order, whatever order the roots were given in
+    roots.sort(key=lambda root: root.label)
+    first_root = roots[0] if roots else SourceRoot()
+
+    STATS.reset()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Load the persisted output-path index once; every get_output_path() call shares it
+    with STATS.phase('discovery'):
+        get_output_index(persist=not args.rescan)
 
     # Interactive prompt for --today if file exists (only if running in terminal)
     if args.today and sys.stdin.isatty():
         date_str = args.date
-        filename = f"{date_str}-claude.md" if args.source in ['all', 'claude'] else f"{date_str}-gemini.md"
+        filename = first_root.export_name(date_str, 'claude' if args.source in ['all', 'claude'] else 'gemini')
         output_path = get_output_path(filename)
 
         if os.path.exists(output_path):
@@ -58,12 +116,14 @@ def main():
             response = input("Update with latest session data? [y/N]: ").strip().lower()
 
             if response not in ['y', 'yes']:
+                if profiler:
+                    profiler.disable()
                 print("Extraction cancelled.")
                 return
     elif args.today and not sys.stdin.isatty():
         # Non-interactive mode: just show info and proceed
         date_str = args.date
-        filename = f"{date_str}-claude.md" if args.source in ['all', 'claude'] else f"{date_str}-gemini.md"
+        filename = first_root.export_name(date_str, 'claude' if args.source in ['all', 'claude'] else 'gemini')
         output_path = get_output_path(filename)
         if os.path.exists(output_path):
             file_size = os.path.getsize(output_path)
@@ -71,37 +131,119 @@ def main():
             print(f"Note: Updating existing file: {os.path.basename(output_path)} ({size_kb}K)")
 
     print(f"Starting Extraction... (Source: {args.source}, Limit: {args.limit})")
+    if roots:
+        print(f"Roots: {', '.join(f'{root.label}={root.home}' for root in roots)}")
     print("-" * 40)
     
-    results = []
-
-    if args.source in ['all', 'claude']:
-        print("Processing Claude projects...")
-        claude_res = extract_claude_sessions(
-            date_filter=args.date,
-            after_date=args.after,
-            before_date=args.before,
-            project_filter=args.project,
-            incremental=args.incremental
-        )
-        results.extend(claude_res)
-        
-    if args.source in ['all', 'gemini']:
-        print("Processing Gemini sessions (JSON & Protobuf)...")
-        gemini_res = extract_all_gemini(
-            limit=args.limit,
-            date_filter=args.date,
-            after_date=args.after,
-            before_date=args.before
-        )
-        results.extend(gemini_res)
-
+    # Sources (or roots) run concurrently, one worker process each; the profiler only sees this process
+    sources = list(SOURCES) if args.source == 'all' else [args.source]
+    options = {'date': args.date, 'after': args.after, 'before': args.before, 'project': args.project,
+               'incremental': args.incremental, 'rescan': args.rescan, 'workers': args.workers,
+               'memory_limit': args.memory_limit, 'limit': args.limit, 'dedup': args.dedup,
+               'shard_mb': args.shard_mb, 'store': args.store}
+    results = run_plan(sources, options, concurrent=not args.profile and not args.sequential, roots=roots)
+
+    save_output_index()
+    with STATS.phase('index'):
+        search = update_search_index(get_cache_dir(), OUTPUT_DIR, create=args.search_index)
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
         
     print("-" * 40)
     print("Extraction Complete.")
     print(f"Total sessions processed: {len(results)}")
     for res in results:
         print(f"- {res}")
+    if search and search['files_changed']:
+        print(f"Search index: {search['files_changed']} files updated "
+              f"(+{search['docs_added']}/-{search['docs_removed']} blocks)")
+
+    if args.watch:
+        from message_store import open_store
+        message_store = open_store(get_cache_dir())
+        watch(args, message_store, first_root)
+        if message_store is not None:
+            message_store.close()
+
+    if args.profile:
+        print(f"Profile written to {args.profile}")
+    if args.stats:
+        print("-" * 40)
+        print(STATS.format_json() if args.stats == 'json' else STATS.format_table())
+
+def watch(args, message_store=None, root=None):
+    """
+    Follows the source directories of ``root`` (default: the current user's
+    home) after the initial extraction and extracts changed files as they are
+    written: Claude JSONL files are tailed from their manifest offset and only
+    new message blocks are appended; changed Gemini sessions re-render the
+    days they can touch. Runs until Ctrl+C.
+    """
+    from extract_claude import extract_claude_files
+    from extract_gemini import extract_all_gemini, gemini_session_date
+    from chat_extractor_base import OUTPUT_DIR, get_cache_dir, save_output_index, SourceRoot
+    from extraction_manifest import ExtractionManifest
+    from file_watcher import create_watcher
+
+    root = root or SourceRoot()
+    watched, suffixes = [], []
+    if args.source in ['all', 'claude']:
+        watched.append(root.claude_projects_dir)
+        suffixes.append('.jsonl')
+    if args.source in ['all', 'gemini']:
+        watched += [root.gemini_tmp_dir, root.gemini_conv_dir]
+        suffixes += ['.json', '.pb']
+    watcher = create_watcher(watched, suffixes, args.poll_interval, polling=args.poll)
+    manifest = ExtractionManifest(get_cache_dir(), root.key('claude'))
+    project = args.project.lower() if args.project else None
+    # Stop cleanly (saving the output index) when a hook or service manager terminates us
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    def _gemini_dates(paths):
+        dates = set()
+        for path in paths:
+            try:
+                dates.add(gemini_session_date(path))
+            except (OSError, ValueError) as e:
+                # Usually a session file caught mid-write; its next write retriggers
+                print(f"Skipping {path} for now: {e}")
+        return dates
+
+    def _in_project(path, fragment):
+        return not fragment or fragment in os.path.relpath(path, root.claude_projects_dir).split(os.sep)[0].lower()
+
+    print(f"Watching {', '.join(watched)} for new messages (Ctrl+C to stop)...", flush=True)
+    try:
+        while True:
+            changed = watcher.wait()
+            if changed is None:
+                # Events were lost: treat every file under the watched folders as changed
+                changed = {os.path.join(d, n) for top in watched for d, _, names in os.walk(top)
+                           for n in names if n.endswith(tuple(suffixes))}
+            claude_files = sorted(p for p in changed if p.endswith('.jsonl') and _in_project(p, project))
+            gemini_files = [p for p in changed if os.path.exists(p) and
+                            (p.endswith('.pb') or os.path.basename(p).startswith('session-'))]
+
+            results = extract_claude_files(claude_files, manifest, message_store, args.dedup,
+                                           args.shard_mb, root) if claude_files else []
+            # Gemini day files are merged from every session of the day: re-render affected days
+            for date in sorted(_gemini_dates(gemini_files)):
+                results += extract_all_gemini(date_filter=date, message_store=message_store, dedup=args.dedup,
+                                              root=root)
+            save_output_index()
+            if results:
+                update_search_index(get_cache_dir(), OUTPUT_DIR)
+            stamp = datetime.now().strftime("%H:%M:%S")
+            for res in results:
+                if not res.startswith("No new activity"):
+                    print(f"[{stamp}] {res}", flush=True)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.close()
+        save_output_index()
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,17 @@
-"""MkDocs build hook: copies core/ files into docs/ with link transformation."""
+"""MkDocs build hook: copies core/ files into docs/ with link transformation.
+
+The copy is incremental. A manifest of source content hashes (kept in
+.cache/, outside docs/, so writing it does not retrigger `mkdocs serve`)
+records what each copied file was made from. Only new or changed sources
+are copied and transformed, files whose source is gone are removed, and the
+changed files are transformed in parallel.
+"""
 import shutil
 import os
 import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 COPY_MAP = [
     ('core/docs', 'reference'),
@@ -9,46 +19,127 @@ COPY_MAP = [
     ('core/templates', 'templates'),
 ]
 
+# Bump when _transform_links changes so every file is transformed again
+MANIFEST_VERSION = 1
+MANIFEST_PATH = os.path.join('.cache', 'docs-sync.json')
+
+# Paths that go up to the repo root then into docs/, e.g. ../../docs/FILE.md
+_DOCS_LINK = re.compile(r'\((\.\./)+docs/([^)]+)\)')
+# ../../README.md
+_README_LINK = re.compile(r'\((\.\./)+README\.md\)')
+
 
 def on_pre_build(config):
-    """Copy files from core/ to docs/ and transform back-links."""
+    """Copy new and changed files from core/ to docs/, transform back-links, remove stale copies."""
     docs_dir = config['docs_dir']
     root_dir = os.path.dirname(docs_dir)
+    manifest_path = os.path.join(root_dir, MANIFEST_PATH)
+    old = _load_manifest(manifest_path)
+    if old is None:
+        # Unknown state (first build or older hook): start from empty destinations
+        for _, dst_name in COPY_MAP:
+            shutil.rmtree(os.path.join(docs_dir, dst_name), ignore_errors=True)
+        old = {}
+
+    files, jobs = {}, []
+    for dst_rel, src in _source_files(root_dir):
+        dst = os.path.join(docs_dir, dst_rel)
+        prev = old.get(dst_rel, {})
+        src_stat = _stat_key(src)
+        digest = prev['hash'] if prev.get('src_stat') == src_stat else _file_hash(src)
+        entry = {'src_stat': src_stat, 'hash': digest}
+        if prev.get('hash') == digest and prev.get('dst_stat') == _stat_key(dst):
+            entry['dst_stat'] = prev['dst_stat']
+        else:
+            jobs.append((src, dst, dst_rel))
+        files[dst_rel] = entry
+
+    removed = _remove_stale(docs_dir, files)
+    with ThreadPoolExecutor() as pool:
+        for dst_rel, dst_stat in pool.map(_sync_file, jobs):
+            files[dst_rel]['dst_stat'] = dst_stat
+
+    if jobs or removed or files != old:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != MANIFEST_VERSION:
+        return None
+    return data.get('files', {})
+
+
+def _source_files(root_dir):
+    """Yields (destination path relative to docs/, source path) for every file under COPY_MAP."""
     for src_rel, dst_name in COPY_MAP:
-        src = os.path.join(root_dir, src_rel)
-        dst = os.path.join(docs_dir, dst_name)
-        if os.path.exists(dst):
-            shutil.rmtree(dst)
-        if os.path.exists(src):
-            shutil.copytree(src, dst)
-            _transform_links(dst, dst_name)
-
-
-def _transform_links(directory, dest_name):
-    """Fix back-links in copied files for MkDocs context."""
-    for root, dirs, files in os.walk(directory):
-        for fname in files:
-            if not fname.endswith('.md'):
-                continue
-            fpath = os.path.join(root, fname)
-            # Calculate depth: reference/FILE.md = depth 0, examples/sub/FILE.md = depth 1
-            rel = os.path.relpath(fpath, directory)
-            depth = rel.count(os.sep)
-            prefix = '../' * (depth + 1)  # +1 to go from dest dir up to docs root
-            with open(fpath, 'r') as f:
-                content = f.read()
-            # Transform ../../docs/FILE.md and similar patterns
-            # Replace paths that go up to repo root then into docs/
-            content = re.sub(
-                r'\((\.\./)+docs/([^)]+)\)',
-                lambda m: f'({prefix}{m.group(2)})',
-                content
-            )
-            # Transform ../../README.md → {prefix}index.md
-            content = re.sub(
-                r'\((\.\./)+README\.md\)',
-                f'({prefix}index.md)',
-                content
-            )
-            with open(fpath, 'w') as f:
-                f.write(content)
+        src_dir = os.path.join(root_dir, src_rel)
+        for root, dirs, names in os.walk(src_dir):
+            dirs.sort()
+            for name in sorted(names):
+                src = os.path.join(root, name)
+                rel = os.path.relpath(src, src_dir).replace(os.sep, '/')
+                yield f'{dst_name}/{rel}', src
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _remove_stale(docs_dir, files):
+    """Removes files under the destination folders that no source maps to; returns how many."""
+    removed = 0
+    for _, dst_name in COPY_MAP:
+        dst_dir = os.path.join(docs_dir, dst_name)
+        for root, dirs, names in os.walk(dst_dir, topdown=False):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.relpath(path, docs_dir).replace(os.sep, '/') not in files:
+                    os.remove(path)
+                    removed += 1
+            if root != dst_dir and not os.listdir(root):
+                os.rmdir(root)
+    return removed
+
+
+def _sync_file(job):
+    """Copies one source file, transforming links in Markdown; returns (dst_rel, dst stat key)."""
+    src, dst, dst_rel = job
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if dst_rel.endswith('.md'):
+        # reference/FILE.md = depth 0, examples/sub/FILE.md = depth 1;
+        # +1 to go from dest dir up to docs root
+        prefix = '../' * dst_rel.count('/')
+        with open(src, 'r', encoding='utf-8') as f:
+            content = f.read()
+        with open(dst, 'w', encoding='utf-8') as f:
+            f.write(_transform_links(content, prefix))
+    else:
+        shutil.copy2(src, dst)
+    return dst_rel, _stat_key(dst)
+
+
+def _transform_links(content, prefix):
+    """Fix back-links in a copied file for MkDocs context."""
+    # Transform ../../docs/FILE.md and similar patterns
+    # Replace paths that go up to repo root then into docs/
+    content = _DOCS_LINK.sub(lambda m: f'({prefix}{m.group(2)})', content)
+    # Transform ../../README.md → {prefix}index.md
+    return _README_LINK.sub(f'({prefix}index.md)', content)
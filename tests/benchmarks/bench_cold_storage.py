@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+bench_cold_storage.py — Disk use and read cost of cold-storage archives
+
+Writes --days daily exports (as bench_history_search.py does), then compares
+the loose YYYY-MM/ folders with the same months packed by cold_storage.py:
+  disk         bytes and allocated blocks of the chat-history tree
+  walk         building the output-path index from scratch (one listing per
+               directory), as every get_output_path() run without a cache does
+  read         parse_metadata_from_file() on --samples random days
+  compact      packing every completed month; thaw restores one month
+and checks that every archived file reads back byte for byte.
+
+Usage:
+  python3 tests/benchmarks/bench_cold_storage.py [--days 730] [--messages 150]
+                                                 [--codec zstd|gzip] [--json]
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from synthetic_corpus import write_daily_exports
+from bench_history_search import WORDS
+from output_path_index import OutputPathIndex
+from extract_claude import parse_metadata_from_file
+import cold_storage
+
+
+def disk_usage(root):
+    size = blocks = entries = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        entries += len(dirnames) + len(filenames)
+        for name in filenames:
+            st = os.stat(os.path.join(dirpath, name))
+            size += st.st_size
+            blocks += st.st_blocks * 512
+    return {"mb": round(size / 1048576, 2), "allocated_mb": round(blocks / 1048576, 2), "entries": entries}
+
+
+def time_walk(root, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        index = OutputPathIndex(root)
+        index.lookup("0000-00-00-claude.md")
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def time_reads(paths):
+    samples = []
+    for path in paths:
+        start = time.perf_counter()
+        parse_metadata_from_file(path)
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-storage archives against loose month folders")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--messages", type=int, default=150, help="Messages per daily export")
+    parser.add_argument("--codec", choices=sorted(cold_storage.CODEC_EXTENSIONS), default=None,
+                        help="Compression (default: zstd if installed, else gzip)")
+    parser.add_argument("--samples", type=int, default=50, help="Days read for the read latency")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    codec = args.codec or cold_storage.default_codec()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_daily_exports(root, args.days, args.messages, WORDS + [f"term{i}" for i in range(5000)])
+        originals = {p: open(p, "rb").read() for p in paths}
+        sample = random.Random(3).sample(paths, min(args.samples, len(paths)))
+        loose = {"disk": disk_usage(root), "walk_ms": time_walk(root), "read_ms": time_reads(sample)}
+
+        months = sorted({os.path.basename(os.path.dirname(p)) for p in paths})
+        start = time.perf_counter()
+        for month in months:
+            cold_storage.compact_month(root, month, codec)
+        compact_seconds = time.perf_counter() - start
+        cold = {"disk": disk_usage(root), "walk_ms": time_walk(root), "read_ms": time_reads(sample)}
+
+        index = OutputPathIndex(root)
+        mismatched = 0
+        for path, data in originals.items():
+            if index.lookup(os.path.basename(path)) != path:
+                mismatched += 1
+                continue
+            with cold_storage.open_export(path, "rb") as f:
+                mismatched += f.read() != data
+
+        start = time.perf_counter()
+        cold_storage.thaw_month(root, months[0])
+        thaw_seconds = time.perf_counter() - start
+        shutil.rmtree(os.path.join(root, months[0]))
+
+    results = {"days": args.days, "messages": args.messages, "codec": codec, "months": len(months),
+               "loose": loose, "cold": cold, "compact_seconds": round(compact_seconds, 2),
+               "thaw_month_seconds": round(thaw_seconds, 3), "mismatched": mismatched}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Cold storage: {args.days} days x {args.messages} messages, {len(months)} months, {codec}")
+    print(f"{'':<8} {'MB':>9} {'on disk':>9} {'entries':>8} {'walk ms':>9} {'read ms':>9}")
+    for label, r in (("loose", loose), ("cold", cold)):
+        print(f"{label:<8} {r['disk']['mb']:>9.2f} {r['disk']['allocated_mb']:>9.2f} {r['disk']['entries']:>8,} "
+              f"{r['walk_ms']:>9.2f} {r['read_ms']:>9.3f}")
+    print(f"compact {results['compact_seconds']:.2f}s, thaw one month {results['thaw_month_seconds']:.3f}s, "
+          f"{'all files read back identical' if not mismatched else f'{mismatched} files DIFFER'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+bench_concurrent_sources.py — Wall time of --source all, concurrent vs sequential
+
+Generates a corpus with Claude sessions and Gemini JSON/.pb conversations
+sized so both sources take comparable time, then runs run_extraction.py:
+  claude       --source claude
+  gemini       --source gemini
+  sequential   --source all --sequential (one source after the other)
+  concurrent   --source all (one worker process per source)
+Each run is a separate process with a fresh output directory. With at least
+two CPUs the concurrent run should take close to the slower single source.
+
+Usage:
+  python3 tests/benchmarks/bench_concurrent_sources.py [--projects 4] [--sessions 20] [--messages 200]
+                                                       [--gemini-json 400] [--gemini-pb 200] [--repeat 3] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION, generate_corpus
+
+VARIANTS = {
+    "claude": ["--source", "claude"],
+    "gemini": ["--source", "gemini"],
+    "sequential": ["--source", "all", "--sequential"],
+    "concurrent": ["--source", "all"],
+}
+
+
+def run_variant(home, work_dir, name, repeat):
+    samples = []
+    for i in range(repeat):
+        output_dir = os.path.join(work_dir, f"out-{name}-{i}")
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, RUN_EXTRACTION, "--output-dir", output_dir] + VARIANTS[name],
+                              env=dict(os.environ, HOME=home), capture_output=True, text=True)
+        samples.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent extraction of all sources")
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=20, help="Claude sessions per project")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per Claude session")
+    parser.add_argument("--gemini-json", type=int, default=400, help="Gemini JSON sessions")
+    parser.add_argument("--gemini-pb", type=int, default=200, help="Gemini .pb conversations")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (median reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        home = os.path.join(work_dir, "home")
+        generate_corpus(home, args.projects, args.sessions, args.messages,
+                        gemini_json=args.gemini_json, gemini_pb=args.gemini_pb)
+        seconds = {name: run_variant(home, work_dir, name, args.repeat) for name in VARIANTS}
+
+    slowest = max(seconds["claude"], seconds["gemini"])
+    results = {"cpus": os.cpu_count(), "seconds": seconds,
+               "concurrent_vs_slowest_source": round(seconds["concurrent"] / slowest, 2),
+               "speedup_vs_sequential": round(seconds["sequential"] / seconds["concurrent"], 2)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"--source all on {results['cpus']} CPUs (median of {args.repeat} runs)")
+    for name, value in seconds.items():
+        print(f"{name:<11} {value:>8.3f}s")
+    print(f"concurrent = {results['concurrent_vs_slowest_source']:.2f}x the slower source, "
+          f"{results['speedup_vs_sequential']:.2f}x faster than sequential")
+
+
+if __name__ == "__main__":
+    main()
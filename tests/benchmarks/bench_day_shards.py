@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_day_shards.py — One heavy day, with and without --shard-mb
+
+Generates a Claude corpus whose sessions all fall on one day, then for each
+variant (unsharded, --shard-mb N) runs run_extraction.py:
+  initial      first extraction of the day (one process)
+  append       extraction after a new session is added to the day
+It reports both run times plus, for a reader after the append:
+  largest      size of the largest file making up the day
+  latest read  bytes and time to load the newest messages: the whole
+               export, or the index plus the last part
+Each run is a separate process with a fresh output directory.
+
+Usage:
+  python3 tests/benchmarks/bench_day_shards.py [--sessions 40] [--messages 200] [--shard-mb 2] [--json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION, generate_corpus
+
+
+def run(home, output_dir, extra):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, RUN_EXTRACTION, "--source", "claude", "--output-dir", output_dir] + extra,
+                          env=dict(os.environ, HOME=home), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"run_extraction.py {' '.join(extra)} failed:\n{proc.stderr}")
+    return round(time.perf_counter() - start, 3)
+
+
+def day_files(output_dir):
+    for dirpath, dirnames, filenames in os.walk(output_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            if name.endswith(".md") or name.endswith(".index.json"):
+                yield os.path.join(dirpath, name)
+
+
+def read_latest(output_dir):
+    """Bytes and seconds to load the newest messages of the day, as a reader would."""
+    files = {os.path.basename(p): p for p in day_files(output_dir)}
+    index_name = next((n for n in files if n.endswith(".index.json")), None)
+    start = time.perf_counter()
+    if index_name:
+        with open(files[index_name], "rb") as f:
+            data = f.read()
+        paths = [files[json.loads(data)["parts"][-1]["file"]]]
+        size = len(data)
+    else:
+        paths = [p for n, p in files.items() if n.endswith("-claude.md")]
+        size = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            size += len(f.read())
+    return size, round((time.perf_counter() - start) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharding a heavy day into part files")
+    parser.add_argument("--sessions", type=int, default=40, help="Sessions on the day")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per session")
+    parser.add_argument("--shard-mb", type=float, default=2.0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    variants = {"unsharded": [], f"shard-{args.shard_mb:g}mb": ["--shard-mb", str(args.shard_mb)]}
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        base_home = os.path.join(work_dir, "home")
+        generate_corpus(base_home, projects=1, sessions=args.sessions, messages=args.messages,
+                        subagents=0, gemini_json=0, gemini_pb=0, days=1)
+        extra_home = os.path.join(work_dir, "extra")
+        generate_corpus(extra_home, projects=1, sessions=1, messages=args.messages,
+                        subagents=0, gemini_json=0, gemini_pb=0, days=1, seed=1)
+        extra_session = next(os.path.join(d, n) for d, _, names in
+                             os.walk(os.path.join(extra_home, ".claude")) for n in names)
+
+        for name, extra in variants.items():
+            home = os.path.join(work_dir, f"home-{name}")
+            shutil.copytree(base_home, home)
+            output_dir = os.path.join(work_dir, f"out-{name}")
+            initial = run(home, output_dir, extra)
+            project_dir = os.path.join(home, ".claude", "projects", os.listdir(os.path.join(home, ".claude", "projects"))[0])
+            shutil.copy(extra_session, os.path.join(project_dir, "appended-session.jsonl"))
+            append = run(home, output_dir, extra)
+            sizes = [os.path.getsize(p) for p in day_files(output_dir) if p.endswith(".md")]
+            latest_bytes, latest_ms = read_latest(output_dir)
+            results[name] = {"initial_seconds": initial, "append_seconds": append, "files": len(sizes),
+                             "largest_mb": round(max(sizes) / (1024 * 1024), 2),
+                             "latest_read_mb": round(latest_bytes / (1024 * 1024), 2), "latest_read_ms": latest_ms}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'variant':<14} {'initial':>9} {'append':>9} {'files':>6} {'largest':>10} {'latest read':>18}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['initial_seconds']:>8.2f}s {r['append_seconds']:>8.2f}s {r['files']:>6} "
+              f"{r['largest_mb']:>7.2f} MB {r['latest_read_mb']:>7.2f} MB {r['latest_read_ms']:>6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
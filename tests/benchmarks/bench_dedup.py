@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+bench_dedup.py — Output size and render time of the --dedup modes
+
+Generates a corpus whose subagent transcripts repeat --overlap of their turns
+from the parent session (as real Claude Code subagents do), spread over few
+days so each day is heavy, then runs run_extraction.py once per mode:
+  off    every message written in full (previous behaviour)
+  ref    repeats written as a reference to the first copy
+  drop   repeats left out
+Each run is a separate process with its own output directory; render time is
+taken from --stats json.
+
+Usage:
+  python3 tests/benchmarks/bench_dedup.py [--projects 4] [--sessions 20] [--messages 200]
+                                           [--overlap 0.6] [--days 2] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION, generate_corpus
+MODES = ("off", "ref", "drop")
+
+
+def output_bytes(output_dir):
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(output_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        total += sum(os.path.getsize(os.path.join(dirpath, n)) for n in filenames if n.endswith(".md"))
+    return total
+
+
+def run_mode(home, work_dir, mode):
+    output_dir = os.path.join(work_dir, f"out-{mode}")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, RUN_EXTRACTION, "--source", "claude", "--output-dir", output_dir,
+                           "--dedup", mode, "--stats", "json"],
+                          env=dict(os.environ, HOME=home), capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"--dedup {mode} failed:\n{proc.stderr}")
+    stats = json.loads(proc.stdout[proc.stdout.index("\n{") + 1:])
+    return {"seconds": round(seconds, 2), "render_seconds": stats["phases"]["render"],
+            "messages_written": stats["counters"]["messages_written"],
+            "messages_deduped": stats["counters"]["messages_deduped"],
+            "output_mb": round(output_bytes(output_dir) / (1024 * 1024), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the --dedup modes on a corpus with repeated subagent text")
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions per project")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per session")
+    parser.add_argument("--subagents", type=int, default=3, help="Subagent transcripts per session")
+    parser.add_argument("--overlap", type=float, default=0.6, help="Share of subagent turns repeating parent text")
+    parser.add_argument("--days", type=int, default=2, help="Days the sessions are spread over")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        home = os.path.join(work_dir, "home")
+        corpus = generate_corpus(home, args.projects, args.sessions, args.messages, args.subagents,
+                                 gemini_json=0, gemini_pb=0, days=args.days, subagent_overlap=args.overlap)
+        results = {"claude_messages": corpus["claude_messages"], "modes": {}}
+        for mode in MODES:
+            results["modes"][mode] = run_mode(home, work_dir, mode)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    base = results["modes"]["off"]
+    print(f"--dedup: {results['claude_messages']:,} Claude messages over {args.days} days, "
+          f"subagent overlap {args.overlap:.0%}")
+    print(f"{'mode':<6} {'output MB':>10} {'vs off':>7} {'render s':>9} {'total s':>8} {'repeats':>8}")
+    for mode, r in results["modes"].items():
+        print(f"{mode:<6} {r['output_mb']:>10.2f} {r['output_mb'] / base['output_mb']:>6.0%} "
+              f"{r['render_seconds']:>9.3f} {r['seconds']:>8.2f} {r['messages_deduped']:>8,}")
+
+
+if __name__ == "__main__":
+    main()
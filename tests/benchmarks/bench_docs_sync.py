@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+bench_docs_sync.py — MkDocs pre-build copy of core/ into docs/ (docs/hooks.py)
+
+Generates a core/docs, core/examples and core/templates tree of Markdown
+files with back-links in a temporary root, then times on_pre_build():
+  full         no manifest: destinations cleared and everything copied and
+               transformed (what every build did before the manifest)
+  no change    a rebuild with nothing changed (mkdocs serve reloads)
+  one edit     one source file changed
+  one delete   one source file removed
+Times are the best of --repeat runs; files written is per run.
+
+Usage:
+  python3 tests/benchmarks/bench_docs_sync.py [--files 2000] [--kb 8] [--repeat 5] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+from synthetic_corpus import REPO_ROOT, sentence
+
+# docs/hooks.py is the MkDocs hook module, not on the scripts path
+sys.path.insert(0, os.path.join(REPO_ROOT, "docs"))
+import hooks  # noqa: E402
+
+WORDS = "knowledge graph lesson session decision memory pattern template capture".split()
+
+
+def generate_tree(root, files, kb, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        src_rel = hooks.COPY_MAP[i % len(hooks.COPY_MAP)][0]
+        path = os.path.join(root, src_rel, f"section-{i % 20:02d}", f"page-{i:05d}.md")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lines = [f"# Page {i}\n", "See [the FAQ](../../../docs/FAQ.md) and [home](../../../README.md).\n"]
+        while sum(len(line) for line in lines) < kb * 1024:
+            lines.append(sentence(rng, 14, WORDS) + "\n")
+        with open(path, "w") as f:
+            f.writelines(lines)
+        paths.append(path)
+    return paths
+
+
+def count_writes():
+    """Wraps hooks._sync_file to count the files each run writes; returns the counter."""
+    counter = [0]
+    sync_file = hooks._sync_file
+
+    def counting(job):
+        counter[0] += 1
+        return sync_file(job)
+    hooks._sync_file = counting
+    return counter
+
+
+def timed(config, prepare, repeat, counter):
+    best, written = None, 0
+    for _ in range(repeat):
+        prepare()
+        counter[0] = 0
+        start = time.perf_counter()
+        hooks.on_pre_build(config)
+        elapsed = time.perf_counter() - start
+        written = counter[0]
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2), written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incremental docs/ pre-build copy")
+    parser.add_argument("--files", type=int, default=2000, help="Markdown files under core/")
+    parser.add_argument("--kb", type=int, default=8, help="Approximate size of each file")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    counter = count_writes()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = generate_tree(root, args.files, args.kb)
+        docs_dir = os.path.join(root, "docs")
+        os.makedirs(docs_dir)
+        config = {"docs_dir": docs_dir}
+        manifest = os.path.join(root, hooks.MANIFEST_PATH)
+        edited, deleted = paths[len(paths) // 2], paths[-1]
+        with open(deleted) as f:
+            deleted_text = f.read()
+
+        def drop_manifest():
+            if os.path.exists(manifest):
+                os.remove(manifest)
+
+        def edit():
+            with open(edited, "a") as f:
+                f.write("Edited.\n")
+
+        def delete():
+            # Restore and sync first so each run deletes the file again
+            with open(deleted, "w") as f:
+                f.write(deleted_text)
+            hooks.on_pre_build(config)
+            os.remove(deleted)
+
+        results = {"files": args.files, "source_mb": round(args.files * args.kb / 1024, 1)}
+        for name, prepare in (("full", drop_manifest), ("no_change", lambda: None),
+                              ("one_edit", edit), ("one_delete", delete)):
+            ms, written = timed(config, prepare, args.repeat, counter)
+            results[name] = {"ms": ms, "files_written": written}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['files']} files, {results['source_mb']} MB")
+    print(f"{'run':<11} {'time':>10} {'written':>8}")
+    for name in ("full", "no_change", "one_edit", "one_delete"):
+        r = results[name]
+        print(f"{name:<11} {r['ms']:>8.1f}ms {r['files_written']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+bench_gemini_pb.py — Throughput benchmark for Gemini .pb conversation decoding
+
+Compares the previous path (schema-less blackboxprotobuf decode + recursive
+find_content_strings) with the current one (extract_pb_text: cached typedef +
+wire-level text scan) on synthetic conversations, and reports how many
+files produce identical text segments. The walker comparison runs without
+blackboxprotobuf; the decode comparison is skipped if it is not installed.
+
+Usage:
+  python3 tests/benchmarks/bench_gemini_pb.py [--files N] [--turns T] [--json]
+"""
+import json
+import time
+import random
+import argparse
+
+from synthetic_corpus import make_conversation
+from gemini_pb_decoder import TypedefCache, extract_pb_text, iter_text_fields
+
+try:
+    import blackboxprotobuf
+except ImportError:
+    blackboxprotobuf = None
+
+# ── Previous implementation (reference) ──────────────────────────────────────
+
+def find_content_strings(obj):
+    found_text = []
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            found_text.extend(find_content_strings(v))
+    elif isinstance(obj, list):
+        for item in obj:
+            found_text.extend(find_content_strings(item))
+    elif isinstance(obj, (str, bytes)):
+        if isinstance(obj, bytes):
+            try:
+                val = obj.decode('utf-8')
+                if len(val) > 20 and ' ' in val:
+                    found_text.append(val)
+            except Exception:
+                pass
+        elif isinstance(obj, str):
+            if len(obj) > 20 and ' ' in obj:
+                found_text.append(obj)
+    return found_text
+
+
+def _nested(depth, fanout=3):
+    node = "leaf text segment with several words in it"
+    for _ in range(depth):
+        node = {str(i): (node if i == 0 else f"sibling value {i} with some words") for i in range(fanout)}
+    return node
+
+
+def bench_walker():
+    tree = [_nested(60) for _ in range(300)]
+    start = time.perf_counter()
+    ref = find_content_strings(tree)
+    recursive_s = time.perf_counter() - start
+    start = time.perf_counter()
+    new = list(iter_text_fields(tree))
+    iterative_s = time.perf_counter() - start
+
+    deep = _nested(5000, fanout=1)
+    try:
+        find_content_strings(deep)
+        deep_recursive = "ok"
+    except RecursionError:
+        deep_recursive = "RecursionError"
+    deep_iterative = f"ok ({len(list(iter_text_fields(deep)))} segments, depth capped)"
+    return {
+        "segments": len(ref),
+        "identical": ref == new,
+        "recursive_seconds": round(recursive_s, 4),
+        "iterative_seconds": round(iterative_s, 4),
+        "depth_5000_recursive": deep_recursive,
+        "depth_5000_iterative": deep_iterative,
+    }
+
+
+def bench_decode(n_files, n_turns):
+    rng = random.Random(11)
+    blobs = [make_conversation(rng, n_turns) for _ in range(n_files)]
+    total_mb = sum(len(b) for b in blobs) / (1024 * 1024)
+
+    start = time.perf_counter()
+    ref = [find_content_strings(blackboxprotobuf.decode_message(b)[0]) for b in blobs]
+    baseline_s = time.perf_counter() - start
+
+    cache = TypedefCache()
+    start = time.perf_counter()
+    new = [extract_pb_text(blackboxprotobuf, b, cache) for b in blobs]
+    cached_s = time.perf_counter() - start
+
+    return {
+        "files": n_files,
+        "size_mb": round(total_mb, 2),
+        "baseline_seconds": round(baseline_s, 4),
+        "cached_seconds": round(cached_s, 4),
+        "baseline_mb_per_sec": round(total_mb / baseline_s, 2),
+        "cached_mb_per_sec": round(total_mb / cached_s, 2),
+        "identical_files": sum(1 for a, b in zip(ref, new) if a == b),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini .pb decode benchmark")
+    parser.add_argument("--files", type=int, default=40, help="Synthetic conversations to decode")
+    parser.add_argument("--turns", type=int, default=200, help="Turns per conversation")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {"walker": bench_walker()}
+    if blackboxprotobuf is not None:
+        results["decode"] = bench_decode(args.files, args.turns)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    w = results["walker"]
+    print(f"Text walker: {w['segments']} segments, identical={w['identical']}")
+    print(f"  recursive {w['recursive_seconds']:.4f}s   iterative {w['iterative_seconds']:.4f}s")
+    print(f"  depth 5000: recursive={w['depth_5000_recursive']}  iterative={w['depth_5000_iterative']}")
+    if "decode" not in results:
+        print("Decode: skipped (blackboxprotobuf not installed)")
+        return
+    d = results["decode"]
+    print(f"Decode: {d['files']} files, {d['size_mb']} MB, identical segments in {d['identical_files']}/{d['files']}")
+    print(f"  schema-less + recursive  {d['baseline_seconds']:.3f}s  {d['baseline_mb_per_sec']:.2f} MB/s")
+    print(f"  cached typedef scan      {d['cached_seconds']:.3f}s  {d['cached_mb_per_sec']:.2f} MB/s  "
+          f"({d['baseline_seconds'] / d['cached_seconds']:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
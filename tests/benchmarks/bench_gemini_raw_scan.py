@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+bench_gemini_raw_scan.py — Benchmark for the Gemini .pb raw-heuristic fallback
+
+Generates a synthetic binary blob (protobuf-like noise, invalid UTF-8 and
+English text runs) and compares:
+  baseline   previous path: read the whole file, decode with errors='ignore',
+             re.findall for printable runs, common words counted per run
+  streaming  scan_text_segments(): chunked reads + incremental decode,
+             common words counted in one regex pass with early exit
+Each variant runs in its own process so peak RSS is reported separately.
+
+Usage:
+  python3 tests/benchmarks/bench_gemini_raw_scan.py [--size-mb N] [--repeat R] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from synthetic_corpus import write_binary_blob
+
+COMMON_WORDS = {' the ', ' you ', ' and ', ' that ', ' have ', ' for ', ' not ', ' with ', ' this ', ' from '}
+
+def baseline_scan(path):
+    """The previous fallback loop."""
+    with open(path, 'rb') as f:
+        raw_data = f.read()
+    text_content = raw_data.decode('utf-8', errors='ignore')
+    clean_strings = []
+    for s in re.findall(r'[\x20-\x7E\n]{30,}', text_content):
+        s_clean = s.strip()
+        if ' ' in s_clean:
+            lower_s = s_clean.lower()
+            if sum(1 for word in COMMON_WORDS if word in lower_s) >= 3:
+                clean_strings.append(s_clean)
+    return clean_strings
+
+
+def streaming_scan(path):
+    from raw_text_scanner import scan_text_segments
+    return scan_text_segments(path, COMMON_WORDS)
+
+
+def run_variant(name, path, repeat):
+    """Child process entry point: prints best seconds, peak RSS and a digest of the output."""
+    func = baseline_scan if name == "baseline" else streaming_scan
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        segments = func(path)
+        seconds = min(seconds, time.perf_counter() - start)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_kb / 1024,
+                      "segments": len(segments), "digest": hash(tuple(segments))}))
+
+
+def measure(name, path, repeat):
+    out = subprocess.run([sys.executable, "-c",
+                          "import sys; sys.path.insert(0, %r); import bench_gemini_raw_scan as b; "
+                          "b.run_variant(%r, %r, %d)" % (os.path.dirname(os.path.abspath(__file__)), name, path, repeat)],
+                         check=True, capture_output=True, text=True,
+                         env=dict(os.environ, PYTHONHASHSEED="0"))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini raw-heuristic fallback benchmark")
+    parser.add_argument("--size-mb", type=float, default=64, help="Synthetic blob size in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversation.pb")
+        write_binary_blob(path, args.size_mb)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        variants = {name: measure(name, path, args.repeat) for name in ("baseline", "streaming")}
+
+    results = {
+        "size_mb": round(size_mb, 2),
+        "identical": variants["baseline"]["digest"] == variants["streaming"]["digest"],
+        "variants": {name: {"seconds": round(v["seconds"], 4),
+                            "mb_per_sec": round(size_mb / v["seconds"], 2),
+                            "peak_rss_mb": round(v["peak_rss_mb"], 1),
+                            "segments": v["segments"]}
+                     for name, v in variants.items()},
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    base = results["variants"]["baseline"]["seconds"]
+    print(f"Gemini raw fallback: {size_mb:.1f} MB, identical output={results['identical']}")
+    print(f"{'variant':<10} {'seconds':>9} {'MB/s':>8} {'peak RSS MB':>12} {'segments':>9} {'speedup':>8}")
+    for name, r in results["variants"].items():
+        print(f"{name:<10} {r['seconds']:>9.4f} {r['mb_per_sec']:>8.2f} {r['peak_rss_mb']:>12.1f} "
+              f"{r['segments']:>9} {base / r['seconds']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+bench_history_search.py — Benchmark for history_search.py over generated chat history
+
+Writes --days daily exports of --messages messages each, then measures:
+  build        indexing every export into a fresh search.db
+  noop         update() with nothing changed (stat of every export)
+  append       update() after --append-days exports each gain one block
+  query        BM25 queries against the index (median / p95 / max ms)
+  scan         the same queries as a linear scan of every export, the way
+               the shell search greps and scores line by line
+and checks that every hit points at a block containing the query terms.
+
+Usage:
+  python3 tests/benchmarks/bench_history_search.py [--days 730] [--messages 150] [--json]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+from synthetic_corpus import write_daily_exports
+from chat_extractor_base import render_message_block
+from history_search import SearchIndex, tokenize
+
+WORDS = ("graph lesson decision session recall commit branch config pipeline schema "
+         "migration index cache manifest export archive memory plugin hook render "
+         "parser token offset spool watcher store search query rank sqlite").split()
+QUERIES = ["sqlite migration", "watcher offset", "plugin hook render", "archive memory recall",
+           "schema", "spool parser token", "rank query cache", "branch commit lesson"]
+
+
+def scan(paths, query):
+    """Linear baseline: count matching query terms per block of every export."""
+    terms = set(tokenize(query))
+    hits = 0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            block_terms = 0
+            for line in f:
+                if line.startswith("### Message "):
+                    hits += block_terms > 0
+                    block_terms = 0
+                else:
+                    low = line.lower()
+                    block_terms += sum(t in low for t in terms)
+            hits += block_terms > 0
+    return hits
+
+
+def timings(samples):
+    samples = sorted(s * 1000 for s in samples)
+    return {"median_ms": round(statistics.median(samples), 2),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0], 2),
+            "max_ms": round(samples[-1], 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history_search.py on generated exports")
+    parser.add_argument("--days", type=int, default=730, help="Daily exports to generate (default: 730)")
+    parser.add_argument("--messages", type=int, default=150, help="Messages per export (default: 150)")
+    parser.add_argument("--append-days", type=int, default=3, help="Exports appended to before the incremental update")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query (default: 20)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        chat_dir = os.path.join(work_dir, "chat_history")
+        paths = write_daily_exports(chat_dir, args.days, args.messages, WORDS + [f"term{i}" for i in range(5000)])
+        size_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        results = {"exports": len(paths), "messages": len(paths) * args.messages, "size_mb": round(size_mb, 1)}
+
+        with SearchIndex(os.path.join(work_dir, "search.db")) as index:
+            start = time.perf_counter()
+            index.update(chat_dir)
+            results["build_seconds"] = round(time.perf_counter() - start, 2)
+            results["index_mb"] = round(os.path.getsize(os.path.join(work_dir, "search.db")) / (1024 * 1024), 1)
+
+            start = time.perf_counter()
+            index.update(chat_dir)
+            results["noop_update_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+            for path in paths[-args.append_days:]:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(render_message_block(args.messages + 1, "user", "2026-01-01T00:00:00", "appended sqlite block"))
+            start = time.perf_counter()
+            summary = index.update(chat_dir)
+            results["append_update_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            results["append_docs_added"] = summary["docs_added"]
+
+            samples, consistent = [], True
+            for query in QUERIES:
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    hits = index.search(query, limit=10)
+                    samples.append(time.perf_counter() - start)
+                terms = set(tokenize(query))
+                for hit in hits:
+                    with open(hit["path"], encoding="utf-8") as f:
+                        block = f.read().split(f"### Message {hit['number']}: ", 1)[1].split("### Message ", 1)[0].lower()
+                    consistent = consistent and any(t in block for t in terms)
+            results["query"] = timings(samples)
+            results["hits_contain_terms"] = consistent
+
+        samples = []
+        for query in QUERIES:
+            start = time.perf_counter()
+            scan(paths, query)
+            samples.append(time.perf_counter() - start)
+        results["scan"] = timings(samples)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"history_search: {results['exports']} exports, {results['messages']:,} messages, {results['size_mb']} MB")
+    print(f"build            {results['build_seconds']:>9.2f} s   (index {results['index_mb']} MB)")
+    print(f"no-op update     {results['noop_update_ms']:>9.1f} ms")
+    print(f"append update    {results['append_update_ms']:>9.1f} ms  (+{results['append_docs_added']} blocks)")
+    print(f"{'':<16} {'median ms':>10} {'p95 ms':>9} {'max ms':>9}")
+    for name in ("query", "scan"):
+        r = results[name]
+        print(f"{name:<16} {r['median_ms']:>10.2f} {r['p95_ms']:>9.2f} {r['max_ms']:>9.2f}")
+    print(f"hits contain query terms: {results['hits_contain_terms']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bench_jsonl_ingest.py — Micro-benchmark for Claude JSONL ingest
+
+Generates a synthetic session file with a realistic record mix (messages,
+tool results, progress and summary records) and reports lines per second for:
+  baseline   text readline + json.loads on every line (previous parser loop)
+  stdlib     parse_claude_jsonl(fast=False): mmap, no prefilter, stdlib json
+  fast       parse_claude_jsonl(fast=True): mmap + record prefilter + fast backend
+
+Usage:
+  python3 tests/benchmarks/bench_jsonl_ingest.py [--lines N] [--repeat R] [--json]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from synthetic_corpus import write_noisy_session
+from extract_claude import parse_claude_jsonl
+from jsonl_ingest import JSON_BACKEND
+
+
+def baseline_parse(path):
+    """The previous per-line loop: decode every record, keep user/assistant ones."""
+    kept = 0
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if obj.get("type") in ("user", "assistant") and "message" in obj:
+                kept += 1
+    return kept
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude JSONL ingest micro-benchmark")
+    parser.add_argument("--lines", type=int, default=50000, help="Records in the synthetic file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.jsonl")
+        write_noisy_session(path, args.lines)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        variants = [
+            ("baseline", lambda: baseline_parse(path)),
+            ("stdlib", lambda: parse_claude_jsonl(path, fast=False)),
+            ("fast", lambda: parse_claude_jsonl(path, fast=True)),
+        ]
+        results = {"lines": args.lines, "size_mb": round(size_mb, 2),
+                   "json_backend": JSON_BACKEND, "variants": {}}
+        for name, func in variants:
+            seconds = best_of(func, args.repeat)
+            results["variants"][name] = {"seconds": round(seconds, 4),
+                                         "lines_per_sec": int(args.lines / seconds)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    base = results["variants"]["baseline"]["seconds"]
+    print(f"Claude JSONL ingest: {args.lines} lines, {size_mb:.1f} MB, backend={JSON_BACKEND}")
+    print(f"{'variant':<10} {'seconds':>9} {'lines/sec':>12} {'speedup':>8}")
+    for name, r in results["variants"].items():
+        print(f"{name:<10} {r['seconds']:>9.4f} {r['lines_per_sec']:>12,} {base / r['seconds']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
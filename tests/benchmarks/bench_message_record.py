@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_message_record.py — Memory and sort/render cost of the Message record
+
+Generates a Claude corpus, parses it with parse_claude_jsonl() and compares
+the parsed messages held as:
+  dict      the previous message dicts (string timestamps, per-dict keys)
+  message   chat_extractor_base.Message (__slots__, interned role, epoch ts)
+For each it reports the bytes per message allocated for the records
+themselves (the text strings are shared by both and not counted), the time
+to sort every session's messages by timestamp and the time to format every
+timestamp for the export. Message construction includes parsing each
+timestamp once; that time is reported separately.
+
+Usage:
+  python3 tests/benchmarks/bench_message_record.py [--projects 4] [--sessions 20] [--messages 200]
+                                                   [--repeat 5] [--json]
+"""
+import os
+import json
+import time
+import glob
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from operator import attrgetter
+
+from synthetic_corpus import generate_corpus
+from extract_claude import parse_claude_jsonl
+from chat_extractor_base import Message, format_timestamp
+
+
+def as_dict(msg):
+    data = {'role': msg.role, 'content': msg.content, 'timestamp': msg.timestamp, 'uuid': msg.uuid}
+    if msg.thinking is not None:
+        data['thinking'] = msg.thinking
+    return data
+
+
+def as_message(data):
+    return Message(data['role'], data['timestamp'], data['content'], data.get('thinking'), uuid=data['uuid'])
+
+
+def allocated(build, sessions):
+    """Returns (records, bytes allocated while building them)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [[build(m) for m in session] for session in sessions]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return records, size
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark message dicts against the Message record")
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions per project")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per session")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs (median reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        generate_corpus(work_dir, args.projects, args.sessions, args.messages)
+        files = sorted(glob.glob(os.path.join(work_dir, ".claude", "projects", "*", "*.jsonl")))
+        parsed = [parse_claude_jsonl(path, fast=False)['messages'] for path in files]
+
+    # Both variants are rebuilt from the same strings, so only record overhead is measured
+    dicts, dict_bytes = allocated(as_dict, parsed)
+    messages, message_bytes = allocated(as_message, dicts)
+    build_ms = timed(lambda: [[as_message(m) for m in s] for s in dicts], args.repeat)
+    count = sum(len(s) for s in dicts)
+
+    results = {
+        "messages": count,
+        "dict": {
+            "bytes_per_message": round(dict_bytes / count),
+            "sort_ms": timed(lambda: [sorted(s, key=lambda x: x.get('timestamp', '')) for s in dicts], args.repeat),
+            "format_ms": timed(lambda: [format_timestamp(m['timestamp']) for s in dicts for m in s], args.repeat),
+        },
+        "message": {
+            "bytes_per_message": round(message_bytes / count),
+            "sort_ms": timed(lambda: [sorted(s, key=attrgetter('ts')) for s in messages], args.repeat),
+            "format_ms": timed(lambda: [m.display_timestamp for s in messages for m in s], args.repeat),
+            "build_ms": build_ms,
+        },
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{count:,} messages from {len(files)} session files")
+    print(f"{'record':<9} {'bytes/msg':>10} {'sort':>10} {'format':>10}")
+    for name in ("dict", "message"):
+        r = results[name]
+        print(f"{name:<9} {r['bytes_per_message']:>10} {r['sort_ms']:>8.1f}ms {r['format_ms']:>8.1f}ms")
+    print(f"Message construction (parses each timestamp once): {build_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
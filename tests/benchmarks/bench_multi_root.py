@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+bench_multi_root.py — Wall time of a multi-root extraction, concurrent vs sequential
+
+Generates --roots home directories (different seeds, same size), then runs
+run_extraction.py over them:
+  one_root     --root for the first home only
+  sequential   --root for every home with --sequential (one root after the other)
+  concurrent   --root for every home (one worker process per root, up to one per CPU;
+               with one CPU this is the sequential run)
+Each run is a separate process with a fresh output directory, and the
+concurrent and sequential outputs must be identical. With at least as many
+CPUs as roots, the concurrent run should take close to a single root.
+
+Usage:
+  python3 tests/benchmarks/bench_multi_root.py [--roots 4] [--projects 2] [--sessions 10] [--messages 200]
+                                               [--repeat 3] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION, generate_corpus
+
+
+def run_variant(work_dir, name, root_args, repeat):
+    samples = []
+    for i in range(repeat):
+        output_dir = os.path.join(work_dir, f"out-{name}-{i}")
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, RUN_EXTRACTION, "--output-dir", output_dir] + root_args,
+                              capture_output=True, text=True)
+        samples.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    return round(statistics.median(samples), 3)
+
+
+def exports(output_dir):
+    """Export path -> lines without the generation time, for every export under output_dir."""
+    found = {}
+    for d, dirs, names in os.walk(output_dir):
+        dirs[:] = [n for n in dirs if not n.startswith(".")]
+        for name in names:
+            if name.endswith(".md"):
+                path = os.path.join(d, name)
+                with open(path) as f:
+                    found[os.path.relpath(path, output_dir)] = [l for l in f if "Export Generated" not in l]
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction over several source roots")
+    parser.add_argument("--roots", type=int, default=4, help="Home directories to extract")
+    parser.add_argument("--projects", type=int, default=2, help="Claude projects per root")
+    parser.add_argument("--sessions", type=int, default=10, help="Claude sessions per project")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per Claude session")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (median reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        root_args = []
+        for i in range(args.roots):
+            home = os.path.join(work_dir, f"home-{i}")
+            generate_corpus(home, args.projects, args.sessions, args.messages,
+                            gemini_json=10, gemini_pb=5, seed=i)
+            root_args += ["--root", f"r{i}={home}"]
+        variants = {"one_root": root_args[:2], "sequential": root_args + ["--sequential"],
+                    "concurrent": root_args}
+        seconds = {name: run_variant(work_dir, name, variant, args.repeat) for name, variant in variants.items()}
+        if exports(os.path.join(work_dir, "out-sequential-0")) != exports(os.path.join(work_dir, "out-concurrent-0")):
+            raise RuntimeError("concurrent and sequential runs wrote different exports")
+
+    results = {"cpus": os.cpu_count(), "roots": args.roots, "seconds": seconds,
+               "concurrent_vs_one_root": round(seconds["concurrent"] / seconds["one_root"], 2),
+               "speedup_vs_sequential": round(seconds["sequential"] / seconds["concurrent"], 2)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.roots} roots on {results['cpus']} CPUs (median of {args.repeat} runs)")
+    for name, value in seconds.items():
+        print(f"{name:<11} {value:>8.3f}s")
+    print(f"concurrent = {results['concurrent_vs_one_root']:.2f}x one root, "
+          f"{results['speedup_vs_sequential']:.2f}x faster than sequential")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_offsets.py — Reading messages from a heavy day: markdown scan vs offset sidecar
+
+Generates a Claude corpus whose sessions all fall on one day, extracts it,
+then reads from the day's export the way a reader would:
+  message      one message by number, from the middle of the day
+  window       every message in the last hour of the day
+Each lookup is done by regex over the whole export (how readers find blocks
+without a sidecar) and through the export's .offsets.jsonl (load and check
+the sidecar, then seek to each block). Both must return the same text.
+Times are the best of --repeat runs; bytes are what each lookup reads.
+
+Usage:
+  python3 tests/benchmarks/bench_offsets.py [--sessions 40] [--messages 200] [--repeat 5] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION, generate_corpus
+from chat_extractor_base import parse_timestamp
+from export_offsets import load_offsets, offsets_path, read_blocks, select
+
+_BLOCK = re.compile(r'^### Message (\d+): \w+\n\n\*\*Timestamp:\*\* (\S+)\n.*?^---\n\n', re.M | re.S)
+
+
+def scan_lookup(path, message=None, start=None, end=None):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    blocks = []
+    for m in _BLOCK.finditer(text):
+        if message is not None and int(m.group(1)) != message:
+            continue
+        if start is not None:
+            ts = parse_timestamp(m.group(2))
+            if ts is None or ts < start or ts > end:
+                continue
+        blocks.append(m.group(0))
+    return blocks, len(text.encode("utf-8"))
+
+
+def sidecar_lookup(path, message=None, start=None, end=None):
+    entries = load_offsets(path)
+    picked = list(select(entries, message, start, end))
+    return list(read_blocks(path, picked)), os.path.getsize(offsets_path(path)) + sum(e[4] for e in picked)
+
+
+def best(func, repeat, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return result, round(min(times) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark message lookups through offset sidecars")
+    parser.add_argument("--sessions", type=int, default=40, help="Sessions on the day")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per session")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        home = os.path.join(work_dir, "home")
+        output_dir = os.path.join(work_dir, "out")
+        generate_corpus(home, projects=1, sessions=args.sessions, messages=args.messages,
+                        subagents=0, gemini_json=0, gemini_pb=0, days=1)
+        subprocess.run([sys.executable, RUN_EXTRACTION, "--source", "claude",
+                        "--output-dir", output_dir], env=dict(os.environ, HOME=home), check=True,
+                       capture_output=True)
+        path = next(os.path.join(d, n) for d, _, names in os.walk(output_dir)
+                    for n in names if n.endswith("-claude.md"))
+        entries = load_offsets(path)
+        last = max(parse_timestamp(e[2]) for e in entries)
+        lookups = {"message": {"message": entries[len(entries) // 2][0]},
+                   "window": {"start": last - 3600 * 1000, "end": last}}
+
+        results = {"export_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+                   "sidecar_kb": round(os.path.getsize(offsets_path(path)) / 1024, 1),
+                   "messages": len(entries)}
+        for name, kwargs in lookups.items():
+            (scanned, scan_bytes), scan_ms = best(lambda: scan_lookup(path, **kwargs), args.repeat)
+            (seeked, seek_bytes), seek_ms = best(lambda: sidecar_lookup(path, **kwargs), args.repeat)
+            if scanned != seeked:
+                raise RuntimeError(f"{name}: sidecar lookup returned different blocks")
+            results[name] = {"blocks": len(seeked), "scan_ms": scan_ms, "scan_mb": round(scan_bytes / (1024 * 1024), 2),
+                             "sidecar_ms": seek_ms, "sidecar_mb": round(seek_bytes / (1024 * 1024), 2)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"export {results['export_mb']:.2f} MB, {results['messages']} messages, "
+          f"sidecar {results['sidecar_kb']:.1f} KB")
+    print(f"{'lookup':<9} {'blocks':>7} {'scan':>18} {'sidecar':>18}")
+    for name in lookups:
+        r = results[name]
+        print(f"{name:<9} {r['blocks']:>7} {r['scan_ms']:>7.1f}ms {r['scan_mb']:>6.2f} MB "
+              f"{r['sidecar_ms']:>7.1f}ms {r['sidecar_mb']:>6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py — End-to-end extraction benchmark on synthetic corpora
+
+For each corpus size (projects x sessions x messages) a synthetic HOME is
+generated (see synthetic_corpus.py) and these phases are timed, each in a
+fresh interpreter so peak RSS is per phase:
+  claude          extract_claude_sessions(rescan=True) into an empty output dir
+  claude_cached   extract_claude_sessions() again, served from the manifest
+  gemini          extract_all_gemini() over the JSON sessions and .pb files
+  split           split_claude_md() on all Claude exports concatenated (messages/s)
+  output_path     get_output_path() for every export name plus as many new names (calls/s)
+
+Results (wall time, peak RSS, throughput) are written as JSON so runs from
+different versions can be compared with --compare.
+
+Usage:
+  python3 tests/benchmarks/bench_pipeline.py [--sizes 2x5x50,4x10x100] [--output FILE]
+                                             [--compare BASELINE.json]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from synthetic_corpus import REPO_ROOT, generate_corpus
+
+PHASES = ("claude", "claude_cached", "gemini", "split", "output_path")
+DEFAULT_SIZES = "2x5x50,4x10x100,8x20x200"
+
+
+# ── Child side: runs one phase with HOME / KG_OUTPUT_DIR already set ─────────
+
+def _concat_exports(output_dir, dest):
+    with open(dest, "w", encoding="utf-8") as out:
+        for dirpath, dirnames, filenames in os.walk(output_dir):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if name.endswith("-claude.md"):
+                    with open(os.path.join(dirpath, name), encoding="utf-8") as f:
+                        out.write(f.read())
+    return os.path.getsize(dest)
+
+
+def run_phase(phase, work_dir):
+    """Runs ``phase`` and returns {'seconds', 'items', 'bytes'} for throughput."""
+    import chat_extractor_base
+
+    if phase in ("claude", "claude_cached"):
+        from extract_claude import extract_claude_sessions
+        start = time.perf_counter()
+        results = extract_claude_sessions(rescan=(phase == "claude"))
+        return {"seconds": time.perf_counter() - start, "items": len(results)}
+
+    if phase == "gemini":
+        from extract_gemini import extract_all_gemini
+        start = time.perf_counter()
+        results = extract_all_gemini()
+        return {"seconds": time.perf_counter() - start, "items": len(results)}
+
+    if phase == "split":
+        from extract_claude import split_claude_md
+        md_path = os.path.join(work_dir, "all-claude-exports.md")
+        size = _concat_exports(os.path.join(work_dir, "output"), md_path)
+        with open(md_path, encoding="utf-8") as f:
+            n_messages = sum(1 for line in f if line.startswith("### Message "))
+        start = time.perf_counter()
+        split_claude_md(md_path)
+        return {"seconds": time.perf_counter() - start, "items": n_messages, "bytes": size}
+
+    if phase == "output_path":
+        names = []
+        for dirpath, dirnames, filenames in os.walk(chat_extractor_base.OUTPUT_DIR):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            names.extend(n for n in filenames if n.endswith(".md"))
+        names += [f"2027-{1 + i % 12:02d}-{1 + i % 28:02d}-new-{i}.md" for i in range(len(names))]
+        start = time.perf_counter()
+        for name in names:
+            chat_extractor_base.get_output_path(name)
+        return {"seconds": time.perf_counter() - start, "items": len(names)}
+
+    raise ValueError(f"unknown phase {phase}")
+
+
+def child_main(phase, work_dir):
+    result = run_phase(phase, work_dir)
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+
+# ── Parent side ───────────────────────────────────────────────────────────────
+
+def measure_phase(phase, work_dir, home, output_dir):
+    env = dict(os.environ, HOME=home, KG_OUTPUT_DIR=output_dir)
+    wall_start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", phase, work_dir],
+                          env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - wall_start
+    if proc.returncode != 0:
+        raise RuntimeError(f"phase {phase} failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = wall
+    return result
+
+
+def bench_size(spec, seed):
+    projects, sessions, messages = (int(x) for x in spec.split("x"))
+    with tempfile.TemporaryDirectory() as work_dir:
+        home = os.path.join(work_dir, "home")
+        start = time.perf_counter()
+        corpus = generate_corpus(home, projects, sessions, messages, seed=seed,
+                                 gemini_json=max(1, projects * sessions // 4),
+                                 gemini_pb=max(1, projects * sessions // 8))
+        corpus["generate_seconds"] = round(time.perf_counter() - start, 3)
+
+        phases = {}
+        for phase in PHASES:
+            output_dir = os.path.join(work_dir, "split-output" if phase == "split" else "output")
+            os.makedirs(output_dir, exist_ok=True)
+            r = measure_phase(phase, work_dir, home, output_dir)
+            if phase.startswith("claude"):
+                items, size = corpus["claude_messages"], corpus["claude_bytes"]
+            elif phase == "gemini":
+                items = corpus["gemini_json_messages"]
+                size = corpus["gemini_json_bytes"] + corpus["gemini_pb_bytes"]
+            else:
+                items, size = r["items"], r.get("bytes")
+            seconds = max(r["seconds"], 1e-9)
+            phases[phase] = {
+                "seconds": round(r["seconds"], 4),
+                "wall_seconds": round(r["wall_seconds"], 4),
+                "peak_rss_mb": round(r["peak_rss_mb"], 1),
+                "items_per_sec": round(items / seconds, 1),
+            }
+            if size:
+                phases[phase]["mb_per_sec"] = round(size / (1024 * 1024) / seconds, 2)
+    return {"size": spec, "corpus": corpus, "phases": phases}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    base = {}
+    if baseline:
+        for entry in baseline.get("sizes", []):
+            for phase, r in entry["phases"].items():
+                base[(entry["size"], phase)] = r["seconds"]
+    print(f"Extraction pipeline benchmark (rev {results['revision']}, python {results['python']})")
+    header = f"{'size':<12} {'phase':<14} {'seconds':>9} {'peak RSS MB':>12} {'items/s':>11} {'MB/s':>8}"
+    if base:
+        header += f" {'vs base':>8}"
+    print(header)
+    for entry in results["sizes"]:
+        for phase, r in entry["phases"].items():
+            mb_per_sec = f"{r['mb_per_sec']:.2f}" if "mb_per_sec" in r else "-"
+            line = (f"{entry['size']:<12} {phase:<14} {r['seconds']:>9.4f} {r['peak_rss_mb']:>12.1f} "
+                    f"{r['items_per_sec']:>11,.0f} {mb_per_sec:>8}")
+            if (entry["size"], phase) in base:
+                line += f" {base[(entry['size'], phase)] / max(r['seconds'], 1e-9):>7.2f}x"
+            print(line)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child_main(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description="End-to-end extraction benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated PROJECTSxSESSIONSxMESSAGES specs (default: {DEFAULT_SIZES})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sizes": [bench_size(spec.strip(), args.seed) for spec in args.sizes.split(",") if spec.strip()],
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
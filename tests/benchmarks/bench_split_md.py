@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+bench_split_md.py — Benchmark for split_claude_md() on large Markdown exports
+
+Generates a synthetic Claude export of --size-mb MB (messages spread over
+--days days, some with thinking blocks) and compares:
+  baseline   previous path: f.read() the whole export, re.split on the
+             message markers, three regex searches per block, every message
+             grouped in memory before the daily files are written
+  streaming  split_claude_md(): line-oriented block parsing, each message
+             rendered straight into a per-day spool
+Each variant runs in its own process so peak RSS is reported separately, and
+the daily files written by both are compared (ignoring the generation time).
+
+Usage:
+  python3 tests/benchmarks/bench_split_md.py [--size-mb 1024] [--days 60] [--skip-baseline] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+
+from synthetic_corpus import write_export
+
+
+def baseline_split(md_path):
+    """The previous split_claude_md(): whole-file read and in-memory grouping."""
+    from chat_extractor_base import get_output_path, AtomicWriter, write_markdown_header, write_message_block
+    with open(md_path, 'r') as f:
+        content = f.read()
+    msg_blocks = re.split(r'### Message \d+: (User|Assistant)', content)
+    all_sessions = []
+    for i in range(1, len(msg_blocks), 2):
+        role = 'user' if 'user' in msg_blocks[i].lower() else 'assistant'
+        block_text = msg_blocks[i + 1]
+        ts_match = re.search(r'\*\*Timestamp:\*\* ([\d\-T:]+)', block_text)
+        msg_date = "Unknown"
+        if ts_match:
+            try:
+                msg_date = datetime.fromisoformat(ts_match.group(1).replace("Z", "+00:00")).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+        content_match = re.search(r'\*\*Content:\*\*\n\n(.*?)(?=\n\n---|\Z)', block_text, re.DOTALL)
+        thinking_match = re.search(r'\*\*Thinking Block:\*\*\n\n```\n(.*?)\n```', block_text, re.DOTALL)
+        all_sessions.append({
+            'date': msg_date, 'role': role,
+            'content': content_match.group(1).strip() if content_match else "",
+            'thinking': thinking_match.group(1).strip() if thinking_match else "",
+            'timestamp': ts_match.group(1) if ts_match else None,
+        })
+    daily_messages = {}
+    for msg in all_sessions:
+        daily_messages.setdefault(msg['date'], []).append(msg)
+    for date, messages in daily_messages.items():
+        if date == "Unknown":
+            continue
+        with AtomicWriter(get_output_path(f"{date}-claude.md")) as f:
+            write_markdown_header(f, "Claude Code (Reprocessed)", len(messages), date)
+            for i, msg in enumerate(messages, 1):
+                write_message_block(f, i, msg['role'], msg['timestamp'], msg['content'], msg['thinking'])
+
+
+def streaming_split(md_path):
+    from extract_claude import split_claude_md
+    split_claude_md(md_path)
+
+
+def output_digest(output_dir):
+    """Hash of every daily file with the Export Generated line removed."""
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in sorted(os.walk(output_dir)):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(n for n in filenames if n.endswith(".md")):
+            digest.update(name.encode())
+            with open(os.path.join(dirpath, name), "rb") as f:
+                for line in f:
+                    if not line.startswith(b"**Export Generated:**"):
+                        digest.update(line)
+    return digest.hexdigest()
+
+
+def run_variant(name, md_path):
+    """Child process entry point (KG_OUTPUT_DIR already set): prints seconds, peak RSS and digest."""
+    func = baseline_split if name == "baseline" else streaming_split
+    start = time.perf_counter()
+    func(md_path)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "digest": output_digest(os.environ["KG_OUTPUT_DIR"]),
+    }))
+
+
+def measure(name, md_path, work_dir):
+    output_dir = os.path.join(work_dir, f"out-{name}")
+    os.makedirs(output_dir)
+    env = dict(os.environ, KG_OUTPUT_DIR=output_dir)
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, md_path],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_variant(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark split_claude_md() on a synthetic export")
+    parser.add_argument("--size-mb", type=float, default=1024, help="Export size in MB (default: 1024)")
+    parser.add_argument("--days", type=int, default=60, help="Days the messages are spread over")
+    parser.add_argument("--skip-baseline", action="store_true",
+                        help="Only run the streaming splitter (the baseline needs several times --size-mb of RAM)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        md_path = os.path.join(work_dir, "export.md")
+        start = time.perf_counter()
+        messages = write_export(md_path, args.size_mb, args.days)
+        size = os.path.getsize(md_path)
+        results = {"size_mb": round(size / (1024 * 1024), 1), "messages": messages,
+                   "generate_seconds": round(time.perf_counter() - start, 2), "variants": {}}
+        for name in (("streaming",) if args.skip_baseline else ("baseline", "streaming")):
+            r = measure(name, md_path, work_dir)
+            r["mb_per_sec"] = round(size / (1024 * 1024) / max(r["seconds"], 1e-9), 1)
+            results["variants"][name] = r
+
+    variants = results["variants"]
+    if "baseline" in variants:
+        results["identical_output"] = variants["baseline"]["digest"] == variants["streaming"]["digest"]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"split_claude_md: {results['size_mb']} MB export, {messages:,} messages "
+          f"(generated in {results['generate_seconds']}s)")
+    print(f"{'variant':<10} {'seconds':>9} {'MB/s':>8} {'peak RSS MB':>12}")
+    for name, r in variants.items():
+        print(f"{name:<10} {r['seconds']:>9.2f} {r['mb_per_sec']:>8.1f} {r['peak_rss_mb']:>12.1f}")
+    if "identical_output" in results:
+        print(f"identical output: {results['identical_output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py — Startup budget for the extraction CLI
+
+Hooks run run_extraction.py on every session, so its start-up cost is paid
+often. This runs a cold ``--today --source claude`` extraction (new process,
+empty HOME) under ``python -X importtime`` --runs times and reports:
+  imports      import time of the run minus a bare ``python -c pass``
+               (median; top-level cumulative times from -X importtime)
+  wall         wall time of the whole run (median)
+  slowest      the modules with the largest cumulative import time
+It exits with status 1 if the median import time is over --budget-ms, or if
+a module that only other sources or options need was imported (the Gemini
+extractor, blackboxprotobuf, zstandard, gzip, asyncio, the process pool, the
+search index and sqlite3).
+
+Usage:
+  python3 tests/benchmarks/bench_startup.py [--runs 5] [--budget-ms 120] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from synthetic_corpus import RUN_EXTRACTION
+
+# Loaded only by --source gemini/all, --watch, .pb decoding, cold-storage
+# archives or an existing search index
+UNEXPECTED = ("extract_gemini", "blackboxprotobuf", "zstandard", "gzip", "asyncio", "concurrent.futures",
+              "history_search", "sqlite3")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Returns (top-level cumulative microseconds, {module: cumulative us})."""
+    total = 0
+    modules = {}
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, module = int(m.group(2)), m.group(4)
+        modules[module] = cumulative
+        if len(m.group(3)) == 1:
+            total += cumulative
+    return total, modules
+
+
+def run(argv, env):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + argv, env=env,
+                          stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{proc.stderr[-2000:]}")
+    total, modules = parse_importtime(proc.stderr)
+    return total, modules, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the start-up cost of a cold --today --source claude run")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=120.0, help="Maximum median import time (default: 120)")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    imports, walls, slowest = [], [], {}
+    unexpected = set()
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, HOME=os.path.join(work_dir, "home"))
+        env.pop("KG_OUTPUT_DIR", None)
+        os.makedirs(env["HOME"])
+        for i in range(args.runs):
+            baseline, _, _ = run(["-c", "pass"], env)
+            total, modules, seconds = run([RUN_EXTRACTION, "--today", "--source", "claude",
+                                           "--output-dir", os.path.join(work_dir, f"out-{i}")], env)
+            imports.append(max(0, total - baseline) / 1000)
+            walls.append(seconds * 1000)
+            for module, us in modules.items():
+                slowest[module] = max(slowest.get(module, 0), us)
+            unexpected.update(m for m in UNEXPECTED if m in modules)
+
+    results = {"runs": args.runs, "budget_ms": args.budget_ms,
+               "import_ms": round(statistics.median(imports), 1), "wall_ms": round(statistics.median(walls), 1),
+               "slowest": [{"module": m, "ms": round(us / 1000, 1)} for m, us in
+                           sorted(slowest.items(), key=lambda kv: -kv[1])[:args.top]],
+               "unexpected": sorted(unexpected)}
+    over = results["import_ms"] > args.budget_ms
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Cold --today --source claude (median of {args.runs} runs)")
+        print(f"imports  {results['import_ms']:>8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+        print(f"wall     {results['wall_ms']:>8.1f} ms")
+        print("slowest imports (cumulative):")
+        for entry in results["slowest"]:
+            print(f"  {entry['ms']:>7.1f} ms  {entry['module']}")
+        if unexpected:
+            print(f"UNEXPECTED imports: {', '.join(results['unexpected'])}")
+        print("OVER BUDGET" if over else "within budget")
+    sys.exit(1 if over or unexpected else 0)
+
+
+if __name__ == "__main__":
+    main()
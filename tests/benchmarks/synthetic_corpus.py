@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+synthetic_corpus.py — Realistic chat-history trees for extraction benchmarks
+
+Builds a fake HOME with:
+  ~/.claude/projects/<project>/<session>.jsonl                 N projects x M sessions
+  ~/.claude/projects/<project>/<session>/subagents/agent-*.jsonl
+  ~/.gemini/tmp/<hash>/chats/session-*.json                    Gemini CLI sessions
+  ~/.gemini/antigravity/conversations/*.pb                     Gemini conversations
+
+Claude sessions hold K user/assistant messages mixed with the tool-result,
+progress and file-snapshot records real logs carry, spread over several days.
+Output is deterministic for a given seed.
+
+It is also the shared module of the benchmarks: importing it puts
+core/scripts on sys.path, and it holds the generators for single inputs
+(a noisy session log, a large export, a binary blob, .pb conversations,
+daily exports).
+
+Usage:
+  python3 tests/benchmarks/synthetic_corpus.py HOME_DIR [--projects N] [--sessions M] [--messages K]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCH_DIR))
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "core", "scripts")
+RUN_EXTRACTION = os.path.join(SCRIPTS_DIR, "run_extraction.py")
+
+# Benchmarks import the extraction modules after this one
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+WORDS = ("the graph stores lessons and decisions so that future sessions can recall "
+         "why a change was made and which approach failed before you commit this from "
+         "the repo with a test that covers the config path").split()
+
+BASE_DATE = datetime(2026, 1, 5, 9, 0, 0, tzinfo=timezone.utc)
+
+
+def sentence(rng, n_words, vocab=WORDS):
+    return " ".join(rng.choice(vocab) for _ in range(n_words))
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _claude_records(rng, session_id, start, n_messages):
+    """Yields JSONL records: n_messages user/assistant turns plus tool and progress noise."""
+    ts = start
+    for i in range(n_messages):
+        ts += timedelta(seconds=rng.randint(2, 90))
+        if i % 2 == 0:
+            yield {"type": "user", "uuid": f"{session_id}-{i}", "sessionId": session_id,
+                   "timestamp": _iso(ts), "cwd": "/Users/test/project",
+                   "message": {"role": "user", "content": [{"type": "text", "text": sentence(rng, rng.randint(5, 60))}]}}
+            continue
+        content = []
+        if rng.random() < 0.5:
+            content.append({"type": "thinking", "thinking": sentence(rng, rng.randint(20, 120))})
+        content.append({"type": "text", "text": sentence(rng, rng.randint(20, 300))})
+        yield {"type": "assistant", "uuid": f"{session_id}-{i}", "sessionId": session_id,
+               "timestamp": _iso(ts), "message": {"role": "assistant", "model": "synthetic",
+                                                  "content": content}}
+        # Tool round trips and progress updates between turns
+        for j in range(rng.randint(0, 3)):
+            ts += timedelta(seconds=1)
+            yield {"type": "progress", "uuid": f"{session_id}-{i}-p{j}", "timestamp": _iso(ts),
+                   "data": {"type": "bash_progress", "output": sentence(rng, rng.randint(50, 400))}}
+        if rng.random() < 0.3:
+            yield {"type": "file-history-snapshot", "messageId": f"{session_id}-{i}",
+                   "snapshot": {"trackedFileBackups": {f"src/f{k}.py": {"version": k} for k in range(8)}}}
+
+
+def _write_jsonl(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+    return os.path.getsize(path)
+
+
+def _gemini_session(rng, start, n_messages):
+    messages = []
+    ts = start
+    for i in range(n_messages):
+        ts += timedelta(seconds=rng.randint(2, 60))
+        if i % 2 == 0:
+            messages.append({"id": f"m{i}", "type": "user", "timestamp": _iso(ts),
+                             "content": sentence(rng, rng.randint(5, 40))})
+        else:
+            messages.append({"id": f"m{i}", "type": "gemini", "timestamp": _iso(ts),
+                             "content": sentence(rng, rng.randint(20, 200)),
+                             "thoughts": [{"subject": "plan", "description": sentence(rng, 20)}],
+                             "toolCalls": [{"name": "read_file", "args": {"path": "README.md"}}]
+                             if rng.random() < 0.3 else []})
+    return {"sessionId": f"s-{rng.randrange(10**9)}", "startTime": _iso(start), "messages": messages}
+
+
+def _repeat_parent(rng, records, parent, overlap):
+    """Gives about ``overlap`` of the subagent turns the text of a parent turn, as real transcripts do."""
+    by_type = {}
+    for rec in parent:
+        if rec["type"] in ("user", "assistant"):
+            by_type.setdefault(rec["type"], []).append(rec["message"]["content"])
+    for rec in records:
+        if rec["type"] in by_type and rng.random() < overlap:
+            rec["message"]["content"] = rng.choice(by_type[rec["type"]])
+        yield rec
+
+
+# ── Minimal protobuf wire encoder (Gemini .pb conversations) ─────────────────
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _field_varint(num, value):
+    return _varint(num << 3) + _varint(value)
+
+
+def _field_bytes(num, payload):
+    return _varint((num << 3) | 2) + _varint(len(payload)) + payload
+
+
+def make_conversation(rng, n_turns):
+    """Conversation{1: id, 2: repeated Turn{1: role, 2: text, 3: ts, 4: repeated Part{1: text, 2: Meta}}}"""
+    body = _field_bytes(1, f"conv-{rng.randrange(10**9)}".encode())
+    for t in range(n_turns):
+        turn = _field_varint(1, t % 2)
+        turn += _field_bytes(2, sentence(rng, rng.randint(8, 60)).encode())
+        turn += _field_varint(3, 1760000000 + t)
+        for _ in range(rng.randint(0, 3)):
+            meta = _field_bytes(1, b"tool-output") + _field_varint(2, rng.randrange(1000))
+            part = _field_bytes(1, sentence(rng, 20).encode())
+            part += _field_bytes(2, meta)
+            turn += _field_bytes(4, part)
+        body += _field_bytes(2, turn)
+    return body
+
+
+# ── Single inputs ────────────────────────────────────────────────────────────
+
+def write_noisy_session(path, n_lines, seed=7):
+    """Writes a one-day session log of ``n_lines`` records: ~30% messages, the rest tool/progress noise."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(n_lines):
+            ts = f"2026-01-15T{10 + i // 3600 % 10:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z"
+            kind = rng.random()
+            if kind < 0.15:
+                rec = {"type": "user", "uuid": f"u-{i}", "timestamp": ts,
+                       "message": {"role": "user", "content": [{"type": "text", "text": sentence(rng, 40)}]}}
+            elif kind < 0.30:
+                rec = {"type": "assistant", "uuid": f"a-{i}", "timestamp": ts,
+                       "message": {"role": "assistant", "content": [
+                           {"type": "thinking", "thinking": sentence(rng, 60)},
+                           {"type": "text", "text": sentence(rng, 120)}]}}
+            elif kind < 0.80:
+                rec = {"type": "progress", "uuid": f"p-{i}", "timestamp": ts,
+                       "data": {"type": "bash_progress", "output": sentence(rng, 200),
+                                "tool": {"name": "Bash", "input": {"command": "ls -la"}}}}
+            else:
+                rec = {"type": "file-history-snapshot", "uuid": f"s-{i}", "timestamp": ts,
+                       "snapshot": {"files": {f"src/f{j}.py": sentence(rng, 20) for j in range(10)}}}
+            f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+
+
+def write_export(path, size_mb, days, seed=11):
+    """Writes a Claude-style export of roughly ``size_mb`` MB over ``days`` days; returns the message count."""
+    rng = random.Random(seed)
+    paragraphs = [sentence(rng, rng.randint(20, 200)) for _ in range(256)]
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    span = days * 86400
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        header = ("# Complete Chat Session Export\n## Full Conversation from Claude Code\n\n"
+                  "---\n\n## Full Conversation Transcript\n\n")
+        f.write(header)
+        written += len(header)
+        while written < target:
+            n += 1
+            ts = start + timedelta(seconds=n * span // max(1, target // 2400))
+            role = "User" if n % 2 else "Assistant"
+            parts = [f"### Message {n}: {role}\n\n**Timestamp:** {ts.isoformat()}\n\n"]
+            if role == "Assistant" and rng.random() < 0.4:
+                parts.append(f"**Thinking Block:**\n\n```\n{rng.choice(paragraphs)}\n```\n\n")
+            body = "\n\n".join(rng.choice(paragraphs) for _ in range(rng.randint(1, 6)))
+            parts.append(f"**Content:**\n\n{body}\n\n---\n\n")
+            block = "".join(parts)
+            f.write(block)
+            written += len(block)
+    return n
+
+
+def write_binary_blob(path, size_mb, seed=5):
+    """Writes roughly ``size_mb`` MB of binary noise mixed with text runs (a .pb the decoder cannot read)."""
+    rng = random.Random(seed)
+    noise = bytes(rng.randrange(256) for _ in range(1 << 16))
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    with open(path, "wb") as f:
+        while written < target:
+            k = rng.random()
+            if k < 0.3:
+                chunk = sentence(rng, rng.randint(3, 80)).encode()
+            elif k < 0.4:
+                chunk = rng.choice((b"\xff\xfe", b"\xe2\x82", b"caf\xc3\xa9 ", b"\n"))
+            else:
+                start = rng.randrange(len(noise) - 64)
+                chunk = noise[start:start + rng.randint(4, 64)]
+            f.write(chunk)
+            written += len(chunk)
+
+
+def write_daily_exports(root, days, messages, vocab=WORDS, seed=5):
+    """Writes ``days`` daily Claude exports of ``messages`` messages into month folders; returns their paths."""
+    from chat_extractor_base import render_markdown_header, render_message_block
+    rng = random.Random(seed)
+    paths = []
+    start = date(2024, 1, 1)
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        folder = os.path.join(root, day[:7])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{day}-claude.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_markdown_header("Claude Code", messages, day))
+            for n in range(1, messages + 1):
+                body = sentence(rng, rng.randint(10, 120), vocab)
+                f.write(render_message_block(n, "user" if n % 2 else "assistant", f"{day}T10:00:00", body))
+        paths.append(path)
+    return paths
+
+
+# ── Chat-history tree ────────────────────────────────────────────────────────
+
+def generate_corpus(home, projects=4, sessions=10, messages=100, subagents=1,
+                    gemini_json=10, gemini_pb=5, pb_turns=100, days=7, seed=0,
+                    subagent_overlap=0.0):
+    """
+    Writes the corpus under ``home`` and returns a summary dict (file counts,
+    bytes and message counts per source). With ``subagent_overlap``, that
+    share of subagent turns repeats text from the parent session.
+    """
+    rng = random.Random(seed)
+    summary = {"claude_files": 0, "claude_bytes": 0, "claude_messages": 0,
+               "gemini_json_files": 0, "gemini_json_bytes": 0, "gemini_json_messages": 0,
+               "gemini_pb_files": 0, "gemini_pb_bytes": 0}
+
+    projects_dir = os.path.join(home, ".claude", "projects")
+    for p in range(projects):
+        project_dir = os.path.join(projects_dir, f"-Users-test-project-{p:03d}")
+        for s in range(sessions):
+            session_id = f"p{p:03d}-s{s:04d}"
+            start = BASE_DATE + timedelta(days=rng.randrange(days), minutes=rng.randrange(600))
+            parent = list(_claude_records(rng, session_id, start, messages))
+            summary["claude_bytes"] += _write_jsonl(os.path.join(project_dir, f"{session_id}.jsonl"), parent)
+            summary["claude_files"] += 1
+            summary["claude_messages"] += messages
+            for a in range(subagents):
+                agent_id = f"{session_id}-a{a}"
+                n_agent = max(2, messages // 4)
+                records = _claude_records(rng, agent_id, start + timedelta(minutes=5), n_agent)
+                if subagent_overlap:
+                    records = _repeat_parent(rng, records, parent, subagent_overlap)
+                summary["claude_bytes"] += _write_jsonl(
+                    os.path.join(project_dir, session_id, "subagents", f"agent-{agent_id}.jsonl"), records)
+                summary["claude_files"] += 1
+                summary["claude_messages"] += n_agent
+
+    for g in range(gemini_json):
+        start = BASE_DATE + timedelta(days=rng.randrange(days), minutes=rng.randrange(600))
+        path = os.path.join(home, ".gemini", "tmp", f"{g:040x}", "chats",
+                            f"session-{start.strftime('%Y-%m-%dT%H-%M')}-{g:04d}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(_gemini_session(rng, start, messages), f)
+        summary["gemini_json_files"] += 1
+        summary["gemini_json_bytes"] += os.path.getsize(path)
+        summary["gemini_json_messages"] += messages
+
+    conv_dir = os.path.join(home, ".gemini", "antigravity", "conversations")
+    os.makedirs(conv_dir, exist_ok=True)
+    for c in range(gemini_pb):
+        path = os.path.join(conv_dir, f"{c:08x}-synthetic.pb")
+        with open(path, "wb") as f:
+            f.write(make_conversation(rng, pb_turns))
+        # .pb files are dated by mtime
+        mtime = (BASE_DATE + timedelta(days=rng.randrange(days), hours=3)).timestamp()
+        os.utime(path, (mtime, mtime))
+        summary["gemini_pb_files"] += 1
+        summary["gemini_pb_bytes"] += os.path.getsize(path)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic chat-history corpus")
+    parser.add_argument("home", help="Directory used as the fake HOME")
+    parser.add_argument("--projects", type=int, default=4, help="Claude projects (N)")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions per project (M)")
+    parser.add_argument("--messages", type=int, default=100, help="Messages per session (K)")
+    parser.add_argument("--subagents", type=int, default=1, help="Subagent logs per session")
+    parser.add_argument("--gemini-json", type=int, default=10, help="Gemini JSON sessions")
+    parser.add_argument("--gemini-pb", type=int, default=5, help="Gemini .pb conversations")
+    parser.add_argument("--subagent-overlap", type=float, default=0.0,
+                        help="Share of subagent turns that repeat parent-session text (0-1)")
+    parser.add_argument("--days", type=int, default=7, help="Days the sessions are spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    summary = generate_corpus(args.home, args.projects, args.sessions, args.messages, args.subagents,
+                              args.gemini_json, args.gemini_pb, days=args.days, seed=args.seed,
+                              subagent_overlap=args.subagent_overlap)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
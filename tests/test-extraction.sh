@@ -135,6 +135,943 @@ else
   fail "Custom --output-dir should be created/used"
 fi
 
+# Test 8: Timestamps with an offset and no seconds are written like format_timestamp() does
+OFFSET_HOME="$TEST_DIR/offset-home"
+mkdir -p "$OFFSET_HOME/.claude/projects/-Users-test-offset"
+sed -e 's/"2026-01-15T10:00:00Z"/"2026-01-15T10:03+02:00"/' -e 's/"2026-01-15T10:00:05Z"/"2026-01-15T10:04:05.250+02:00"/' \
+  "$FIXTURES_DIR/sample-claude-session.jsonl" > "$OFFSET_HOME/.claude/projects/-Users-test-offset/offset.jsonl"
+HOME="$OFFSET_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-offset" > /dev/null 2>&1 || true
+OFFSET_EXPORT="$TEST_DIR/output-offset/2026-01/2026-01-15-claude.md"
+if grep -q '^\*\*Timestamp:\*\* 2026-01-15T10:03:00$' "$OFFSET_EXPORT" 2>/dev/null && \
+   grep -q '^\*\*Timestamp:\*\* 2026-01-15T10:04:05$' "$OFFSET_EXPORT"; then
+  pass "Offset timestamps without seconds are rendered in full (10:03+02:00 -> 10:03:00)"
+else
+  fail "Offset timestamp rendered wrongly: $(grep '^\*\*Timestamp' "$OFFSET_EXPORT" 2>/dev/null | head -2 | tr '\n' ' ')"
+fi
+
+echo ""
+echo "── Extraction manifest ─────────────────────────────────────────"
+
+MANIFEST_OUT="$TEST_DIR/output-manifest"
+RESCAN_OUT="$TEST_DIR/output-rescan"
+mkdir -p "$MANIFEST_OUT" "$RESCAN_OUT"
+
+# Strips the per-run generation timestamp so exports can be compared
+normalize_export() {
+  find "$1" -name "*-claude.md" -not -path "*/.extraction-cache/*" | sort | while read -r f; do
+    echo "== $(basename "$f")"
+    grep -v '^\*\*Export Generated:\*\*' "$f"
+  done
+}
+
+# Test 9: First run writes a manifest into the hidden cache folder
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$MANIFEST_OUT" > /dev/null 2>&1 || true
+if [ -f "$MANIFEST_OUT/.extraction-cache/claude-manifest.json" ]; then
+  pass "Extraction manifest written to .extraction-cache/"
+else
+  fail "Expected $MANIFEST_OUT/.extraction-cache/claude-manifest.json"
+fi
+
+# Test 10: Appended records are picked up by tailing from the stored offset; saving them
+# appends one line to the manifest log instead of rewriting the snapshot
+MANIFEST_SNAPSHOT=$(cksum < "$MANIFEST_OUT/.extraction-cache/claude-manifest.json" 2>/dev/null || true)
+echo '{"type":"user","uuid":"test-005","timestamp":"2026-01-15T10:02:00Z","message":{"role":"user","content":[{"type":"text","text":"Manifest tail check"}]}}' \
+  >> "$PROJECT_PATH/$TODAY.jsonl"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$MANIFEST_OUT" > /dev/null 2>&1 || true
+MANIFEST_LOG="$MANIFEST_OUT/.extraction-cache/claude-manifest.log"
+if grep -rq "Manifest tail check" "$MANIFEST_OUT" --include="*-claude.md" && \
+   [ "$(cksum < "$MANIFEST_OUT/.extraction-cache/claude-manifest.json")" = "$MANIFEST_SNAPSHOT" ] && \
+   [ -f "$MANIFEST_LOG" ] && [ "$(wc -l < "$MANIFEST_LOG")" -eq 1 ]; then
+  pass "Appended session records extracted on re-run; manifest change logged, snapshot untouched"
+else
+  fail "Appended record missing from output after manifest re-run, or manifest snapshot rewritten"
+fi
+
+# Test 11: A re-run with no changed file renders no day and leaves the export as it was
+MANIFEST_SUMS=$(find "$MANIFEST_OUT" -name "*-claude.md" -not -path "*/.extraction-cache/*" -exec cksum {} + | sort)
+MANIFEST_RERUN=$(HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$MANIFEST_OUT" 2>&1 || true)
+if [ -n "$MANIFEST_SUMS" ] && [[ "$MANIFEST_RERUN" != *"-claude.md"* ]] && \
+   [ "$(find "$MANIFEST_OUT" -name "*-claude.md" -not -path "*/.extraction-cache/*" -exec cksum {} + | sort)" = "$MANIFEST_SUMS" ]; then
+  pass "Unchanged files are not decoded from the cache or rendered again"
+else
+  fail "Re-run without changes rendered a day: ${MANIFEST_RERUN##*$'\n'}"
+fi
+
+# Test 12: Output rendered from the manifest cache matches a full rescan
+find "$MANIFEST_OUT" -name "*-claude.md" -not -path "*/.extraction-cache/*" -delete
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$MANIFEST_OUT" > /dev/null 2>&1 || true
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$RESCAN_OUT" --rescan > /dev/null 2>&1 || true
+if [ -n "$(normalize_export "$RESCAN_OUT")" ] && \
+   [ "$(normalize_export "$MANIFEST_OUT")" = "$(normalize_export "$RESCAN_OUT")" ]; then
+  pass "Cached extraction output identical to --rescan"
+else
+  fail "Cached extraction output differs from --rescan"
+fi
+
+echo ""
+echo "── Parallel parsing ────────────────────────────────────────────"
+
+# Several sessions across two projects and two days so merge order matters
+PARALLEL_HOME="$TEST_DIR/parallel-home"
+for proj in -Users-test-alpha -Users-test-beta; do
+  mkdir -p "$PARALLEL_HOME/.claude/projects/$proj/subagents"
+  for n in 1 2 3; do
+    sed -e "s/2026-01-15T10:0/2026-01-1${n}T0${n}:0/" -e "s/test-00/$proj-$n-/" \
+      "$FIXTURES_DIR/sample-claude-session.jsonl" > "$PARALLEL_HOME/.claude/projects/$proj/session-$n.jsonl"
+  done
+  sed -e "s/2026-01-15T10:0/2026-01-12T11:0/" "$FIXTURES_DIR/sample-claude-session.jsonl" \
+    > "$PARALLEL_HOME/.claude/projects/$proj/subagents/agent-1.jsonl"
+done
+
+# Test 13: --workers output matches the serial path
+HOME="$PARALLEL_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --rescan \
+  --output-dir "$TEST_DIR/output-serial" > /dev/null 2>&1 || true
+HOME="$PARALLEL_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --rescan --workers 4 \
+  --output-dir "$TEST_DIR/output-parallel" > /dev/null 2>&1 || true
+if [ -n "$(normalize_export "$TEST_DIR/output-serial")" ] && \
+   [ "$(normalize_export "$TEST_DIR/output-serial")" = "$(normalize_export "$TEST_DIR/output-parallel")" ]; then
+  pass "--workers 4 output identical to serial extraction"
+else
+  fail "--workers 4 output differs from serial extraction"
+fi
+
+# Test 14: Spilling day groups to disk does not change the output
+HOME="$PARALLEL_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --rescan --memory-limit 0.001 \
+  --output-dir "$TEST_DIR/output-spill" > /dev/null 2>&1 || true
+if [ -n "$(normalize_export "$TEST_DIR/output-spill")" ] && \
+   [ "$(normalize_export "$TEST_DIR/output-serial")" = "$(normalize_export "$TEST_DIR/output-spill")" ]; then
+  pass "--memory-limit spill/merge output identical to in-memory grouping"
+else
+  fail "--memory-limit spill/merge output differs from in-memory grouping"
+fi
+
+# Test 15: Date-window pruning yields the same day export as a full run
+HOME="$PARALLEL_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --rescan --date 2026-01-12 \
+  --output-dir "$TEST_DIR/output-date" > /dev/null 2>&1 || true
+DATE_FILES=$(find "$TEST_DIR/output-date" -name "*-claude.md" | wc -l | tr -d ' ')
+if [ "$DATE_FILES" = "1" ] && \
+   [ "$(normalize_export "$TEST_DIR/output-date")" = "$(normalize_export "$TEST_DIR/output-serial" | awk '/^== /{keep=($2=="2026-01-12-claude.md")} keep')" ]; then
+  pass "--date pruning matches the full run for that day"
+else
+  fail "--date pruning output differs from the full run ($DATE_FILES files)"
+fi
+
+# Test 16: Gemini JSON sessions are dated by startTime, read before decoding: a session written
+# recently but started after the window is skipped, not decoded and discarded
+DATE_GEMINI="$TEST_DIR/date-gemini-home/.gemini/tmp/project-hash/chats"
+mkdir -p "$DATE_GEMINI"
+for day in 12 14; do
+  echo "{\"sessionId\":\"s-$day\",\"startTime\":\"2026-01-${day}T09:00:00Z\",\"messages\":[{\"type\":\"user\",\"timestamp\":\"2026-01-${day}T09:00:00Z\",\"content\":\"Gemini day $day\"}]}" \
+    > "$DATE_GEMINI/session-2026-01-${day}T09-00-s$day.json"
+done
+DATE_GEMINI_STATS=$(HOME="$TEST_DIR/date-gemini-home" python3 "$EXTRACTION_SCRIPT" --source gemini --date 2026-01-12 \
+  --output-dir "$TEST_DIR/output-date-gemini" --stats json 2>&1 || true)
+if [[ "$DATE_GEMINI_STATS" == *'"files_parsed": 1,'* ]] && [[ "$DATE_GEMINI_STATS" == *'"files_skipped": 1,'* ]] && \
+   grep -q "Gemini day 12" "$TEST_DIR/output-date-gemini/2026-01/2026-01-12-gemini.md" 2>/dev/null; then
+  pass "--date prunes Gemini JSON sessions by startTime before decoding"
+else
+  fail "Gemini JSON session outside --date was decoded: ${DATE_GEMINI_STATS##*$'\n'}"
+fi
+
+echo ""
+echo "── Output path index ───────────────────────────────────────────"
+
+INDEX_OUT="$TEST_DIR/output-index"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$INDEX_OUT" > /dev/null 2>&1 || true
+
+# Test 17: Output-path index persisted in the cache folder
+if [ -f "$INDEX_OUT/.extraction-cache/output-index.json" ]; then
+  pass "Output-path index written to .extraction-cache/"
+else
+  fail "Expected $INDEX_OUT/.extraction-cache/output-index.json"
+fi
+
+# Test 18: A file moved between folders is found again (directory mtime invalidation)
+INDEXED_FILE=$(find "$INDEX_OUT" -name "*-claude.md" -not -path "*/.extraction-cache/*" | head -1)
+if [ -n "$INDEXED_FILE" ]; then
+  mkdir -p "$INDEX_OUT/moved"
+  mv "$INDEXED_FILE" "$INDEX_OUT/moved/"
+  HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$INDEX_OUT" > /dev/null 2>&1 || true
+  if [ ! -f "$INDEXED_FILE" ] && [ -f "$INDEX_OUT/moved/$(basename "$INDEXED_FILE")" ]; then
+    pass "Moved export found via refreshed index (not recreated)"
+  else
+    fail "Export recreated at stale location after move"
+  fi
+else
+  fail "No export produced for output-path index test"
+fi
+
+echo ""
+echo "── Gemini raw fallback ─────────────────────────────────────────"
+
+# A .pb that is not valid protobuf (wire type 7), so the raw heuristic runs.
+# Text is split by a 1 MB filler run so it crosses a read-window boundary.
+GEMINI_HOME="$TEST_DIR/gemini-home"
+mkdir -p "$GEMINI_HOME/.gemini/antigravity/conversations"
+python3 - "$GEMINI_HOME/.gemini/antigravity/conversations/conv-1.pb" <<'PY'
+import sys
+with open(sys.argv[1], "wb") as f:
+    f.write(b"\x07\x00\xff" + b"x" * (1024 * 1024 - 40))
+    f.write(b" Fallback check: the note says that you ran this from the repo.\x00\x01\xfe")
+    f.write(b"short text with the and you\x00")
+PY
+
+# Test 19: Printable runs with common words are recovered across the window boundary
+HOME="$GEMINI_HOME" python3 "$EXTRACTION_SCRIPT" --source gemini \
+  --output-dir "$TEST_DIR/output-gemini" > /dev/null 2>&1 || true
+GEMINI_OUT=$(find "$TEST_DIR/output-gemini" -name "*-gemini.md" | head -1)
+if [ -n "$GEMINI_OUT" ] && grep -q "Fallback check: the note says that you ran this from the repo." "$GEMINI_OUT" && \
+   ! grep -q "short text with" "$GEMINI_OUT"; then
+  pass "Raw-heuristic fallback recovers text spanning read windows"
+else
+  fail "Raw-heuristic fallback output missing or unexpected"
+fi
+
+echo ""
+echo "── Sync sidecar ────────────────────────────────────────────────"
+
+# Last message larger than the 10 KB tail the legacy metadata parser reads
+SYNC_HOME="$TEST_DIR/sync-home"
+SYNC_OUT="$TEST_DIR/output-sync"
+SYNC_SESSION="$SYNC_HOME/.claude/projects/-Users-test-sync/session.jsonl"
+mkdir -p "$(dirname "$SYNC_SESSION")"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$SYNC_SESSION"
+python3 -c 'import json; print(json.dumps({"type":"assistant","uuid":"sync-big","timestamp":"2026-01-15T10:03:00Z","message":{"role":"assistant","content":[{"type":"text","text":"long answer " * 2000}]}}))' \
+  >> "$SYNC_SESSION"
+HOME="$SYNC_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$SYNC_OUT" > /dev/null 2>&1 || true
+
+# Test 20: A sync sidecar is recorded for each export
+if [ -f "$SYNC_OUT/.extraction-cache/sync/2026-01-15-claude.md.json" ]; then
+  pass "Sync sidecar written to .extraction-cache/sync/"
+else
+  fail "Expected $SYNC_OUT/.extraction-cache/sync/2026-01-15-claude.md.json"
+fi
+
+# Test 21: A message sharing the last timestamp is appended exactly once, without a rewrite;
+# the sidecar keeps its ID set and the append's one new ID goes to its log
+SYNC_SIDECAR="$SYNC_OUT/.extraction-cache/sync/2026-01-15-claude.md.json"
+SYNC_SIDECAR_SUM=$(cksum < "$SYNC_SIDECAR" 2>/dev/null || true)
+echo '{"type":"user","uuid":"sync-same-ts","timestamp":"2026-01-15T10:03:00Z","message":{"role":"user","content":[{"type":"text","text":"Same timestamp follow-up"}]}}' \
+  >> "$SYNC_SESSION"
+HOME="$SYNC_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$SYNC_OUT" > /dev/null 2>&1 || true
+HOME="$SYNC_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$SYNC_OUT" > /dev/null 2>&1 || true
+SYNC_EXPORT=$(find "$SYNC_OUT" -name "2026-01-15-claude.md" -not -path "*/.extraction-cache/*" | head -1)
+SYNC_LOG_IDS=$(python3 -c 'import json, sys; print(*[len(json.loads(l)["ids"]) for l in open(sys.argv[1])])' \
+  "${SYNC_SIDECAR%.json}.log" 2>/dev/null || true)
+if [ -n "$SYNC_EXPORT" ] && [ "$(grep -c "Same timestamp follow-up" "$SYNC_EXPORT")" = "1" ] && \
+   grep -q "### Message 6:" "$SYNC_EXPORT" && [ ! -f "$SYNC_EXPORT.backup" ] && \
+   [ "$(cksum < "$SYNC_SIDECAR")" = "$SYNC_SIDECAR_SUM" ] && [ "$SYNC_LOG_IDS" = "1" ]; then
+  pass "Same-timestamp message appended once after a >10 KB message (no overwrite, one ID logged)"
+else
+  fail "Sidecar append missed, duplicated or rewrote the export or sidecar (log IDs: $SYNC_LOG_IDS)"
+fi
+
+# Test 22: Many appends read back every ID and the latest state; the log is folded into the
+# sidecar once it outgrows it, and a torn last line is dropped
+SYNC_COMPACT=$(python3 - "$REPO_ROOT/core/scripts" "$TEST_DIR/sync-compact" <<'PY' 2>&1 || true
+import os, sys
+sys.path.insert(0, sys.argv[1])
+from output_sync_index import OutputSyncIndex
+cache, export = sys.argv[2], os.path.join(sys.argv[2], "day.md")
+os.makedirs(cache)
+lines = []
+for n in range(1, 301):
+    sync = OutputSyncIndex(cache, "day.md")
+    assert sync.matches(export) == (n > 1) and len(sync.ids) == n - 1, n
+    with open(export, "a") as f:
+        f.write(f"### Message {n}\n")
+    sync.add(f"id-{n}")
+    sync.record(export, n, f"t{n}")
+    log = os.path.join(cache, "sync", "day.md.log")
+    lines.append(sum(1 for _ in open(log)) if os.path.exists(log) else 0)
+with open(log, "a") as f:
+    f.write('{"last_index": 9')
+sync = OutputSyncIndex(cache, "day.md")
+print(max(lines), lines[-1] < max(lines), sync.last_index, len(sync.ids), sync.matches(export))
+PY
+)
+if [[ "$SYNC_COMPACT" =~ ^[0-9]+\ True\ 300\ 300\ True$ ]]; then
+  pass "Sync sidecar log replays every append and is compacted once it outgrows the sidecar"
+else
+  fail "Sync sidecar log replay or compaction failed: $SYNC_COMPACT"
+fi
+
+echo ""
+echo "── Atomic rendering ────────────────────────────────────────────"
+
+# An export with no parseable metadata is overwritten: the old content must
+# survive as .backup and no temp files may be left behind
+ATOMIC_OUT="$TEST_DIR/output-atomic"
+mkdir -p "$ATOMIC_OUT/2026-01"
+echo "hand-written notes" > "$ATOMIC_OUT/2026-01/2026-01-15-claude.md"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$ATOMIC_OUT" > /dev/null 2>&1 || true
+
+# Test 23: Overwrite publishes the new export and rotates the old one to .backup
+if grep -q "### Message 1:" "$ATOMIC_OUT/2026-01/2026-01-15-claude.md" && \
+   [ "$(cat "$ATOMIC_OUT/2026-01/2026-01-15-claude.md.backup" 2>/dev/null)" = "hand-written notes" ] && \
+   [ -z "$(find "$ATOMIC_OUT" -name "*.tmp.*")" ]; then
+  pass "Overwrite published atomically with previous content in .backup"
+else
+  fail "Overwrite left a missing export, wrong .backup or temp files"
+fi
+
+# Test 24: Without hard links the backup is a copy, so the export never disappears before the rename
+ATOMIC_NOLINK=$(python3 - "$REPO_ROOT/core/scripts" "$ATOMIC_OUT/nolink.md" <<'PY' 2>&1 || true
+import os, sys
+sys.path.insert(0, sys.argv[1])
+from chat_extractor_base import AtomicWriter
+path = sys.argv[2]
+with open(path, "w") as f:
+    f.write("old export")
+def no_link(src, dst):
+    raise OSError("hard links not supported")
+os.link, real_replace, present = no_link, os.replace, []
+def replace(src, dst):
+    if dst == path:
+        present.append(os.path.exists(path))
+    real_replace(src, dst)
+os.replace = replace
+with AtomicWriter(path, backup=True) as f:
+    f.write("new export")
+print(present, open(path).read(), open(path + ".backup").read())
+PY
+)
+if [ "$ATOMIC_NOLINK" = "[True] new export old export" ]; then
+  pass "Backup falls back to a copy; the export stays in place until the new one is renamed in"
+else
+  fail "Backup fallback without hard links: ${ATOMIC_NOLINK##*$'\n'}"
+fi
+
+echo ""
+
+echo "── Run statistics ──────────────────────────────────────────────"
+
+STATS_OUT="$TEST_DIR/output-stats"
+STATS_JSON=$(HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$STATS_OUT" \
+  --rescan --stats json --profile "$TEST_DIR/extract.prof" 2>/dev/null | sed -n '/^{/,/^}/p')
+
+# Test 25: --stats json reports phase timings and message counters
+if echo "$STATS_JSON" | python3 -c 'import json, sys; d = json.load(sys.stdin); assert d["counters"]["messages_written"] > 0 and d["counters"]["files_parsed"] > 0 and "decode" in d["phases"]' 2>/dev/null; then
+  pass "--stats json reports phases and counters"
+else
+  fail "--stats json output missing or incomplete (got: $(echo "$STATS_JSON" | head -3))"
+fi
+
+# Test 26: --profile writes a cProfile dump readable by pstats
+if python3 -c 'import pstats, sys; pstats.Stats(sys.argv[1])' "$TEST_DIR/extract.prof" 2>/dev/null; then
+  pass "--profile writes a pstats-readable dump"
+else
+  fail "--profile did not write a readable cProfile dump"
+fi
+
+echo ""
+
+echo "── Markdown split ──────────────────────────────────────────────"
+
+# An existing export plus a message from the next day, split back into daily files
+SPLIT_SRC="$TEST_DIR/combined-export.md"
+SPLIT_OUT="$TEST_DIR/output-split"
+cat "$OUTPUT_DIR/2026-01/2026-01-15-claude.md" > "$SPLIT_SRC"
+printf '### Message 6: User\n\n**Timestamp:** 2026-01-16T09:00:00Z\n\n**Content:**\n\nNext-day question\n\n---\n\n' >> "$SPLIT_SRC"
+KG_OUTPUT_DIR="$SPLIT_OUT" python3 "$REPO_ROOT/core/scripts/extract_claude.py" --file "$SPLIT_SRC" > /dev/null 2>&1 || true
+
+# Test 27: Streaming split writes one file per day with renumbered messages
+SPLIT_DAY1="$SPLIT_OUT/2026-01/2026-01-15-claude.md"
+SPLIT_DAY2="$SPLIT_OUT/2026-01/2026-01-16-claude.md"
+if [ -f "$SPLIT_DAY1" ] && [ -f "$SPLIT_DAY2" ] && \
+   [ "$(grep -c "^### Message " "$SPLIT_DAY1")" = "$(grep -c "^### Message " "$OUTPUT_DIR/2026-01/2026-01-15-claude.md")" ] && \
+   grep -q "### Message 1: User" "$SPLIT_DAY2" && grep -q "Next-day question" "$SPLIT_DAY2" && \
+   grep -q "Total Messages:\*\* 1$" "$SPLIT_DAY2"; then
+  pass "split_claude_md streams an export into per-day files"
+else
+  fail "Split output missing days or messages ($(ls -R "$SPLIT_OUT" 2>/dev/null | tr '\n' ' '))"
+fi
+
+echo ""
+
+echo "── Watch mode ──────────────────────────────────────────────────"
+
+# Polls for up to 3s until $2 appears in file $1
+wait_for_text() {
+  for _ in $(seq 30); do
+    grep -q "$2" "$1" 2>/dev/null && return 0
+    sleep 0.1
+  done
+  return 1
+}
+
+WATCH_HOME="$TEST_DIR/watch-home"
+WATCH_OUT="$TEST_DIR/output-watch"
+WATCH_PROJECT="$WATCH_HOME/.claude/projects/-Users-test-watch"
+mkdir -p "$WATCH_PROJECT"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$WATCH_PROJECT/session.jsonl"
+
+HOME="$WATCH_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$WATCH_OUT" --watch > "$TEST_DIR/watch.log" 2>&1 &
+WATCH_PID=$!
+wait_for_text "$TEST_DIR/watch.log" "Watching" || true
+
+# Test 28: A record appended to an active session reaches the day export within a second or two
+echo '{"type":"user","uuid":"watch-1","timestamp":"2026-01-15T11:00:00Z","message":{"role":"user","content":[{"type":"text","text":"Watched follow-up"}]}}' \
+  >> "$WATCH_PROJECT/session.jsonl"
+if wait_for_text "$WATCH_OUT/2026-01/2026-01-15-claude.md" "Watched follow-up" && \
+   [ "$(grep -c "Watched follow-up" "$WATCH_OUT/2026-01/2026-01-15-claude.md")" = "1" ]; then
+  pass "--watch appends a newly written message to the day export"
+else
+  fail "--watch did not append the new message ($(tail -2 "$TEST_DIR/watch.log"))"
+fi
+
+# Test 29: A subagent log created in a new directory is picked up
+mkdir -p "$WATCH_PROJECT/session/subagents"
+echo '{"type":"user","uuid":"watch-2","timestamp":"2026-01-16T09:00:00Z","message":{"role":"user","content":[{"type":"text","text":"Subagent task"}]}}' \
+  > "$WATCH_PROJECT/session/subagents/agent-a1.jsonl"
+if wait_for_text "$WATCH_OUT/2026-01/2026-01-16-claude.md" "Subagent task"; then
+  pass "--watch picks up subagent files in newly created directories"
+else
+  fail "--watch missed the new subagent file"
+fi
+kill "$WATCH_PID" 2>/dev/null || true
+wait "$WATCH_PID" 2>/dev/null || true
+
+# Test 30: The polling fallback also follows appends
+HOME="$WATCH_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$WATCH_OUT" \
+  --watch --poll --poll-interval 0.2 > "$TEST_DIR/watch-poll.log" 2>&1 &
+WATCH_PID=$!
+wait_for_text "$TEST_DIR/watch-poll.log" "Watching" || true
+echo '{"type":"assistant","uuid":"watch-3","timestamp":"2026-01-15T11:00:05Z","message":{"role":"assistant","content":[{"type":"text","text":"Polled reply"}]}}' \
+  >> "$WATCH_PROJECT/session.jsonl"
+if wait_for_text "$WATCH_OUT/2026-01/2026-01-15-claude.md" "Polled reply"; then
+  pass "--watch --poll appends new messages"
+else
+  fail "--watch --poll did not append the new message"
+fi
+kill "$WATCH_PID" 2>/dev/null || true
+wait "$WATCH_PID" 2>/dev/null || true
+
+echo ""
+
+echo "── Message store ───────────────────────────────────────────────"
+
+STORE_OUT="$TEST_DIR/output-store"
+PLAIN_OUT="$TEST_DIR/output-store-plain"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$PLAIN_OUT" > /dev/null 2>&1 || true
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$STORE_OUT" --store > /dev/null 2>&1 || true
+
+# Test 31: Exports rendered from the SQLite store match the direct render
+if [ -f "$STORE_OUT/.extraction-cache/messages.db" ] && \
+   [ "$(normalize_export "$STORE_OUT")" = "$(normalize_export "$PLAIN_OUT")" ]; then
+  pass "--store creates messages.db and renders identical exports"
+else
+  fail "--store missing messages.db or exports differ from the direct render"
+fi
+
+# Test 32: Full-text search over stored messages
+STORE_HITS=$(python3 "$REPO_ROOT/core/scripts/message_store.py" search "MCP" --output-dir "$STORE_OUT" 2>/dev/null || true)
+if echo "$STORE_HITS" | grep -q "2026-01-15-claude.md"; then
+  pass "message_store.py search finds stored messages"
+else
+  fail "message_store.py search returned no hits for a fixture phrase"
+fi
+
+# Test 33: Deleted exports are re-rendered from the store without re-parsing their source logs
+find "$STORE_OUT" -name "*-claude.md" -not -path "*/.extraction-cache/*" -delete
+STORE_RERENDER=$(HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$STORE_OUT" \
+  --stats json 2>/dev/null | sed -n '/^{/,/^}/p')
+if [ -f "$STORE_OUT/2026-01/2026-01-15-claude.md" ] && \
+   [ "$(normalize_export "$STORE_OUT")" = "$(normalize_export "$PLAIN_OUT")" ] && \
+   echo "$STORE_RERENDER" | python3 -c 'import json, sys; assert json.load(sys.stdin)["counters"]["files_parsed"] == 0' 2>/dev/null; then
+  pass "Missing exports re-rendered from the store without parsing the source files"
+else
+  fail "Exports were not re-rendered from the store"
+fi
+
+# Test 34: A deleted source log is dropped from the store (session, messages and source row) on the next run
+PRUNE_SESSION="$PROJECT_PATH/prune-me.jsonl"
+echo '{"type":"user","uuid":"prune-001","timestamp":"2026-01-20T09:00:00Z","message":{"role":"user","content":[{"type":"text","text":"Quokka prune check"}]}}' \
+  > "$PRUNE_SESSION"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$STORE_OUT" > /dev/null 2>&1 || true
+PRUNE_BEFORE=$(python3 "$REPO_ROOT/core/scripts/message_store.py" search "Quokka" --output-dir "$STORE_OUT" 2>/dev/null || true)
+rm -f "$PRUNE_SESSION"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$STORE_OUT" > /dev/null 2>&1 || true
+PRUNE_AFTER=$(python3 "$REPO_ROOT/core/scripts/message_store.py" search "Quokka" --output-dir "$STORE_OUT" 2>/dev/null || true)
+PRUNE_ROWS=$(python3 -c 'import sqlite3, sys; c = sqlite3.connect(sys.argv[1]); print(*[c.execute(f"SELECT COUNT(*) FROM {t} WHERE {k} LIKE ?", ("%prune-me%",)).fetchone()[0] for t, k in (("sources", "path"), ("sessions", "session_key"))])' \
+  "$STORE_OUT/.extraction-cache/messages.db" 2>&1 || true)
+if [[ "$PRUNE_BEFORE" == *"2026-01-20"* ]] && [[ "$PRUNE_AFTER" != *"2026-01-20"* ]] && [ "$PRUNE_ROWS" = "0 0" ]; then
+  pass "Sessions of deleted source logs are pruned from the store"
+else
+  fail "Deleted source log still in the store: $PRUNE_ROWS"
+fi
+
+echo ""
+
+echo "── Deduplication ───────────────────────────────────────────────"
+
+# A subagent transcript that repeats the parent's answer, as real ones do, and
+# an unrelated session of the same project that happens to repeat it too
+DEDUP_HOME="$TEST_DIR/dedup-home"
+DEDUP_PROJECT="$DEDUP_HOME/.claude/projects/-Users-test-dedup"
+DEDUP_AGENT="$DEDUP_PROJECT/session/subagents/agent-a1.jsonl"
+REPEATED="To configure the MCP server, update your .mcp.json file with the correct path to mcp-server/dist/index.js."
+mkdir -p "$(dirname "$DEDUP_AGENT")"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$DEDUP_PROJECT/session.jsonl"
+{
+  echo '{"type":"assistant","uuid":"dedup-1","timestamp":"2026-01-15T10:30:00Z","message":{"role":"assistant","content":[{"type":"text","text":"'"$REPEATED"'"}]}}'
+  echo '{"type":"assistant","uuid":"dedup-2","timestamp":"2026-01-15T10:30:05Z","message":{"role":"assistant","content":[{"type":"text","text":"Subagent summary of the change"}]}}'
+} > "$DEDUP_AGENT"
+echo '{"type":"assistant","uuid":"dedup-other","timestamp":"2026-01-15T11:00:00Z","message":{"role":"assistant","content":[{"type":"text","text":"'"$REPEATED"'"}]}}' \
+  > "$DEDUP_PROJECT/other.jsonl"
+for mode in drop ref off default; do
+  DEDUP_FLAG="--dedup=$mode"
+  [ "$mode" = "default" ] && DEDUP_FLAG=""
+  HOME="$DEDUP_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-dedup-$mode" \
+    $DEDUP_FLAG > /dev/null 2>&1 || true
+done
+dedup_count() { grep -c "update your .mcp.json file" "$TEST_DIR/output-dedup-$1/2026-01/2026-01-15-claude.md" 2>/dev/null || true; }
+DEDUP_DROP_OUT="$TEST_DIR/output-dedup-drop/2026-01/2026-01-15-claude.md"
+
+# Test 35: A subagent's repeat of its session is dropped, referenced or kept; other sessions keep theirs
+if [ "$(dedup_count drop)" = "2" ] && [ "$(dedup_count off)" = "3" ] && [ "$(dedup_count default)" = "3" ] && \
+   [ "$(dedup_count ref)" = "2" ] && \
+   [ "$(grep -c "^\*(Same content as Message 2)\*$" "$TEST_DIR/output-dedup-ref/2026-01/2026-01-15-claude.md")" = "1" ] && \
+   grep -q "^\*\*Total Messages:\*\* 6$" "$DEDUP_DROP_OUT" && \
+   [ "$(grep -c "^### Message [0-9]*:" "$DEDUP_DROP_OUT")" = "6" ] && \
+   grep -q "^### Message 6: Assistant" "$DEDUP_DROP_OUT"; then
+  pass "--dedup drop/ref/off (default off) handle subagent repeats; numbering and Total Messages match"
+else
+  fail "--dedup modes did not handle the repeated subagent message"
+fi
+
+# Test 36: Appended repeats are deduplicated against the existing export
+{
+  echo '{"type":"assistant","uuid":"dedup-3","timestamp":"2026-01-15T10:40:00Z","message":{"role":"assistant","content":[{"type":"text","text":"'"$REPEATED"'"}]}}'
+  echo '{"type":"assistant","uuid":"dedup-4","timestamp":"2026-01-15T10:40:05Z","message":{"role":"assistant","content":[{"type":"text","text":"Dedup append marker"}]}}'
+} >> "$DEDUP_AGENT"
+HOME="$DEDUP_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-dedup-drop" \
+  --dedup drop > /dev/null 2>&1 || true
+if [ "$(dedup_count drop)" = "2" ] && \
+   grep -q "^### Message 7: Assistant" "$DEDUP_DROP_OUT" && ! grep -q "^### Message 8:" "$DEDUP_DROP_OUT" && \
+   grep -q "Dedup append marker" "$DEDUP_DROP_OUT"; then
+  pass "Incremental appends skip text already in the export"
+else
+  fail "Appended repeat was written again or the new message is missing"
+fi
+
+# Test 37: Gemini fragments recovered twice from one .pb are written once
+DEDUP_GEMINI="$TEST_DIR/dedup-gemini-home"
+mkdir -p "$DEDUP_GEMINI/.gemini/antigravity/conversations"
+python3 - "$DEDUP_GEMINI/.gemini/antigravity/conversations/conv-1.pb" <<'PY'
+import sys
+text = b"The fragment repeated by nested fields says that you ran this from the repo with the config."
+with open(sys.argv[1], "wb") as f:
+    f.write(b"\x07\x00\xff" + text + b"\x00\x01\xfe" + text + b"\x00\x02")
+PY
+HOME="$DEDUP_GEMINI" python3 "$EXTRACTION_SCRIPT" --source gemini --output-dir "$TEST_DIR/output-dedup-gemini" \
+  --dedup drop > /dev/null 2>&1 || true
+DEDUP_GEMINI_OUT=$(find "$TEST_DIR/output-dedup-gemini" -name "*-gemini.md" | head -1)
+if [ -n "$DEDUP_GEMINI_OUT" ] && [ "$(grep -c "The fragment repeated by nested fields" "$DEDUP_GEMINI_OUT")" = "1" ] && \
+   grep -q "^### Fragment 1$" "$DEDUP_GEMINI_OUT" && grep -q "^\*\*Total Messages:\*\* 1$" "$DEDUP_GEMINI_OUT"; then
+  pass "Repeated Gemini fragments are written once"
+else
+  fail "Repeated Gemini fragment was not deduplicated"
+fi
+
+echo ""
+
+echo "── History search ──────────────────────────────────────────────"
+
+SEARCH_HOME="$TEST_DIR/search-home"
+SEARCH_OUT="$TEST_DIR/output-search"
+SEARCH_PROJECT="$SEARCH_HOME/.claude/projects/-Users-test-search"
+SEARCH_SCRIPT="$REPO_ROOT/core/scripts/history_search.py"
+mkdir -p "$SEARCH_PROJECT/memory"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$SEARCH_PROJECT/session.jsonl"
+printf '# MEMORY.md Archive\n\n### Connection pooling\n**Last updated:** 2026-01-10\nUse pgbouncer in transaction mode.\n' \
+  > "$SEARCH_PROJECT/memory/MEMORY-archive.md"
+HOME="$SEARCH_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$SEARCH_OUT" --search-index > /dev/null 2>&1 || true
+
+# Test 38: BM25 search reports the export and message number of a hit
+SEARCH_HITS=$(HOME="$SEARCH_HOME" python3 "$SEARCH_SCRIPT" "configure MCP server" --output-dir "$SEARCH_OUT" 2>/dev/null || true)
+if [ -f "$SEARCH_OUT/.extraction-cache/search.db" ] && \
+   echo "$SEARCH_HITS" | head -1 | grep -q "2026-01-15-claude.md  message 1 "; then
+  pass "--search-index builds search.db; history_search.py ranks the matching message first"
+else
+  fail "history_search.py did not return the expected message"
+fi
+
+# Test 39: MEMORY-archive.md entries are indexed alongside chat history
+SEARCH_HITS=$(HOME="$SEARCH_HOME" python3 "$SEARCH_SCRIPT" "pgbouncer" --kind archive --output-dir "$SEARCH_OUT" 2>/dev/null || true)
+if echo "$SEARCH_HITS" | grep -q "MEMORY-archive.md  entry 1 (Entry, line 3)  Connection pooling"; then
+  pass "history_search.py finds archive entries by title and body"
+else
+  fail "history_search.py did not find the archive entry"
+fi
+
+# Test 40: Messages appended by a later run are indexed without a rebuild
+echo '{"type":"user","uuid":"search-1","timestamp":"2026-01-15T12:00:00Z","message":{"role":"user","content":[{"type":"text","text":"Quokka deployment checklist"}]}}' \
+  >> "$SEARCH_PROJECT/session.jsonl"
+HOME="$SEARCH_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$SEARCH_OUT" > "$TEST_DIR/search-update.log" 2>&1 || true
+SEARCH_HITS=$(HOME="$SEARCH_HOME" python3 "$SEARCH_SCRIPT" "quokka" --no-update --output-dir "$SEARCH_OUT" 2>/dev/null || true)
+if grep -q "Search index: 1 files updated (+1/-0 blocks)" "$TEST_DIR/search-update.log" && \
+   echo "$SEARCH_HITS" | grep -q "2026-01-15-claude.md  message"; then
+  pass "Extraction updates the search index incrementally"
+else
+  fail "Appended message missing from the search index"
+fi
+
+# Test 41: A packed export stays searchable; once its archive is gone, its blocks leave the index
+python3 "$REPO_ROOT/core/scripts/cold_storage.py" compact --month 2026-01 --codec gzip --output-dir "$SEARCH_OUT" > /dev/null 2>&1 || true
+PACKED_HITS=$(HOME="$SEARCH_HOME" python3 "$SEARCH_SCRIPT" "quokka" --output-dir "$SEARCH_OUT" 2>/dev/null || true)
+rm -f "$SEARCH_OUT"/2026-01.cold.*
+GONE_HITS=$(HOME="$SEARCH_HOME" python3 "$SEARCH_SCRIPT" "quokka" --output-dir "$SEARCH_OUT" 2>&1 || true)
+if [ ! -d "$SEARCH_OUT/2026-01" ] && echo "$PACKED_HITS" | grep -q "2026-01-15-claude.md  message" && \
+   echo "$GONE_HITS" | grep -q "Indexed 1 changed files (+0/-[1-9][0-9]* blocks)" && \
+   echo "$GONE_HITS" | grep -q "No matches found for: quokka"; then
+  pass "Search drops the blocks of exports that no longer exist"
+else
+  fail "Search index kept blocks of a removed export"
+fi
+
+echo ""
+echo "── Cold storage ────────────────────────────────────────────────"
+
+COLD_HOME="$TEST_DIR/cold-home"
+COLD_OUT="$TEST_DIR/output-cold"
+COLD_SESSION="$COLD_HOME/.claude/projects/-Users-test-cold/session.jsonl"
+COLD_SCRIPT="$REPO_ROOT/core/scripts/cold_storage.py"
+mkdir -p "$(dirname "$COLD_SESSION")"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$COLD_SESSION"
+HOME="$COLD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+cp "$COLD_OUT/2026-01/2026-01-15-claude.md" "$TEST_DIR/cold-original.md"
+python3 "$COLD_SCRIPT" compact --codec gzip --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+
+# Test 42: compact packs a completed month into an archive and removes its folder
+# (the export is the archive's first member, followed by its offset sidecar)
+gunzip -c "$COLD_OUT/2026-01.cold.1.gz" > "$TEST_DIR/cold-data" 2>/dev/null || true
+if [ ! -d "$COLD_OUT/2026-01" ] && [ -f "$COLD_OUT/2026-01.cold.json" ] && [ -f "$COLD_OUT/2026-01.cold.1.gz" ] && \
+   cmp -s -n "$(wc -c < "$TEST_DIR/cold-original.md")" "$TEST_DIR/cold-data" "$TEST_DIR/cold-original.md"; then
+  pass "compact packs 2026-01/ into a gzip archive"
+else
+  fail "compact did not replace the month folder with an archive"
+fi
+
+# Test 43: A re-run leaves the archive alone; a new message thaws the day and is appended once
+HOME="$COLD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+COLD_RERUN_DIR=$([ -d "$COLD_OUT/2026-01" ] && echo "present" || echo "absent")
+echo '{"type":"user","uuid":"cold-1","timestamp":"2026-01-15T12:00:00Z","message":{"role":"user","content":[{"type":"text","text":"Cold append marker"}]}}' >> "$COLD_SESSION"
+HOME="$COLD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+if [ "$COLD_RERUN_DIR" = "absent" ] && \
+   [ "$(grep -c "Cold append marker" "$COLD_OUT/2026-01/2026-01-15-claude.md" 2>/dev/null || true)" = "1" ] && \
+   grep -q "^### Message 5: User" "$COLD_OUT/2026-01/2026-01-15-claude.md" && \
+   head -c "$(wc -c < "$TEST_DIR/cold-original.md")" "$COLD_OUT/2026-01/2026-01-15-claude.md" | cmp -s - "$TEST_DIR/cold-original.md"; then
+  pass "Archived days are read in place and thawed only to append"
+else
+  fail "Extraction rewrote an archived day or lost the appended message"
+fi
+
+# Test 44: split_claude_md reads an archived export
+python3 "$COLD_SCRIPT" compact --codec gzip --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+COLD_SPLIT=$(cd "$REPO_ROOT/core/scripts" && KG_OUTPUT_DIR="$TEST_DIR/output-cold-split" python3 -c "
+from extract_claude import split_claude_md
+print(split_claude_md('$COLD_OUT/2026-01/2026-01-15-claude.md'))" 2>&1 || true)
+if [ ! -d "$COLD_OUT/2026-01" ] && echo "$COLD_SPLIT" | grep -q "Split 5 messages into 2026-01-15-claude.md" && \
+   grep -q "Cold append marker" "$TEST_DIR/output-cold-split/2026-01/2026-01-15-claude.md"; then
+  pass "split_claude_md reads exports from cold storage"
+else
+  fail "split_claude_md could not read an archived export"
+fi
+
+# Test 45: thaw restores every file byte for byte, keeping the replaced version as .backup
+python3 "$COLD_SCRIPT" thaw --month 2026-01 --output-dir "$COLD_OUT" > /dev/null 2>&1 || true
+if [ ! -f "$COLD_OUT/2026-01.cold.json" ] && [ ! -f "$COLD_OUT/2026-01.cold.2.gz" ] && \
+   cmp -s "$COLD_OUT/2026-01/2026-01-15-claude.md.backup" "$TEST_DIR/cold-original.md" && \
+   [ "$(grep -c "Cold append marker" "$COLD_OUT/2026-01/2026-01-15-claude.md")" = "1" ]; then
+  pass "thaw restores archived files unchanged"
+else
+  fail "thaw did not restore the archived month"
+fi
+
+echo ""
+echo "── Concurrent sources ──────────────────────────────────────────"
+
+CONC_HOME="$TEST_DIR/concurrent-home"
+mkdir -p "$CONC_HOME/.claude/projects/-Users-test-concurrent" "$CONC_HOME/.gemini/antigravity/conversations"
+cp "$FIXTURES_DIR/sample-claude-session.jsonl" "$CONC_HOME/.claude/projects/-Users-test-concurrent/session.jsonl"
+python3 - "$CONC_HOME/.gemini/antigravity/conversations/conv-1.pb" <<'PY'
+import sys
+with open(sys.argv[1], "wb") as f:
+    f.write(b"\x07\x00\xff" + b"The fragment in this conversation says that you ran the extraction from the repo with the config." + b"\x00\x02")
+PY
+for mode in concurrent sequential; do
+  extra=""; [ "$mode" = "sequential" ] && extra="--sequential"
+  HOME="$CONC_HOME" python3 "$EXTRACTION_SCRIPT" --source all --output-dir "$TEST_DIR/output-$mode" --stats json $extra \
+    > "$TEST_DIR/$mode.log" 2>&1 || true
+done
+conc_line() { grep -n "^$1" "$TEST_DIR/concurrent.log" | head -1 | cut -d: -f1; }
+conc_written() { python3 -c "import json,sys; t=open(sys.argv[1]).read(); print(json.loads(t[t.index('\n{')+1:])['counters']['messages_written'])" "$TEST_DIR/$1.log" 2>/dev/null || true; }
+
+# Test 46: --source all extracts both sources, printing each source's block in plan order
+CLAUDE_LINE=$(conc_line "Processing Claude")
+GEMINI_LINE=$(conc_line "Processing Gemini")
+if [ -n "$CLAUDE_LINE" ] && [ -n "$GEMINI_LINE" ] && [ "$CLAUDE_LINE" -lt "$GEMINI_LINE" ] && \
+   grep -q "^- Created 2026-01-15-claude.md" "$TEST_DIR/concurrent.log" && \
+   grep -q "^- Merged .*-gemini.md" "$TEST_DIR/concurrent.log"; then
+  pass "--source all runs Claude and Gemini concurrently with ordered output"
+else
+  fail "Concurrent extraction output is missing a source or out of order"
+fi
+
+# Test 47: Concurrent and --sequential runs write the same exports and merge the same counters
+CONC_DIFF=$(diff -r -x ".extraction-cache" -I "Export Generated" "$TEST_DIR/output-concurrent" "$TEST_DIR/output-sequential" 2>&1 || true)
+if [ -z "$CONC_DIFF" ] && [ -n "$(conc_written concurrent)" ] && [ "$(conc_written concurrent)" = "$(conc_written sequential)" ]; then
+  pass "Concurrent extraction matches --sequential (exports and messages_written)"
+else
+  fail "Concurrent extraction differs from --sequential"
+fi
+
+# Test 48: --source claude does not load the Gemini extractor, blackboxprotobuf or asyncio
+STARTUP_OUT=$(python3 "$REPO_ROOT/tests/benchmarks/bench_startup.py" --runs 1 --budget-ms 2000 2>&1) && STARTUP_OK=1 || STARTUP_OK=0
+CLAUDE_ONLY_OUT=$(HOME="$CONC_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-claude-only" 2>&1 || true)
+if [ "$STARTUP_OK" = "1" ] && ! echo "$CLAUDE_ONLY_OUT" | grep -q "blackboxprotobuf"; then
+  pass "Cold --source claude run stays within the startup budget without optional imports"
+else
+  fail "Startup check failed: $(echo "$STARTUP_OUT" | tail -2 | tr '\n' ' ')"
+fi
+
+# Test 49: A --source all rerun with no changed Claude session stays in one process
+HOME="$CONC_HOME" python3 -X importtime "$EXTRACTION_SCRIPT" --source all --output-dir "$TEST_DIR/output-concurrent" \
+  > "$TEST_DIR/rerun.log" 2> "$TEST_DIR/rerun-imports.log" || true
+if grep -q "^Processing Claude" "$TEST_DIR/rerun.log" && grep -q "^Processing Gemini" "$TEST_DIR/rerun.log" && \
+   ! grep -q " asyncio$\| concurrent.futures$" "$TEST_DIR/rerun-imports.log"; then
+  pass "Rerun with nothing new runs the sources sequentially (no asyncio or process pool)"
+else
+  fail "Rerun with nothing new started the concurrent plan"
+fi
+
+echo ""
+echo "── Message record ──────────────────────────────────────────────"
+
+# Without a sync sidecar, appends fall back to the last timestamp in the export
+# ("...T10:03:00", seconds only), compared against the epoch of each message.
+# --rescan re-parses the unchanged files so the day is rendered again
+RECORD_OUT="$TEST_DIR/output-record"
+HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$RECORD_OUT" > /dev/null 2>&1 || true
+rm -rf "$RECORD_OUT/.extraction-cache/sync"
+RECORD_RERUN=$(HOME="$FAKE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$RECORD_OUT" --rescan 2>&1 || true)
+RECORD_EXPORT=$(find "$RECORD_OUT" -name "2026-01-15-claude.md" -not -path "*/.extraction-cache/*" | head -1)
+
+# Test 50: A re-run without the sidecar appends nothing to an up-to-date export
+if echo "$RECORD_RERUN" | grep -q "No new activity for 2026-01-15-claude.md" && \
+   [ -n "$RECORD_EXPORT" ] && ! grep -q "Incremental Update" "$RECORD_EXPORT"; then
+  pass "Timestamp fallback compares epoch seconds (no duplicate of the last message)"
+else
+  fail "Re-run without a sync sidecar appended to an up-to-date export"
+fi
+
+echo ""
+echo "── Day shards ──────────────────────────────────────────────────"
+
+SHARD_HOME="$TEST_DIR/shard-home"
+SHARD_SESSION="$SHARD_HOME/.claude/projects/-Users-test-shard/session.jsonl"
+mkdir -p "$(dirname "$SHARD_SESSION")"
+shard_messages() {
+  python3 - "$SHARD_SESSION" "$1" "$2" <<'PY'
+import json, sys
+path, start, count = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+with open(path, "a") as f:
+    for i in range(start, start + count):
+        f.write(json.dumps({"type": "user" if i % 2 else "assistant", "uuid": f"shard-{i}",
+                            "timestamp": f"2026-01-15T{10 + i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+                            "message": {"content": [{"type": "text", "text": f"Shard message {i} " + "lorem ipsum " * 40}]}}) + "\n")
+PY
+}
+shard_messages 0 200
+HOME="$SHARD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --shard-mb 0.02 --output-dir "$TEST_DIR/output-shard" > /dev/null 2>&1 || true
+HOME="$SHARD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-unsharded" > /dev/null 2>&1 || true
+# Joins a day's parts in index order, dropping continuation headers, and checks sizes against the index
+shard_join() {
+  python3 - "$1" <<'PY'
+import json, os, sys
+month = os.path.join(sys.argv[1], "2026-01")
+index = json.load(open(os.path.join(month, "2026-01-15-claude.index.json")))
+text = ""
+for n, part in enumerate(index["parts"]):
+    path = os.path.join(month, part["file"])
+    assert os.path.getsize(path) == part["bytes"], part
+    data = open(path, encoding="utf-8").read()
+    text += data.split("---\n\n", 1)[1] if n else data
+print(len(index["parts"]), index["parts"][-1]["last"], sum(1 for s in index["sessions"]))
+print("".join(l for l in text.splitlines(True) if "Export Generated" not in l), end="")
+PY
+}
+
+# Test 51: --shard-mb splits a heavy day into parts whose contents join to the unsharded export
+SHARD_JOINED=$(shard_join "$TEST_DIR/output-shard" 2>&1 || true)
+SHARD_SUMMARY=${SHARD_JOINED%%$'\n'*}
+UNSHARDED=$(grep -v "Export Generated" "$TEST_DIR/output-unsharded/2026-01/2026-01-15-claude.md" || true)
+if [ -f "$TEST_DIR/output-shard/2026-01/2026-01-15-claude.part-2.md" ] && \
+   [ "${SHARD_JOINED#*$'\n'}" = "$UNSHARDED" ] && \
+   [ "${SHARD_SUMMARY#* }" = "200 1" ]; then
+  pass "--shard-mb writes part files and an index whose parts join to the unsharded export"
+else
+  fail "Sharded parts or index do not match the unsharded export: $SHARD_SUMMARY"
+fi
+
+# Test 52: Appends go to the last part and roll over; numbering continues and a re-run adds nothing
+shard_messages 200 100
+HOME="$SHARD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-shard" > /dev/null 2>&1 || true
+SHARD_RERUN=$(HOME="$SHARD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-shard" 2>&1 || true)
+SHARD_AFTER=$(shard_join "$TEST_DIR/output-shard" 2>&1 || true)
+SHARD_AFTER=${SHARD_AFTER%%$'\n'*}
+SHARD_BLOCKS=$(cat "$TEST_DIR"/output-shard/2026-01/2026-01-15-claude*.md | grep -c "^### Message " || true)
+SHARD_AFTER_LAST=${SHARD_AFTER#* }
+if [ "${SHARD_AFTER_LAST% *}" = "300" ] && \
+   [ "${SHARD_AFTER%% *}" -gt "${SHARD_SUMMARY%% *}" ] && [ "$SHARD_BLOCKS" = "300" ] && \
+   [[ "$SHARD_RERUN" != *"2026-01-15-claude"* ]]; then
+  pass "Appends to a sharded day roll over into new parts (index kept, no duplicates)"
+else
+  fail "Append to a sharded day failed: $SHARD_AFTER, $SHARD_BLOCKS blocks"
+fi
+
+# Test 53: Sessions that start in the same second keep separate index entries
+TWIN_HOME="$TEST_DIR/twin-home"
+mkdir -p "$TWIN_HOME/.claude/projects/-Users-test-twins"
+for stem in alpha beta; do
+  sed -e "s/test-00/$stem-/" "$FIXTURES_DIR/sample-claude-session.jsonl" > "$TWIN_HOME/.claude/projects/-Users-test-twins/$stem.jsonl"
+done
+HOME="$TWIN_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --shard-mb 1 --output-dir "$TEST_DIR/output-twins" > /dev/null 2>&1 || true
+TWIN_SESSIONS=$(python3 -c '
+import json, sys
+index = json.load(open(sys.argv[1]))
+print(" ".join("%s:%s-%s" % (s["source"], s["first"], s["last"]) for s in index["sessions"]))
+' "$TEST_DIR/output-twins/2026-01/2026-01-15-claude.index.json" 2>&1 || true)
+if [ "$TWIN_SESSIONS" = "alpha:1-4 beta:5-8" ]; then
+  pass "Sessions starting in the same second are listed separately in the day index"
+else
+  fail "Expected alpha:1-4 beta:5-8 in the day index, got: $TWIN_SESSIONS"
+fi
+
+echo ""
+echo "── Offset sidecars ─────────────────────────────────────────────"
+
+OFFSETS_SCRIPT="$REPO_ROOT/core/scripts/export_offsets.py"
+# Checks every export under a directory against its .offsets.jsonl: one entry per block marker,
+# each slice is exactly its block, and a rebuild from the markdown gives the same entries
+offsets_check() {
+  python3 - "$REPO_ROOT/core/scripts" "$1" <<'PY'
+import os, re, sys
+sys.path.insert(0, sys.argv[1])
+from export_offsets import load_offsets, scan_offsets
+checked = 0
+for d, dirs, names in os.walk(sys.argv[2]):
+    dirs[:] = [n for n in dirs if not n.startswith(".")]
+    for name in names:
+        if not name.endswith(".md"):
+            continue
+        path = os.path.join(d, name)
+        entries = load_offsets(path)
+        data = open(path, "rb").read()
+        markers = re.findall(rb"^### Message (\d+): ", data, re.M)
+        assert entries is not None and [e[0] for e in entries] == [int(m) for m in markers], name
+        for index, role, timestamp, start, length in entries:
+            block = data[start:start + length].decode("utf-8")
+            assert block.startswith(f"### Message {index}: {role.capitalize()}\n\n**Timestamp:** {timestamp}\n"), (name, index)
+            assert block.endswith("---\n\n") and "### Message " not in block[4:], (name, index)
+        assert [list(e) for e in scan_offsets(path)] == [list(e) for e in entries], name
+        checked += 1
+print(f"OK {checked}")
+PY
+}
+
+# Test 54: Every export and part has a sidecar whose byte ranges slice out exactly its message blocks
+OFFSETS_SHARD=$(offsets_check "$TEST_DIR/output-shard" 2>&1 || true)
+OFFSETS_PLAIN=$(offsets_check "$TEST_DIR/output-unsharded" 2>&1 || true)
+if [[ "$OFFSETS_SHARD" == "OK "* ]] && [ "$OFFSETS_SHARD" != "OK 0" ] && [ "$OFFSETS_PLAIN" = "OK 1" ]; then
+  pass "Exports and day parts get .offsets.jsonl sidecars that slice exact message blocks"
+else
+  fail "Offset sidecar check failed: ${OFFSETS_SHARD##*$'\n'} / ${OFFSETS_PLAIN##*$'\n'}"
+fi
+
+# Test 55: An append to an export whose sidecar is missing rebuilds it; readers seek to new messages
+rm -f "$TEST_DIR/output-unsharded/2026-01/2026-01-15-claude.offsets.jsonl"
+HOME="$SHARD_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$TEST_DIR/output-unsharded" > /dev/null 2>&1 || true
+OFFSETS_APPENDED=$(offsets_check "$TEST_DIR/output-unsharded" 2>&1 || true)
+OFFSETS_GET=$(python3 "$OFFSETS_SCRIPT" get "$TEST_DIR/output-unsharded/2026-01/2026-01-15-claude.md" --message 300 2>&1 || true)
+OFFSETS_WINDOW=$(python3 "$OFFSETS_SCRIPT" get "$TEST_DIR/output-unsharded/2026-01/2026-01-15-claude.md" \
+  --from 2026-01-15T10:04:00 --to 2026-01-15T10:04:59 2>&1 || true)
+if [ "$OFFSETS_APPENDED" = "OK 1" ] && [[ "$OFFSETS_GET" == "### Message 300: User"* ]] && \
+   [[ "$OFFSETS_GET" == *"Shard message 299 "* ]] && [ "$(grep -c "^### Message " <<< "$OFFSETS_WINDOW")" = "60" ]; then
+  pass "Appends keep the sidecar current (rebuilt when missing); get seeks to a message or time window"
+else
+  fail "Sidecar after append or get failed: ${OFFSETS_APPENDED##*$'\n'} / ${OFFSETS_GET%%$'\n'*}"
+fi
+
+# Test 56: Marker lines quoted in a message (a pasted export) are not taken for blocks: a rebuild
+# matches the sidecar written with the export, which stays current, and get returns whole blocks
+QUOTE_HOME="$TEST_DIR/quote-home"
+QUOTE_OUT="$TEST_DIR/output-quote"
+QUOTE_EXPORT="$QUOTE_OUT/2026-01/2026-01-15-claude.md"
+mkdir -p "$QUOTE_HOME/.claude/projects/-Users-test-quote"
+python3 - "$QUOTE_HOME/.claude/projects/-Users-test-quote/session.jsonl" <<'PY'
+import json, sys
+quoted = ("Here is the export you asked about:\n\n### Message 1: User\n\n**Timestamp:** 2026-01-15T10:00:00\n\n"
+          "Pasted question\n\n---\n\n### Fragment 7\n\nPasted fragment\n\n---\n\nEnd of quote")
+with open(sys.argv[1], "w") as f:
+    for n, (role, text) in enumerate([("user", "Show me the export"), ("assistant", quoted),
+                                      ("user", "Thanks")], 1):
+        f.write(json.dumps({"type": role, "uuid": f"quote-{n}", "timestamp": f"2026-01-15T10:0{n}:00Z",
+                            "message": {"role": role, "content": [{"type": "text", "text": text}]}}) + "\n")
+PY
+HOME="$QUOTE_HOME" python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$QUOTE_OUT" > /dev/null 2>&1 || true
+QUOTE_WRITTEN=$(cat "${QUOTE_EXPORT%.md}.offsets.jsonl" 2>/dev/null || true)
+python3 "$OFFSETS_SCRIPT" rebuild "$QUOTE_EXPORT" > /dev/null 2>&1 || true
+QUOTE_BLOCK=$(python3 "$OFFSETS_SCRIPT" get "$QUOTE_EXPORT" --message 2 2>&1 || true)
+QUOTE_FIRST=$(python3 "$OFFSETS_SCRIPT" get "$QUOTE_EXPORT" --message 1 2>&1 || true)
+if [ -n "$QUOTE_WRITTEN" ] && [ "$(cat "${QUOTE_EXPORT%.md}.offsets.jsonl")" = "$QUOTE_WRITTEN" ] && \
+   [ "$(grep -c "^\[" <<< "$QUOTE_WRITTEN")" = "3" ] && \
+   [[ "$QUOTE_BLOCK" == "### Message 2: Assistant"*"Pasted fragment"*"End of quote"* ]] && \
+   [[ "$QUOTE_FIRST" == *"Show me the export"* ]] && [[ "$QUOTE_FIRST" != *"Pasted"* ]]; then
+  pass "Markers quoted in message text do not split blocks on rebuild or get"
+else
+  fail "Quoted marker lines broke the offset sidecar: ${QUOTE_BLOCK%%$'\n'*}"
+fi
+
+echo ""
+echo "── Source roots ────────────────────────────────────────────────"
+
+ROOTS_OUT="$TEST_DIR/output-roots"
+for label in alpha beta; do
+  mkdir -p "$TEST_DIR/roots/$label/.claude/projects/-Users-$label-proj"
+  sed "s/configure the MCP server?/configure the $label server?/" "$FIXTURES_DIR/sample-claude-session.jsonl" \
+    > "$TEST_DIR/roots/$label/.claude/projects/-Users-$label-proj/session.jsonl"
+done
+roots_run() {
+  python3 "$EXTRACTION_SCRIPT" --source claude --output-dir "$ROOTS_OUT" \
+    --root beta="$TEST_DIR/roots/beta" --root "$TEST_DIR/roots/alpha" 2>&1 || true
+}
+
+# Test 57: Each root gets its own labelled export in the shared day folder; results follow label order
+ROOTS_FIRST=$(roots_run)
+ROOTS_ALPHA="$ROOTS_OUT/2026-01/2026-01-15-claude-alpha.md"
+ROOTS_BETA="$ROOTS_OUT/2026-01/2026-01-15-claude-beta.md"
+ROOTS_RESULTS=${ROOTS_FIRST#*Extraction Complete.}
+if [ -f "$ROOTS_ALPHA" ] && [ -f "$ROOTS_BETA" ] && [ ! -e "$ROOTS_OUT/2026-01/2026-01-15-claude.md" ] && \
+   grep -q "Claude Code \[alpha\]" "$ROOTS_ALPHA" && grep -q "alpha server" "$ROOTS_ALPHA" && \
+   ! grep -q "beta server" "$ROOTS_ALPHA" && grep -q "beta server" "$ROOTS_BETA" && \
+   [[ "$ROOTS_RESULTS" == *"claude-alpha.md"*"claude-beta.md"* ]]; then
+  pass "Multiple --root sources write labelled exports side by side, merged in label order"
+else
+  fail "Multi-root extraction failed: ${ROOTS_FIRST##*$'\n'}"
+fi
+
+# Test 58: A rerun over the same roots renders no day and leaves every export unchanged
+ROOTS_SUMS=$(cksum "$ROOTS_ALPHA" "$ROOTS_BETA")
+ROOTS_AGAIN=$(roots_run)
+if ! grep -q "2026-01-15-claude-" <<< "$ROOTS_AGAIN" && \
+   [ "$(cksum "$ROOTS_ALPHA" "$ROOTS_BETA")" = "$ROOTS_SUMS" ]; then
+  pass "Rerunning a multi-root extraction is a no-op per root"
+else
+  fail "Multi-root rerun changed output: ${ROOTS_AGAIN##*$'\n'}"
+fi
+
 echo ""
 
 # ── Summary ──────────────────────────────────────────────────────────────────